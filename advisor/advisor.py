@@ -1,45 +1,218 @@
 import json
+import functools
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from langsmith import traceable
+from advisor.metrics import traced, submit_in_context, METRICS, TOKEN_BUCKETS
 import uuid
+from collections import Counter
+from advisor.scheduler import RefreshScheduler, DEFAULT_REFRESH_INTERVAL, DEFAULT_REFRESH_JITTER
+from advisor.llm_interface import ResponseStream
+from advisor.context_assembler import ContextAssembler
+from advisor.answer_cache import SemanticAnswerCache
+from advisor.chunker import chunk_documents, batch_chunks, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP
+from advisor.gazetteer import default_matcher
+from advisor.deadline_fetcher import FetchResult
+
+# Neighbouring chunks merged into each retrieved chunk on either side
+DEFAULT_MERGE_NEIGHBORS = 1
+
+# Gazetteer intents checked in order by _classify_query_type; the player_fetch and
+# match_fetch intents trigger live player stats and matchup fetches
+QUERY_TYPES = ("player_query", "match_query", "team_query", "strategy_query")
+# Capitalized words never taken as the name of a player missing from the gazetteer
+QUESTION_WORDS = ['what', 'when', 'where', 'which', 'who', 'why', 'how']
+
+# Refresh fetch tasks and the REFRESH_SOURCES entry each one lists incrementally
+REFRESH_TASKS = {
+    "fetch_latest_news": "news",
+    "fetch_injury_reports": "injury",
+    "fetch_player_stats": "stats"
+}
+
+# Upper bound on Exa/OpenAI calls the advisor runs at once; 1 runs them sequentially
+DEFAULT_MAX_CONCURRENCY = 4
 
 class FantasyIPLAdvisor:
-    def __init__(self, data_fetcher, vector_store, llm):
+    def __init__(self, data_fetcher, vector_store, llm, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 context_assembler=None, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP,
+                 merge_neighbors=DEFAULT_MERGE_NEIGHBORS, answer_cache=None, refresh_state=None, matcher=None):
         self.data_fetcher = data_fetcher
         self.vector_store = vector_store
         self.llm = llm
+        self.context_assembler = context_assembler or ContextAssembler()
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.merge_neighbors = merge_neighbors
+        self.answer_cache = answer_cache or SemanticAnswerCache(vector_store.dimension)
+        self.refresh_state = refresh_state
+        self.matcher = matcher or default_matcher()
         self.last_refresh = None
+        self.max_concurrency = max_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency) if max_concurrency > 1 else None
+        self.refresh_scheduler = None
+        self.scheduler_lock = threading.Lock()
+    
+    def start_refresh_scheduler(self, interval=DEFAULT_REFRESH_INTERVAL, jitter=DEFAULT_REFRESH_JITTER,
+                                run_immediately=False):
+        """Start refreshing static data in the background on a schedule"""
+        with self.scheduler_lock:
+            if self.refresh_scheduler is None:
+                self.refresh_scheduler = RefreshScheduler(self, interval=interval, jitter=jitter)
+            self.refresh_scheduler.start(run_immediately=run_immediately)
+            return self.refresh_scheduler
+    
+    def get_refresh_stats(self):
+        """Get background refresh duration and staleness"""
+        if self.refresh_scheduler is None:
+            return {
+                "running": False,
+                "last_refresh": self.last_refresh.isoformat() if self.last_refresh else None
+            }
+        return self.refresh_scheduler.get_stats()
+    
+    def get_stats(self):
+        """Get statistics from every component the advisor uses"""
+        stats = {"vector_store": self.vector_store.get_stats()}
+        if hasattr(self.data_fetcher, 'get_stats'):
+            stats["fetch_cache"] = self.data_fetcher.get_stats()
+        stats["refresh"] = self.get_refresh_stats()
+        if hasattr(self.llm, 'get_stats'):
+            stats["llm"] = self.llm.get_stats()
+        stats["context"] = self.context_assembler.get_stats()
+        stats["answer_cache"] = self.answer_cache.get_stats()
+        stats["gazetteer"] = self.matcher.get_stats()
+        if self.refresh_state is not None:
+            stats["refresh_state"] = self.refresh_state.get_stats()
+        return stats
     
-    @traceable(name="refresh_static_data", run_type="chain")
+    def _run_tasks(self, tasks):
+        """Run independent tasks, concurrently when enabled
+        
+        Takes a dict of name -> (function, args, default). Returns the results and
+        errors keyed by name; a failed task yields its default instead of raising.
+        """
+        results = {}
+        errors = {}
+        
+        if self.executor is not None:
+            futures = {
+                name: submit_in_context(self.executor, function, *args)
+                for name, (function, args, _) in tasks.items()
+            }
+        
+        for name, (function, args, default) in tasks.items():
+            try:
+                results[name] = function(*args) if self.executor is None else futures[name].result()
+            except Exception as e:
+                print(f"Warning: {name} failed: {e}")
+                results[name] = default
+                errors[name] = str(e)
+        
+        return results, errors
+    
+    def _fetch_unseen(self, source):
+        """List a source from its watermark and fetch the contents of the pages not ingested yet
+        
+        Returns the fetched items, the number of results listed and the seen URL
+        entries of the results skipped.
+        """
+        listed = self.data_fetcher.search_urls(source, since=self.refresh_state.since(source))
+        unseen, skipped = self.refresh_state.partition(source, listed)
+        items = self.data_fetcher.fetch_contents(source, [item['url'] for item in unseen]) if unseen else []
+        if getattr(listed, "degraded", False) and not getattr(items, "degraded", False):
+            # A listing served from an earlier one may miss new pages
+            items = FetchResult(items, degraded=True, degraded_reason=listed.degraded_reason)
+        return items, len(listed), skipped
+    
+    @traced(name="refresh_static_data", run_type="chain")
     def refresh_static_data(self):
         """Refresh static data in vector store"""
         print("Refreshing static data...")
         
-        # Fetch and store latest news
-        news_items = self.data_fetcher.fetch_latest_news()
-        for item in news_items:
-            self.vector_store.add_document(
-                f"NEWS: {item['title']}\nDate: {item['published_date']}\n{item['text']}",
-                'news',
-                item.get('published_date')
-            )
+        # Fetch latest news, injury reports and general player stats; incrementally, only
+        # the pages not ingested yet, when the advisor keeps refresh state
+        incremental = self.refresh_state is not None and hasattr(self.data_fetcher, "search_urls")
+        if incremental:
+            fetched, errors = self._run_tasks({
+                name: (self._fetch_unseen, (source,), ([], 0, []))
+                for name, source in REFRESH_TASKS.items()
+            })
+            listed = {name: result[1] for name, result in fetched.items()}
+            skipped = [entry for result in fetched.values() for entry in result[2]]
+            fetched = {name: result[0] for name, result in fetched.items()}
+        else:
+            fetched, errors = self._run_tasks({
+                name: (getattr(self.data_fetcher, name), (), []) for name in REFRESH_TASKS
+            })
+            listed = {name: len(items) for name, items in fetched.items()}
+            skipped = []
+        news_items = fetched["fetch_latest_news"]
+        injury_reports = fetched["fetch_injury_reports"]
+        player_stats = fetched["fetch_player_stats"]
+        degraded = {name: result.degraded_reason for name, result in fetched.items()
+                    if getattr(result, "degraded", False)}
         
-        # Fetch and store injury reports
-        injury_reports = self.data_fetcher.fetch_injury_reports()
+        documents = []
+        for item in news_items:
+            documents.append({
+                'header': f"NEWS: {item['title']}\nDate: {item['published_date']}",
+                'document': item['text'],
+                'source_type': 'news',
+                'timestamp': item.get('published_date'),
+                'key': item.get('url')
+            })
         for item in injury_reports:
-            self.vector_store.add_document(
-                f"INJURY REPORT: {item['title']}\nDate: {item['published_date']}\n{item['text']}",
-                'injury',
-                item.get('published_date')
-            )
-        
-        # Store general player stats
-        player_stats = self.data_fetcher.fetch_player_stats()
+            documents.append({
+                'header': f"INJURY REPORT: {item['title']}\nDate: {item['published_date']}",
+                'document': item['text'],
+                'source_type': 'injury',
+                'timestamp': item.get('published_date'),
+                'key': item.get('url')
+            })
         for item in player_stats:
-            self.vector_store.add_document(
-                f"PLAYER STATS: {item['title']}\n{item['text']}",
-                'stats'
-            )
+            documents.append({
+                'header': f"PLAYER STATS: {item['title']}",
+                'document': item['text'],
+                'source_type': 'stats',
+                'key': item.get('url')
+            })
+        
+        # Split into overlapping chunks and store them with batched embeddings, then apply retention;
+        # searches see the whole refresh at once when the transaction ends
+        add_result = {"added": 0, "skipped": 0, "superseded": 0}
+        chunks = chunk_documents(documents, self.chunk_size, self.chunk_overlap)
+        chunk_counts = Counter()
+        invalidate_answers = False
+        with self.vector_store.transaction():
+            for batch in batch_chunks(chunks):
+                chunk_counts.update(chunk['key'] for chunk in batch)
+                batch_result = self.vector_store.add_documents(batch)
+                for name in add_result:
+                    add_result[name] += batch_result[name]
+                invalidate_answers = invalidate_answers or any(
+                    result["status"] == "added" and item['source_type'] in self.answer_cache.invalidating_sources
+                    for item, result in zip(batch, batch_result["results"])
+                )
+            expire_result = self.vector_store.expire()
+        
+        # Only now that their chunks are stored do pages count as seen and move the watermarks
+        if incremental:
+            for name, source in REFRESH_TASKS.items():
+                self.refresh_state.record(source, fetched[name], chunk_counts)
+            self.refresh_state.save()
+        
+        bytes_fetched = sum(len((item.get('text') or "").encode()) for items in fetched.values() for item in items)
+        bytes_avoided = sum(entry["bytes"] for entry in skipped)
+        embeddings_avoided = sum(entry["chunks"] for entry in skipped)
+        METRICS.increment("refresh_bytes_fetched_total", bytes_fetched)
+        METRICS.increment("refresh_bytes_avoided_total", bytes_avoided)
+        METRICS.increment("refresh_embeddings_avoided_total", embeddings_avoided)
+        
+        # Cached answers may contradict new news or injury reports
+        if invalidate_answers:
+            self.answer_cache.invalidate()
         
         self.last_refresh = datetime.now()
         print("Static data refresh complete.")
@@ -48,38 +221,126 @@ class FantasyIPLAdvisor:
             "news_count": len(news_items),
             "injury_reports_count": len(injury_reports),
             "player_stats_count": len(player_stats),
-            "refresh_time": self.last_refresh.isoformat()
+            "documents_chunked": len(documents),
+            "chunks_added": add_result["added"],
+            "chunks_skipped": add_result["skipped"],
+            "chunks_superseded": add_result["superseded"],
+            "documents_expired": expire_result["expired"],
+            "urls_listed": sum(listed.values()),
+            "urls_skipped": len(skipped),
+            "bytes_fetched": bytes_fetched,
+            "bytes_avoided": bytes_avoided,
+            "embeddings_avoided": embeddings_avoided,
+            "refresh_time": self.last_refresh.isoformat(),
+            "errors": errors,
+            "degraded": degraded
         }
     
-    @traceable(name="get_advice", run_type="chain")
-    def get_advice(self, query):
-        """Get fantasy IPL advice based on user query"""
+    @traced(name="get_advice", run_type="chain")
+    def get_advice(self, query, stream=False):
+        """Get fantasy IPL advice based on user query
+        
+        With stream=True a ResponseStream of response text is returned; its result
+        holds the advice dict (confidence, context sources) once it is exhausted.
+        A recent answer to a near-identical query is reused when one is cached.
+        """
+        start = time.perf_counter()
         session_id = str(uuid.uuid4())
         
-        # Check if refresh is needed
-        if not self.last_refresh or (datetime.now() - self.last_refresh) > timedelta(hours=12):
-            refresh_result = self.refresh_static_data()
+        # Refresh stale data in the background; the query is answered from the current index
+        interval = self.refresh_scheduler.interval if self.refresh_scheduler else DEFAULT_REFRESH_INTERVAL
+        if not self.last_refresh or (datetime.now() - self.last_refresh) > timedelta(seconds=interval):
+            if self.refresh_scheduler is None:
+                self.start_refresh_scheduler(run_immediately=True)
+            else:
+                self.refresh_scheduler.trigger()
         
-        query_lower = query.lower()
-        dynamic_context = []
+        # Every player, team and intent the query mentions, found in one pass
+        matches = self.matcher.match(query)
         
-        # Extract player information
-        player_context = self._extract_player_context(query, query_lower, dynamic_context)
+        # The query embedding is cached, so the vector search below reuses it. If it is
+        # not ready in time, the answer cache is skipped and the search is lexical only
+        query_embedding = self.vector_store.embed_query(query, timeout=self.vector_store.embedding_timeout)
+        search_mode = None if query_embedding is not None else "lexical"
+        cache_entry = None
+        if query_embedding is not None:
+            signature = self._query_signature(query, matches)
+            cached, similarity = self.answer_cache.get(query_embedding, signature)
+            if cached is not None:
+                advice = {**cached, "session_id": session_id, "cache_hit": True, "cache_similarity": similarity}
+                METRICS.increment("advice_total", cache="hit")
+                return ResponseStream(iter([advice["response"]]), lambda _: advice) if stream else advice
+            cache_entry = (query_embedding, signature, start)
+        METRICS.increment("advice_total", cache="miss")
         
-        # Extract match information
-        match_context = self._extract_match_context(query, query_lower, dynamic_context)
+        player_items = []
+        match_items = []
         
-        # Get relevant context from vector store
-        vector_results = self.vector_store.search(query)
-        static_context = [item['text'] for item in vector_results]
+        # Extract player and match information and search the vector store independently
+        gathered, errors = self._run_tasks({
+            "extract_player_context": (
+                self._extract_player_context, (query, matches, player_items),
+                {"player_name": None, "stats_found": 0}
+            ),
+            "extract_match_context": (
+                self._extract_match_context, (query, matches, match_items),
+                {"team1": None, "team2": None, "analysis_found": 0}
+            ),
+            "vector_search": (
+                functools.partial(self.vector_store.search, merge_neighbors=self.merge_neighbors, mode=search_mode),
+                (query,), []
+            )
+        })
+        
+        # Live fetches answered from an older result or Exa's cache instead of a fresh crawl
+        degraded = {name: result["degraded"] for name, result in gathered.items()
+                    if isinstance(result, dict) and result.get("degraded")}
+        
+        # Keep player context ahead of match context, as in sequential mode
+        dynamic_context = player_items + match_items
+        static_context = [item['text'] for item in gathered["vector_search"]]
         
-        # Combine contexts
-        all_context = dynamic_context + static_context
-        context_text = "\n\n".join(all_context)
+        # Rank, dedup and fit live and stored passages into the prompt budget
+        passages = (
+            [{'text': text, 'source': 'live_player_stats'} for text in player_items] +
+            [{'text': text, 'source': 'live_matchup'} for text in match_items] +
+            [{'text': item['text'], 'source': item['source_type'], 'score': item['score']}
+             for item in gathered["vector_search"]]
+        )
+        context_text, _, context_report = self.context_assembler.assemble(query, passages)
+        METRICS.observe("context_tokens", context_report["tokens_after"], buckets=TOKEN_BUCKETS)
+        METRICS.increment("context_tokens_saved_total", context_report["tokens_saved"])
         
         # Generate response using LLM
+        if stream:
+            response_stream = self.llm.generate_response(query, context_text, stream=True)
+            return ResponseStream(
+                iter(response_stream),
+                lambda _: self._remember_answer(cache_entry, self._build_advice(
+                    response_stream.result, query, matches, session_id,
+                    dynamic_context, static_context, context_text, context_report, errors, degraded
+                ))
+            )
+        
         response_data = self.llm.generate_response(query, context_text)
         
+        return self._remember_answer(cache_entry, self._build_advice(
+            response_data, query, matches, session_id, dynamic_context, static_context, context_text,
+            context_report, errors, degraded
+        ))
+    
+    def _remember_answer(self, cache_entry, advice):
+        """Cache a complete answer for similar queries; answers built from partial or degraded context are not reused"""
+        if cache_entry is None:
+            return advice
+        query_embedding, signature, start = cache_entry
+        if not advice["errors"] and not advice["degraded"]:
+            self.answer_cache.put(query_embedding, signature, advice, time.perf_counter() - start)
+        return advice
+    
+    def _build_advice(self, response_data, query, matches, session_id, dynamic_context, static_context,
+                      context_text, context_report, errors, degraded):
+        """Assemble the advice dict once the full response is available"""
         # Calculate confidence score based on available context
         confidence_score = self._calculate_confidence_score(
             query, 
@@ -94,21 +355,25 @@ class FantasyIPLAdvisor:
             "context_sources": {
                 "dynamic_context_count": len(dynamic_context),
                 "static_context_count": len(static_context),
-                "total_context_length": len(context_text)
+                "total_context_length": len(context_text),
+                "context_tokens": context_report["tokens_after"],
+                "tokens_saved": context_report["tokens_saved"],
+                "duplicates_removed": context_report["duplicates_removed"]
             },
             "session_id": session_id,
-            "query_type": self._classify_query_type(query_lower)
+            "query_type": self._classify_query_type(matches),
+            "token_usage": response_data.get('token_usage'),
+            "time_to_first_token": response_data.get('time_to_first_token'),
+            "cache_hit": False,
+            "errors": errors,
+            "degraded": degraded
         }
     
-    @traceable(name="extract_player_context", run_type="tool")
-    def _extract_player_context(self, query, query_lower, dynamic_context):
+    @traced(name="extract_player_context", run_type="tool")
+    def _extract_player_context(self, query, matches, dynamic_context):
         """Extract player-related context"""
-        if any(term in query_lower for term in ['player', 'batsman', 'bowler', 'all-rounder', 'all rounder']):
-            player_name = None
-            for word in query.split():
-                if word[0].isupper() and len(word) > 3 and word.lower() not in ['what', 'when', 'where', 'which', 'who', 'why', 'how']:
-                    player_name = word
-                    break
+        if "player_fetch" in matches.get("intent", {}):
+            player_name = self._find_player_name(query, matches)
             
             player_stats = self.data_fetcher.fetch_player_stats(player_name)
             for item in player_stats:
@@ -116,28 +381,17 @@ class FantasyIPLAdvisor:
             
             return {
                 "player_name": player_name,
-                "stats_found": len(player_stats)
+                "players": list(matches.get("player", {})),
+                "stats_found": len(player_stats),
+                "degraded": getattr(player_stats, "degraded_reason", None)
             }
-        return {"player_name": None, "stats_found": 0}
+        return {"player_name": None, "players": list(matches.get("player", {})), "stats_found": 0}
     
-    @traceable(name="extract_match_context", run_type="tool")
-    def _extract_match_context(self, query, query_lower, dynamic_context):
+    @traced(name="extract_match_context", run_type="tool")
+    def _extract_match_context(self, query, matches, dynamic_context):
         """Extract match-related context"""
-        if any(term in query_lower for term in ['match', 'versus', 'vs', 'against', 'playing']):
-            ipl_teams = ['Mumbai Indians', 'Chennai Super Kings', 'Royal Challengers Bangalore', 
-                         'Kolkata Knight Riders', 'Delhi Capitals', 'Punjab Kings', 
-                         'Rajasthan Royals', 'Sunrisers Hyderabad', 'Gujarat Titans', 'Lucknow Super Giants']
-            
-            team1 = None
-            team2 = None
-            
-            for team in ipl_teams:
-                if team.lower() in query_lower or team.split()[-1].lower() in query_lower:
-                    if team1 is None:
-                        team1 = team
-                    elif team2 is None:
-                        team2 = team
-                        break
+        if "match_fetch" in matches.get("intent", {}):
+            team1, team2 = self._find_teams(matches)
             
             matchup_analysis = self.data_fetcher.fetch_matchup_analysis(team1, team2)
             for item in matchup_analysis:
@@ -146,10 +400,51 @@ class FantasyIPLAdvisor:
             return {
                 "team1": team1,
                 "team2": team2,
-                "analysis_found": len(matchup_analysis)
+                "analysis_found": len(matchup_analysis),
+                "degraded": getattr(matchup_analysis, "degraded_reason", None)
             }
         return {"team1": None, "team2": None, "analysis_found": 0}
     
+    def planned_fetches(self, query):
+        """Live fetches get_advice makes for a query, as (fetcher method name, args) pairs"""
+        matches = self.matcher.match(query)
+        intents = matches.get("intent", {})
+        fetches = []
+        if "player_fetch" in intents:
+            fetches.append(("fetch_player_stats", (self._find_player_name(query, matches),)))
+        if "match_fetch" in intents:
+            fetches.append(("fetch_matchup_analysis", self._find_teams(matches)))
+        return fetches
+    
+    def _find_player_name(self, query, matches):
+        """The first gazetteer player the query mentions
+        
+        Without one, the first capitalized word that is not a question word is
+        taken as the name of a player missing from the gazetteer.
+        """
+        for player in matches.get("player", {}):
+            return player
+        for word in query.split():
+            if word[0].isupper() and len(word) > 3 and word.lower() not in QUESTION_WORDS:
+                return word
+        return None
+    
+    def _find_teams(self, matches):
+        """The first two IPL teams mentioned, by full name or alias"""
+        teams = list(matches.get("team", {}))[:2]
+        return tuple(teams + [None] * (2 - len(teams)))
+    
+    def _query_signature(self, query, matches):
+        """Entities a cached answer must share with the query: the players, teams and abbreviations it names
+        
+        Abbreviations are kept as written so ones missing from the gazetteer still tell queries apart,
+        since queries about different teams otherwise embed almost identically.
+        """
+        players = frozenset(matches.get("player", {})) or frozenset([self._find_player_name(query, matches)])
+        teams = frozenset(matches.get("team", {}))
+        abbreviations = frozenset(word.strip("?.,!'") for word in query.split() if len(word) > 1 and word.isupper())
+        return (players, teams, abbreviations)
+    
     def _calculate_confidence_score(self, query, dynamic_count, static_count, response):
         """Calculate confidence score based on available context and response quality"""
         base_score = 0.5
@@ -165,22 +460,16 @@ class FantasyIPLAdvisor:
             base_score += 0.1
         
         # Check for specific IPL terms in response
-        ipl_terms = ['ipl', 'cricket', 'fantasy', 'player', 'team', 'match', 'runs', 'wickets']
-        term_count = sum(1 for term in ipl_terms if term.lower() in response.lower())
+        term_count = len(self.matcher.match(response).get("domain", {}))
         base_score += min(term_count * 0.02, 0.1)
         
         # Ensure score is between 0 and 1
         return min(max(base_score, 0.0), 1.0)
     
-    def _classify_query_type(self, query_lower):
+    def _classify_query_type(self, matches):
         """Classify the type of query for better tracking"""
-        if any(term in query_lower for term in ['player', 'batsman', 'bowler']):
-            return "player_query"
-        elif any(term in query_lower for term in ['match', 'versus', 'vs']):
-            return "match_query"
-        elif any(term in query_lower for term in ['team', 'squad']):
-            return "team_query"
-        elif any(term in query_lower for term in ['strategy', 'captain', 'vice-captain']):
-            return "strategy_query"
-        else:
-            return "general_query"
\ No newline at end of file
+        intents = matches.get("intent", {})
+        for query_type in QUERY_TYPES:
+            if query_type in intents:
+                return query_type
+        return "general_query"
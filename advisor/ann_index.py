@@ -0,0 +1,107 @@
+import math
+import faiss
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq", "ivfsq8")
+
+# Stores switch from the exact flat index to the configured ANN index at this size
+DEFAULT_ANN_THRESHOLD = 50000
+DEFAULT_NPROBE = 16
+DEFAULT_EF_SEARCH = 64
+HNSW_M = 32
+# Sub-quantizers for IVF-PQ; must divide the embedding dimension (1536 / 64 = 24 dims each)
+PQ_M = 64
+
+
+def build_index(index_type, dimension, n_vectors):
+    """Create an empty ID-mapped FAISS index of the given type sized for n_vectors
+    
+    IVF indexes store ids natively; flat and HNSW indexes are wrapped in IndexIDMap2.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    
+    if index_type == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+    if index_type == "hnsw":
+        return faiss.IndexIDMap2(faiss.IndexHNSWFlat(dimension, HNSW_M))
+    
+    # ~4*sqrt(N) lists, keeping at least 39 training points per centroid as FAISS asks
+    nlist = max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+    quantizer = faiss.IndexFlatL2(dimension)
+    if index_type == "ivf":
+        return faiss.IndexIVFFlat(quantizer, dimension, nlist)
+    if index_type == "ivfpq":
+        pq_m = PQ_M
+        while dimension % pq_m:
+            pq_m -= 1
+        return faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, 8)
+    return faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, faiss.ScalarQuantizer.QT_8bit)
+
+
+def is_id_mapped(index):
+    """Whether an index was built with explicit ids rather than sequential positions"""
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIVF))
+
+
+def supports_removal(index):
+    """Whether vectors can be removed from an index; HNSW graphs cannot drop nodes"""
+    return index_kind(index) != "hnsw"
+
+
+def training_size(index):
+    """Number of vectors to train an index on, or 0 if it needs no training"""
+    if index.is_trained:
+        return 0
+    ivf = faiss.extract_index_ivf(index)
+    return min(ivf.nlist * 256, 1 << 20)
+
+
+def index_kind(index):
+    """Describe a (possibly wrapped) FAISS index as one of INDEX_TYPES"""
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexIVFScalarQuantizer):
+        return "ivfsq8"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def search_parameter(index):
+    """Name of the recall/latency knob for an index ('nprobe', 'efSearch' or None)"""
+    kind = index_kind(index)
+    if kind == "hnsw":
+        return "efSearch"
+    if kind == "flat":
+        return None
+    return "nprobe"
+
+
+def search_params(index, nprobe=DEFAULT_NPROBE, ef_search=DEFAULT_EF_SEARCH, selector=None):
+    """Per-call FAISS search parameters for an index, optionally restricted to an ID selector
+    
+    Returns None for an unrestricted search of an exact index.
+    """
+    name = search_parameter(index)
+    if name == "nprobe":
+        params = faiss.SearchParametersIVF(nprobe=nprobe)
+    elif name == "efSearch":
+        params = faiss.SearchParametersHNSW(efSearch=ef_search)
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def reconstruct(index, start, count):
+    """Read back vectors [start, start + count) from an index that stores them by position"""
+    if index_kind(index) in ("ivf", "ivfpq", "ivfsq8"):
+        faiss.extract_index_ivf(index).make_direct_map()
+    return index.reconstruct_n(start, count)
@@ -0,0 +1,105 @@
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+
+# Cosine similarity above which a cached answer is reused for a new query
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+# Seconds an answer may be reused; live stats and matchups change over that time
+DEFAULT_ANSWER_TTL = 10 * 60
+DEFAULT_MAX_ANSWERS = 512
+# New documents of these source types invalidate every cached answer
+DEFAULT_INVALIDATING_SOURCES = ("news", "injury")
+
+
+class SemanticAnswerCache:
+    """Reuses a recent answer for a query whose embedding is close to an earlier one
+    
+    Entries are keyed by the query embedding plus a signature of the entities in
+    the query (player and teams), so near-identical wording about different
+    teams never shares an answer. Entries expire after ``ttl`` seconds, the least
+    recently used is evicted beyond ``max_entries``, and ``invalidate()`` drops
+    everything when new data arrives.
+    """
+    
+    def __init__(self, dimension=1536, threshold=DEFAULT_SIMILARITY_THRESHOLD, ttl=DEFAULT_ANSWER_TTL,
+                 max_entries=DEFAULT_MAX_ANSWERS, invalidating_sources=DEFAULT_INVALIDATING_SOURCES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.invalidating_sources = set(invalidating_sources)
+        # Normalized query embeddings, one row per slot; entries maps slot -> entry in LRU order
+        self.embeddings = np.zeros((max_entries, dimension), dtype=np.float32)
+        self.entries = OrderedDict()
+        self.free_slots = list(range(max_entries - 1, -1, -1))
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+        self.latency_saved = 0.0
+    
+    def _normalize(self, embedding):
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+    
+    def _drop(self, slot):
+        del self.entries[slot]
+        self.free_slots.append(slot)
+    
+    def get(self, embedding, signature):
+        """Return (answer, similarity) for the closest fresh matching entry, or (None, None)"""
+        embedding = self._normalize(embedding)
+        now = time.monotonic()
+        with self.lock:
+            for slot in [slot for slot, entry in self.entries.items() if now - entry["stored_at"] > self.ttl]:
+                self._drop(slot)
+                self.counters["expired"] += 1
+            
+            slots = [slot for slot, entry in self.entries.items() if entry["signature"] == signature]
+            if slots:
+                similarities = self.embeddings[slots] @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry = self.entries[slots[best]]
+                    self.entries.move_to_end(slots[best])
+                    self.counters["hits"] += 1
+                    self.latency_saved += entry["latency"]
+                    return entry["answer"], float(similarities[best])
+            
+            self.counters["misses"] += 1
+            return None, None
+    
+    def put(self, embedding, signature, answer, latency):
+        """Store an answer and the seconds it took to produce"""
+        with self.lock:
+            if not self.free_slots:
+                slot, _ = self.entries.popitem(last=False)
+                self.free_slots.append(slot)
+                self.counters["evictions"] += 1
+            slot = self.free_slots.pop()
+            self.embeddings[slot] = self._normalize(embedding)
+            self.entries[slot] = {
+                "signature": signature,
+                "answer": answer,
+                "latency": latency,
+                "stored_at": time.monotonic()
+            }
+    
+    def invalidate(self):
+        """Drop every cached answer"""
+        with self.lock:
+            for slot in list(self.entries):
+                self._drop(slot)
+            self.counters["invalidations"] += 1
+    
+    def get_stats(self):
+        """Get hit rate, latency saved and occupancy"""
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": self.counters["hits"] / lookups if lookups else 0.0,
+                "latency_saved_seconds": self.latency_saved,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold
+            }
@@ -0,0 +1,102 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from advisor.fetch_cache import CachedDataFetcher
+
+# get_advice calls run at once in batch mode
+DEFAULT_BATCH_PARALLELISM = 4
+
+
+def read_queries(lines):
+    """Parse JSONL lines into {'id', 'query'} dicts
+
+    Each line is either a JSON object with 'query' (and optionally 'id') or a
+    JSON string; blank lines are skipped. Queries without an id are numbered
+    by line.
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if isinstance(item, str):
+            item = {"query": item}
+        yield {"id": item.get("id", number), "query": item["query"]}
+
+
+def _percentile(samples, fraction):
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)] if samples else None
+
+
+def run_batch(advisor, queries, output, max_parallel=DEFAULT_BATCH_PARALLELISM):
+    """Answer many queries with bounded parallelism, writing one JSON line per query as it finishes
+
+    All queries are embedded up front in batched requests, and the live player
+    and matchup fetches they need are made once per distinct fetch, so the
+    per-query pipelines find both in cache. Returns throughput and per-stage
+    timings.
+    """
+    queries = list(queries)
+    stages = {}
+    start = time.perf_counter()
+
+    stage_start = time.perf_counter()
+    advisor.vector_store.embed_queries(item["query"] for item in queries)
+    stages["embed"] = time.perf_counter() - stage_start
+
+    planned = [fetch for item in queries for fetch in advisor.planned_fetches(item["query"])]
+    distinct = list(dict.fromkeys(planned))
+    fetch_errors = 0
+    stage_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        # Only a caching fetcher keeps the results for the pipelines that follow
+        if isinstance(advisor.data_fetcher, CachedDataFetcher):
+            futures = [executor.submit(getattr(advisor.data_fetcher, method), *args) for method, args in distinct]
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    fetch_errors += 1
+        stages["prefetch"] = time.perf_counter() - stage_start
+
+        def answer(item):
+            query_start = time.perf_counter()
+            try:
+                return item, advisor.get_advice(item["query"]), None, time.perf_counter() - query_start
+            except Exception as e:
+                return item, None, str(e), time.perf_counter() - query_start
+
+        stage_start = time.perf_counter()
+        latencies = []
+        time_to_first_token = []
+        failed = 0
+        cache_hits = 0
+        for future in as_completed([executor.submit(answer, item) for item in queries]):
+            item, advice, error, latency = future.result()
+            latencies.append(latency)
+            line = {"id": item["id"], "query": item["query"], "latency": latency}
+            if error is not None:
+                failed += 1
+                line["error"] = error
+            else:
+                line["advice"] = advice
+                cache_hits += advice.get("cache_hit", False)
+                if advice.get("time_to_first_token") is not None:
+                    time_to_first_token.append(advice["time_to_first_token"])
+            output.write(json.dumps(line, default=str) + "\n")
+            output.flush()
+        stages["advice"] = time.perf_counter() - stage_start
+
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "queries": len(queries),
+        "succeeded": len(queries) - failed,
+        "failed": failed,
+        "answer_cache_hits": cache_hits,
+        "wall_seconds": wall,
+        "throughput_qps": len(queries) / wall if wall else 0.0,
+        "stages": stages,
+        "fetches": {"planned": len(planned), "distinct": len(distinct), "errors": fetch_errors},
+        "latency_p50": _percentile(latencies, 0.5),
+        "latency_p95": _percentile(latencies, 0.95),
+        "time_to_first_token_mean": sum(time_to_first_token) / len(time_to_first_token) if time_to_first_token else None
+    }
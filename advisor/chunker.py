@@ -0,0 +1,105 @@
+import hashlib
+
+# Chunk length in characters (~250 tokens) and the overlap carried into the next chunk
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+# Chunks handed to VectorStore.add_documents per call
+DEFAULT_INGEST_BATCH_SIZE = 256
+
+# Preferred places to end a chunk, strongest first
+BOUNDARIES = ("\n\n", "\n", ". ", " ")
+
+
+def split_text(text, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP):
+    """Split text into overlapping (start, end) spans ending on paragraph, line, sentence or word boundaries"""
+    if len(text) <= chunk_size:
+        return [(0, len(text))]
+    
+    spans = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            # Only accept a boundary in the second half so chunks do not get too short
+            for boundary in BOUNDARIES:
+                found = text.rfind(boundary, start + chunk_size // 2, end)
+                if found != -1:
+                    end = found + len(boundary)
+                    break
+        spans.append((start, end))
+        if end == len(text):
+            break
+        
+        next_start = max(end - overlap, start + 1)
+        # Begin the overlap on a word boundary
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return spans
+
+
+def chunk_documents(documents, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP):
+    """Lazily split documents into chunks for VectorStore.add_documents
+    
+    Each document is a dict with 'document' (the body to split), 'source_type' and
+    optional 'header', 'timestamp' and 'key'. The header is repeated at the start
+    of every chunk so each one embeds with its title and date. Chunks carry the
+    parent document's id ('parent', its key or content hash), their position
+    ('chunk') and the span of the body they cover. Documents without a body
+    (Exa returns no text for some pages) yield no chunks.
+    """
+    for item in documents:
+        header = item.get('header')
+        body = item.get('document') or ""
+        if not body.strip():
+            continue
+        parent = item.get('key') or hashlib.md5(f"{header}\n{body}".encode()).hexdigest()
+        for chunk, (start, end) in enumerate(split_text(body, chunk_size, overlap)):
+            yield {
+                'document': f"{header}\n{body[start:end]}" if header else body[start:end],
+                'source_type': item['source_type'],
+                'timestamp': item.get('timestamp'),
+                'key': item.get('key'),
+                'parent': parent,
+                'chunk': chunk,
+                'span': (start, end)
+            }
+
+
+def batch_chunks(chunks, batch_size=DEFAULT_INGEST_BATCH_SIZE):
+    """Group chunks into batches of about batch_size without splitting a document across batches
+    
+    add_documents supersedes by key per batch, so all chunks of a document must
+    arrive together.
+    """
+    batch = []
+    for chunk in chunks:
+        if chunk['chunk'] == 0 and len(batch) >= batch_size:
+            yield batch
+            batch = []
+        batch.append(chunk)
+    if batch:
+        yield batch
+
+
+def merge_chunks(chunks):
+    """Join chunks of one document, given in order, into a single text without repeating overlaps
+    
+    Each chunk is a dict with 'text' (header plus body) and 'span'.
+    """
+    first = chunks[0]
+    start, end = first['span']
+    header = first['text'][:len(first['text']) - (end - start)]
+    parts = [first['text'][len(header):]]
+    covered = end
+    for chunk in chunks[1:]:
+        start, end = chunk['span']
+        if end <= covered:
+            continue
+        body = chunk['text'][len(chunk['text']) - (end - start):]
+        if start < covered:
+            body = body[covered - start:]
+        elif start > covered:
+            parts.append(" ... ")
+        parts.append(body)
+        covered = end
+    return header + "".join(parts)
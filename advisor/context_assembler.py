@@ -0,0 +1,179 @@
+import re
+import threading
+
+# Prompt context budget in (estimated) tokens, leaving room for the question and the answer
+DEFAULT_CONTEXT_TOKENS = 3000
+# No single passage may take more than this, so one long article cannot crowd out the rest
+DEFAULT_MAX_PASSAGE_TOKENS = 800
+# A passage cut to fit the remaining budget is only kept if at least this much of it survives
+MIN_PASSAGE_TOKENS = 100
+# Passages whose word shingles overlap at least this much are treated as duplicates
+DEFAULT_DEDUP_THRESHOLD = 0.8
+SHINGLE_SIZE = 3
+
+# Ranking weight per passage source; live data fetched for this query outranks the stored index
+DEFAULT_SOURCE_PRIORITY = {
+    "live_player_stats": 1.0,
+    "live_matchup": 1.0,
+    "injury": 0.9,
+    "news": 0.8,
+    "stats": 0.7
+}
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "best", "for", "from", "good", "how", "i", "in", "is",
+    "it", "me", "my", "of", "on", "or", "should", "the", "this", "to", "what", "when", "where",
+    "which", "who", "why", "will", "with", "would", "you"
+}
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def estimate_tokens(text):
+    """Rough token count of ~4 characters per token, as used for embedding batches"""
+    return len(text) // 4 + 1
+
+
+def _truncate(text, max_tokens):
+    """Cut text to about max_tokens, preferring a line or sentence boundary"""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = max(cut.rfind("\n"), cut.rfind(". "))
+    if boundary > max_chars // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip() + " ..."
+
+
+class ContextAssembler:
+    """Selects the prompt context for a query within a token budget
+    
+    Passages are ranked by query relevance weighted by source priority, near-
+    duplicates (e.g. the same article fetched live and retrieved from the index)
+    are dropped in favour of the higher ranked copy, and the ranked passages are
+    packed into the budget, truncating long or final passages to fit.
+    """
+    
+    def __init__(self, max_tokens=DEFAULT_CONTEXT_TOKENS, max_passage_tokens=DEFAULT_MAX_PASSAGE_TOKENS,
+                 dedup_threshold=DEFAULT_DEDUP_THRESHOLD, source_priority=None):
+        self.max_tokens = max_tokens
+        self.max_passage_tokens = max_passage_tokens
+        self.dedup_threshold = dedup_threshold
+        self.source_priority = {**DEFAULT_SOURCE_PRIORITY, **(source_priority or {})}
+        self.lock = threading.Lock()
+        self.counters = {
+            "queries": 0,
+            "tokens_before": 0,
+            "tokens_after": 0,
+            "duplicates_removed": 0,
+            "passages_dropped": 0,
+            "passages_truncated": 0
+        }
+    
+    def _terms(self, text):
+        return [word for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+    
+    def _shingles(self, terms):
+        if len(terms) < SHINGLE_SIZE:
+            return {tuple(terms)}
+        return {tuple(terms[i:i + SHINGLE_SIZE]) for i in range(len(terms) - SHINGLE_SIZE + 1)}
+    
+    def _similarity(self, a, b):
+        """Jaccard similarity of two shingle sets"""
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+    
+    def _relevance(self, query_terms, passage_terms, score):
+        """Share of query terms found in the passage, blended with the search score
+        
+        Passages without a score were fetched for this query and count as a full match.
+        """
+        lexical = len(query_terms & set(passage_terms)) / len(query_terms) if query_terms else 0.0
+        return 0.5 * lexical + 0.5 * (1.0 if score is None else score)
+    
+    def assemble(self, query, passages):
+        """Build the context text for a query from candidate passages
+        
+        Each passage is a dict with 'text', 'source' and an optional search 'score'.
+        Returns the context text, the selected passages in rank order and a report
+        of the tokens used and saved against sending every passage in full.
+        """
+        query_terms = set(self._terms(query))
+        
+        candidates = []
+        for i, passage in enumerate(passages):
+            terms = self._terms(passage['text'])
+            priority = self.source_priority.get(passage['source'], 0.5)
+            candidates.append({
+                **passage,
+                "rank_score": priority * self._relevance(query_terms, terms, passage.get('score')),
+                "order": i,
+                "shingles": self._shingles(terms)
+            })
+        candidates.sort(key=lambda c: (-c["rank_score"], c["order"]))
+        
+        kept = []
+        duplicates = 0
+        for candidate in candidates:
+            if any(self._similarity(candidate["shingles"], other["shingles"]) >= self.dedup_threshold
+                   for other in kept):
+                duplicates += 1
+                continue
+            kept.append(candidate)
+        
+        selected = []
+        used = 0
+        truncated = 0
+        for candidate in kept:
+            remaining = self.max_tokens - used
+            limit = min(self.max_passage_tokens, remaining)
+            if limit < MIN_PASSAGE_TOKENS:
+                break
+            text = candidate['text']
+            if estimate_tokens(text) > limit:
+                text = _truncate(text, limit)
+                truncated += 1
+            used += estimate_tokens(text)
+            selected.append({
+                "text": text,
+                "source": candidate['source'],
+                "score": candidate.get('score'),
+                "rank_score": candidate["rank_score"]
+            })
+        
+        context_text = "\n\n".join(passage["text"] for passage in selected)
+        tokens_before = estimate_tokens("\n\n".join(passage['text'] for passage in passages)) if passages else 0
+        tokens_after = estimate_tokens(context_text) if selected else 0
+        report = {
+            "budget_tokens": self.max_tokens,
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": tokens_before - tokens_after,
+            "passages_in": len(passages),
+            "passages_selected": len(selected),
+            "duplicates_removed": duplicates,
+            "passages_dropped": len(kept) - len(selected),
+            "passages_truncated": truncated
+        }
+        
+        with self.lock:
+            self.counters["queries"] += 1
+            for name in ("tokens_before", "tokens_after", "duplicates_removed", "passages_dropped",
+                         "passages_truncated"):
+                self.counters[name] += report[name]
+        
+        return context_text, selected, report
+    
+    def get_stats(self):
+        """Get token savings over all assembled queries"""
+        with self.lock:
+            queries = self.counters["queries"]
+            tokens_saved = self.counters["tokens_before"] - self.counters["tokens_after"]
+            return {
+                **self.counters,
+                "tokens_saved": tokens_saved,
+                "avg_tokens_saved": tokens_saved / queries if queries else 0.0,
+                "budget_tokens": self.max_tokens
+            }
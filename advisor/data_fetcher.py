@@ -1,24 +1,49 @@
-import exa_py as exa
 from datetime import datetime, timedelta
-from langsmith import traceable
+from advisor.metrics import traced
+
+# Searches behind each source refresh_static_data ingests: days_back limits results to
+# recently published pages (None for pages updated in place) and livecrawl is the
+# crawl setting used for their contents
+REFRESH_SOURCES = {
+    "news": {"query": "IPL cricket latest news updates fantasy league", "num_results": 10,
+             "max_characters": 5000, "days_back": 3, "livecrawl": None},
+    "injury": {"query": "IPL cricket player injuries updates team changes", "num_results": 5,
+               "max_characters": 3000, "days_back": 7, "livecrawl": "always"},
+    "stats": {"query": "IPL cricket player statistics performance", "num_results": 5,
+              "max_characters": 5000, "days_back": None, "livecrawl": "always"}
+}
 
 class ExaDataFetcher:
-    def __init__(self, api_key):
-        self.client = exa.Exa(api_key)
+    def __init__(self, api_key, client=None):
+        self.api_key = api_key
+        self._client = client
+    
+    @property
+    def client(self):
+        """Exa client, created on first use so startup does not wait for exa_py to import"""
+        if self._client is None:
+            import exa_py as exa
+            self._client = exa.Exa(self.api_key)
+        return self._client
     
-    @traceable(name="fetch_latest_news", run_type="retriever")
-    def fetch_latest_news(self, days_back=3):
-        """Fetch latest IPL news using Exa"""
+    @traced(name="fetch_latest_news", run_type="retriever")
+    def fetch_latest_news(self, days_back=3, livecrawl=None):
+        """Fetch latest IPL news using Exa
+        
+        Every method takes a livecrawl setting for Exa; None leaves Exa's default.
+        """
+        source = REFRESH_SOURCES["news"]
         end_date = datetime.now().strftime("%Y-%m-%d")
         start_date = (datetime.now() - timedelta(days=days_back)).strftime("%Y-%m-%d")
         
         results = self.client.search_and_contents(
-            "IPL cricket latest news updates fantasy league",
-            text={"maxCharacters": 5000},
-            num_results=10,
+            source["query"],
+            text={"maxCharacters": source["max_characters"]},
+            num_results=source["num_results"],
             start_published_date=start_date,
             end_published_date=end_date,
-            type="auto"
+            type="auto",
+            **({"livecrawl": livecrawl} if livecrawl else {})
         )
         
         processed_results = [
@@ -33,17 +58,18 @@ class ExaDataFetcher:
         
         return processed_results
     
-    @traceable(name="fetch_player_stats", run_type="retriever")
-    def fetch_player_stats(self, player_name=None):
+    @traced(name="fetch_player_stats", run_type="retriever")
+    def fetch_player_stats(self, player_name=None, livecrawl="always"):
         """Fetch player statistics using Exa"""
-        query = f"IPL cricket {player_name} statistics performance" if player_name else "IPL cricket player statistics performance"
+        source = REFRESH_SOURCES["stats"]
+        query = f"IPL cricket {player_name} statistics performance" if player_name else source["query"]
         
         results = self.client.search_and_contents(
             query,
-            text={"maxCharacters": 5000},
-            num_results=5,
+            text={"maxCharacters": source["max_characters"]},
+            num_results=source["num_results"],
             type="auto",
-            livecrawl="always"
+            livecrawl=livecrawl
         )
         
         processed_results = [
@@ -57,20 +83,21 @@ class ExaDataFetcher:
         
         return processed_results
     
-    @traceable(name="fetch_injury_reports", run_type="retriever")
-    def fetch_injury_reports(self):
+    @traced(name="fetch_injury_reports", run_type="retriever")
+    def fetch_injury_reports(self, livecrawl="always"):
         """Fetch injury reports using Exa"""
+        source = REFRESH_SOURCES["injury"]
         end_date = datetime.now().strftime("%Y-%m-%d")
-        start_date = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
+        start_date = (datetime.now() - timedelta(days=source["days_back"])).strftime("%Y-%m-%d")
         
         results = self.client.search_and_contents(
-            "IPL cricket player injuries updates team changes",
-            text={"maxCharacters": 3000},
-            num_results=5,
+            source["query"],
+            text={"maxCharacters": source["max_characters"]},
+            num_results=source["num_results"],
             start_published_date=start_date,
             end_published_date=end_date,
             type="auto",
-            livecrawl="always"
+            livecrawl=livecrawl
         )
         
         processed_results = [
@@ -85,8 +112,8 @@ class ExaDataFetcher:
         
         return processed_results
     
-    @traceable(name="fetch_matchup_analysis", run_type="retriever")
-    def fetch_matchup_analysis(self, team1=None, team2=None):
+    @traced(name="fetch_matchup_analysis", run_type="retriever")
+    def fetch_matchup_analysis(self, team1=None, team2=None, livecrawl="always"):
         """Fetch matchup analysis using Exa"""
         query = "IPL cricket matchup analysis team performance comparison"
         if team1 and team2:
@@ -97,7 +124,7 @@ class ExaDataFetcher:
             text={"maxCharacters": 4000},
             num_results=3,
             type="auto",
-            livecrawl="always" 
+            livecrawl=livecrawl
         )
         
         processed_results = [
@@ -109,4 +136,60 @@ class ExaDataFetcher:
             for result in results.results
         ]
         
-        return processed_results
\ No newline at end of file
+        return processed_results
+    
+    @traced(name="search_urls", run_type="retriever")
+    def search_urls(self, source, since=None):
+        """List a refresh source's results without their contents
+        
+        since (a YYYY-MM-DD date) narrows the source's published-date window to
+        pages published since then. Returns the url, title and published_date of
+        each result, for fetch_contents to fetch only the ones not yet ingested.
+        """
+        spec = REFRESH_SOURCES[source]
+        options = {}
+        if spec["days_back"] is not None:
+            start_date = (datetime.now() - timedelta(days=spec["days_back"])).strftime("%Y-%m-%d")
+            options["start_published_date"] = max(start_date, since) if since else start_date
+            options["end_published_date"] = datetime.now().strftime("%Y-%m-%d")
+        
+        results = self.client.search(
+            spec["query"],
+            contents=False,
+            num_results=spec["num_results"],
+            type="auto",
+            **options
+        )
+        
+        return [
+            {
+                "title": result.title,
+                "url": result.url,
+                "published_date": result.published_date
+            }
+            for result in results.results
+        ]
+    
+    @traced(name="fetch_contents", run_type="retriever")
+    def fetch_contents(self, source, urls, livecrawl=None):
+        """Fetch the text of pages listed by search_urls, as the matching fetch method would return them
+        
+        livecrawl overrides the source's crawl setting.
+        """
+        spec = REFRESH_SOURCES[source]
+        livecrawl = livecrawl or spec["livecrawl"]
+        results = self.client.get_contents(
+            list(urls),
+            text={"maxCharacters": spec["max_characters"]},
+            **({"livecrawl": livecrawl} if livecrawl else {})
+        )
+        
+        return [
+            {
+                "title": result.title,
+                "url": result.url,
+                "text": result.text,
+                "published_date": result.published_date
+            }
+            for result in results.results
+        ]
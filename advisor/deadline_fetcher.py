@@ -0,0 +1,265 @@
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from advisor.metrics import METRICS, submit_in_context
+
+# ExaDataFetcher methods wrapped by DeadlineDataFetcher
+FETCH_METHODS = ("fetch_latest_news", "fetch_player_stats", "fetch_injury_reports", "fetch_matchup_analysis",
+                 "search_urls", "fetch_contents")
+# Methods that crawl nothing; their hedge is the same request sent again
+UNCRAWLED_METHODS = ("search_urls",)
+
+# Seconds a fetch may take before the last good result is served instead
+DEFAULT_DEADLINE = 5.0
+# A method's hedge is sent after the p95 of its last LATENCY_WINDOW primary requests (once it has
+# MIN_HEDGE_SAMPLES), but no later than this fraction of its deadline so the hedge has time to answer
+MAX_HEDGE_FRACTION = 0.5
+MIN_HEDGE_SAMPLES = 20
+LATENCY_WINDOW = 200
+# livecrawl setting of hedged requests: Exa's cached copy of the pages instead of a fresh crawl
+HEDGE_LIVECRAWL = "never"
+# Consecutive failed or late fetches that open a method's circuit, and seconds before a trial request
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+# Requests in flight at once, including ones still running after their caller's deadline
+DEFAULT_MAX_WORKERS = 8
+
+
+class FetchResult(list):
+    """Fetched items; degraded (with a reason) when they are not a fresh answer from the primary request"""
+
+    def __init__(self, items=(), degraded=False, degraded_reason=None):
+        super().__init__(items)
+        self.degraded = degraded
+        self.degraded_reason = degraded_reason
+
+
+class FetchUnavailableError(Exception):
+    """Raised when a fetch fails or is cut off and there is no earlier result to fall back on"""
+
+
+class CircuitBreaker:
+    """Stops calls to an endpoint after consecutive failures
+
+    After failure_threshold failures in a row the circuit opens and calls are
+    refused. Once reset_timeout has passed a single trial call is let through
+    (half-open): its success closes the circuit, its failure reopens it.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.times_opened = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.trial_running and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.trial_running = True
+                return True
+            return False
+
+    def record(self, success):
+        with self.lock:
+            trial = self.trial_running
+            self.trial_running = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half_open" if self.trial_running else "open"
+
+
+class DeadlineDataFetcher:
+    """Deadlines, hedged requests and circuit breakers in front of ExaDataFetcher
+
+    Every call returns within its method's deadline. If the primary request has
+    not answered by the method's recent p95 latency (or fails first), a hedged
+    request is sent with livecrawl="never" (search_urls, which crawls nothing,
+    repeats the request) and the first success wins. When both
+    miss the deadline or fail, or the method's circuit is open, the last good
+    result for the same arguments is returned with degraded set; without one,
+    the error (or FetchUnavailableError) is raised. Requests cut off by the
+    deadline keep running in the background and still update the last good
+    result.
+    """
+
+    def __init__(self, fetcher, deadline=DEFAULT_DEADLINE, deadlines=None, hedge=True,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT,
+                 max_entries=1024, max_workers=DEFAULT_MAX_WORKERS):
+        self.fetcher = fetcher
+        self.deadlines = {**{method: deadline for method in FETCH_METHODS}, **(deadlines or {})}
+        self.hedge = hedge
+        self.max_entries = max_entries
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="exa-fetch")
+        self.breakers = {method: CircuitBreaker(failure_threshold, reset_timeout) for method in FETCH_METHODS}
+        self.latencies = {method: deque(maxlen=LATENCY_WINDOW) for method in FETCH_METHODS}
+        self.last_good = OrderedDict()
+        self.lock = threading.Lock()
+        self.metrics = {
+            method: {"calls": 0, "hedged": 0, "hedge_wins": 0, "deadline_exceeded": 0, "errors": 0,
+                     "circuit_rejected": 0, "degraded": 0, "unavailable": 0}
+            for method in FETCH_METHODS
+        }
+
+    def __getattr__(self, name):
+        return getattr(self.fetcher, name)
+
+    def fetch_latest_news(self, days_back=3):
+        """Fetch latest IPL news within the deadline"""
+        return self._call("fetch_latest_news", days_back)
+
+    def fetch_player_stats(self, player_name=None):
+        """Fetch player statistics within the deadline"""
+        return self._call("fetch_player_stats", player_name)
+
+    def fetch_injury_reports(self):
+        """Fetch injury reports within the deadline"""
+        return self._call("fetch_injury_reports")
+
+    def fetch_matchup_analysis(self, team1=None, team2=None):
+        """Fetch matchup analysis within the deadline"""
+        return self._call("fetch_matchup_analysis", team1, team2)
+
+    def search_urls(self, source, since=None):
+        """List a refresh source's results within the deadline"""
+        return self._call("search_urls", source, since)
+
+    def fetch_contents(self, source, urls):
+        """Fetch the text of listed pages within the deadline"""
+        return self._call("fetch_contents", source, tuple(urls))
+
+    def hedge_delay(self, method):
+        """Seconds the primary request gets before a hedge is sent"""
+        with self.lock:
+            samples = sorted(self.latencies[method])
+        latest = self.deadlines[method] * MAX_HEDGE_FRACTION
+        if len(samples) < MIN_HEDGE_SAMPLES:
+            return latest
+        return min(samples[min(int(len(samples) * 0.95), len(samples) - 1)], latest)
+
+    def _call(self, method, *args):
+        key = (method, args)
+        metrics = self.metrics[method]
+        breaker = self.breakers[method]
+        start = time.monotonic()
+        deadline_at = start + self.deadlines[method]
+        with self.lock:
+            metrics["calls"] += 1
+
+        if not breaker.allow():
+            with self.lock:
+                metrics["circuit_rejected"] += 1
+            return self._fallback(key, "circuit_open", start)
+
+        primary = self._submit(key)
+        pending = {primary}
+        hedge_at = start + self.hedge_delay(method) if self.hedge else None
+        hedged = False
+        error = None
+        while pending:
+            now = time.monotonic()
+            if hedge_at is not None and not hedged and now >= hedge_at:
+                pending.add(self._submit(key, hedge=True))
+                hedged = True
+                with self.lock:
+                    metrics["hedged"] += 1
+            if now >= deadline_at:
+                break
+            wake = deadline_at if hedged or hedge_at is None else min(hedge_at, deadline_at)
+            done, pending = wait(pending, timeout=max(wake - now, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    value = future.result()
+                except Exception as e:
+                    error = e
+                    if future is primary and hedge_at is not None and not hedged:
+                        # Send the hedge at once instead of waiting out the primary's p95
+                        pending.add(self._submit(key, hedge=True))
+                        hedged = True
+                        with self.lock:
+                            metrics["hedged"] += 1
+                    continue
+                breaker.record(True)
+                degraded = future is not primary
+                if degraded:
+                    with self.lock:
+                        metrics["hedge_wins"] += 1
+                self._observe(method, start, "hedged" if degraded else "ok")
+                return FetchResult(value, degraded=degraded, degraded_reason="hedged" if degraded else None)
+
+        breaker.record(False)
+        with self.lock:
+            metrics["deadline_exceeded" if pending else "errors"] += 1
+        return self._fallback(key, "deadline_exceeded" if pending else "error", start, None if pending else error)
+
+    def _submit(self, key, hedge=False):
+        """Run a request for key in the background, remembering its result as the last good one"""
+        method, args = key
+        kwargs = {"livecrawl": HEDGE_LIVECRAWL} if hedge and method not in UNCRAWLED_METHODS else {}
+        submitted = time.monotonic()
+        future = submit_in_context(self.executor, getattr(self.fetcher, method), *args, **kwargs)
+
+        def remember(future):
+            if future.cancelled() or future.exception() is not None:
+                return
+            with self.lock:
+                if not hedge:
+                    self.latencies[method].append(time.monotonic() - submitted)
+                self.last_good[key] = future.result()
+                self.last_good.move_to_end(key)
+                while len(self.last_good) > self.max_entries:
+                    self.last_good.popitem(last=False)
+
+        future.add_done_callback(remember)
+        return future
+
+    def _fallback(self, key, reason, start, error=None):
+        """Serve the last good result for key as degraded, or raise if there is none"""
+        method = key[0]
+        with self.lock:
+            value = self.last_good.get(key)
+            self.metrics[method]["degraded" if value is not None else "unavailable"] += 1
+        if value is None:
+            self._observe(method, start, "unavailable")
+            if error is not None:
+                raise error
+            raise FetchUnavailableError(f"{method} failed ({reason}) with no earlier result to fall back on")
+        self._observe(method, start, "degraded")
+        METRICS.increment("exa_degraded_total", method=method, reason=reason)
+        return FetchResult(value, degraded=True, degraded_reason=reason)
+
+    def _observe(self, method, start, outcome):
+        METRICS.observe("exa_fetch_seconds", time.monotonic() - start, method=method, outcome=outcome)
+
+    def get_stats(self):
+        """Get per-method outcomes, hedge delays and circuit breaker states"""
+        with self.lock:
+            by_method = {method: dict(metrics) for method, metrics in self.metrics.items()}
+            entries = len(self.last_good)
+        for method, metrics in by_method.items():
+            metrics["deadline"] = self.deadlines[method]
+            metrics["hedge_delay"] = self.hedge_delay(method)
+            metrics["circuit"] = self.breakers[method].state
+            metrics["circuit_opened"] = self.breakers[method].times_opened
+        return {
+            "degraded": sum(metrics["degraded"] for metrics in by_method.values()),
+            "fallback_entries": entries,
+            "by_method": by_method
+        }
@@ -0,0 +1,156 @@
+import numpy as np
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Disk capacity starts small and doubles up to max_entries so the files stay compact
+INITIAL_CAPACITY = 1024
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache: an in-memory LRU in front of memory-mapped files
+    
+    Vectors are stored as float32 rows in ``<model>.vectors``, with the row's key
+    (md5 of model and text) in ``<model>.keys`` and its last access tick in
+    ``<model>.ticks``. Once ``max_entries`` is reached the least recently used
+    row is overwritten.
+    """
+    
+    def __init__(self, model, dimension=1536, cache_dir="data/embedding_cache",
+                 max_entries=50000, memory_entries=1024):
+        self.model = model
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.vectors_file = os.path.join(cache_dir, f"{model}.vectors")
+        self.keys_file = os.path.join(cache_dir, f"{model}.keys")
+        self.ticks_file = os.path.join(cache_dir, f"{model}.ticks")
+        self.memory = OrderedDict()
+        self.slots = OrderedDict()
+        self.free_slots = []
+        self.tick = 0
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        
+        os.makedirs(cache_dir, exist_ok=True)
+        
+        self._load()
+    
+    def _key(self, text):
+        return hashlib.md5(f"{self.model}\0{text}".encode()).hexdigest().encode()
+    
+    def _load(self):
+        """Open the cache files and rebuild the key to slot map in LRU order"""
+        capacity = 0
+        if os.path.exists(self.keys_file):
+            capacity = os.path.getsize(self.keys_file) // 32
+            expected = (capacity * self.dimension * 4, capacity * 8)
+            if (not os.path.exists(self.vectors_file) or not os.path.exists(self.ticks_file) or
+                    (os.path.getsize(self.vectors_file), os.path.getsize(self.ticks_file)) != expected):
+                capacity = 0
+        
+        if capacity == 0:
+            self._open(min(INITIAL_CAPACITY, self.max_entries), reset=True)
+            self.free_slots = list(range(self.capacity - 1, -1, -1))
+            return
+        
+        self._open(capacity)
+        occupied = [slot for slot in range(capacity) if self.keys[slot]]
+        occupied.sort(key=lambda slot: self.ticks[slot])
+        for slot in occupied:
+            self.slots[bytes(self.keys[slot])] = slot
+        self.free_slots = [slot for slot in range(capacity - 1, -1, -1) if not self.keys[slot]]
+        self.tick = int(self.ticks.max()) if capacity else 0
+    
+    def _open(self, capacity, reset=False):
+        """Map the cache files at the given capacity, growing them if needed"""
+        for path, row_bytes in ((self.vectors_file, self.dimension * 4), (self.keys_file, 32), (self.ticks_file, 8)):
+            with open(path, 'wb' if reset else 'ab') as f:
+                f.truncate(capacity * row_bytes)
+        
+        self.capacity = capacity
+        self.vectors = np.memmap(self.vectors_file, dtype=np.float32, mode='r+', shape=(capacity, self.dimension))
+        self.keys = np.memmap(self.keys_file, dtype='S32', mode='r+', shape=(capacity,))
+        self.ticks = np.memmap(self.ticks_file, dtype=np.int64, mode='r+', shape=(capacity,))
+    
+    def _grow(self):
+        old_capacity = self.capacity
+        self._flush()
+        # _open rebinds the maps; the old ones are closed once nothing refers to them
+        self._open(min(old_capacity * 2, self.max_entries))
+        self.free_slots.extend(range(self.capacity - 1, old_capacity - 1, -1))
+    
+    def _remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+    
+    def get_many(self, texts):
+        """Return the cached vector for each text, or None where it is missing"""
+        results = []
+        with self.lock:
+            for text in texts:
+                key = self._key(text)
+                vector = self.memory.get(key)
+                if vector is not None:
+                    self.memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                elif key in self.slots:
+                    slot = self.slots[key]
+                    self.slots.move_to_end(key)
+                    self.tick += 1
+                    self.ticks[slot] = self.tick
+                    vector = np.array(self.vectors[slot])
+                    self._remember(key, vector)
+                    self.counters["disk_hits"] += 1
+                else:
+                    self.counters["misses"] += 1
+                results.append(vector)
+        return results
+    
+    def put_many(self, texts, vectors):
+        """Store vectors for texts, evicting least recently used entries when full"""
+        with self.lock:
+            for text, vector in zip(texts, vectors):
+                key = self._key(text)
+                vector = np.asarray(vector, dtype=np.float32)
+                if key not in self.slots:
+                    if not self.free_slots and self.capacity < self.max_entries:
+                        self._grow()
+                    if self.free_slots:
+                        slot = self.free_slots.pop()
+                    else:
+                        _, slot = self.slots.popitem(last=False)
+                        self.counters["evictions"] += 1
+                    self.slots[key] = slot
+                    self.keys[slot] = key
+                    self.vectors[slot] = vector
+                self.slots.move_to_end(key)
+                self.tick += 1
+                self.ticks[self.slots[key]] = self.tick
+                self._remember(key, vector)
+    
+    def _flush(self):
+        self.vectors.flush()
+        self.keys.flush()
+        self.ticks.flush()
+    
+    def flush(self):
+        """Flush memory-mapped writes to disk"""
+        with self.lock:
+            self._flush()
+    
+    def get_stats(self):
+        """Get cache hit/miss counters and occupancy"""
+        lookups = sum(self.counters[name] for name in ("memory_hits", "disk_hits", "misses"))
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        return {
+            **self.counters,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self.slots),
+            "memory_entries": len(self.memory),
+            "capacity": self.capacity,
+            "max_entries": self.max_entries
+        }
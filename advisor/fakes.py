@@ -0,0 +1,220 @@
+import hashlib
+import random
+import threading
+import time
+import types
+import numpy as np
+from datetime import date, datetime, timedelta
+from advisor.data_fetcher import ExaDataFetcher
+from advisor.llm_interface import OpenAIInterface
+
+TEAMS = ['Mumbai Indians', 'Chennai Super Kings', 'Royal Challengers Bangalore',
+         'Kolkata Knight Riders', 'Delhi Capitals', 'Punjab Kings',
+         'Rajasthan Royals', 'Sunrisers Hyderabad', 'Gujarat Titans', 'Lucknow Super Giants']
+PLAYERS = ['Kohli', 'Rohit', 'Bumrah', 'Dhoni', 'Jadeja', 'Gill', 'Pant', 'Rashid', 'Russell', 'Chahal',
+           'Buttler', 'Siraj', 'Samson', 'Hardik', 'Klaasen', 'Narine', 'Pooran', 'Arshdeep', 'Gaikwad', 'Head']
+WORDS = ['scored', 'runs', 'wickets', 'economy', 'strike', 'rate', 'powerplay', 'death', 'overs', 'form',
+         'captain', 'fantasy', 'points', 'pitch', 'spin', 'pace', 'batting', 'bowling', 'innings', 'fifty',
+         'century', 'injury', 'fitness', 'squad', 'playing', 'eleven', 'venue', 'toss', 'chase', 'boundary']
+
+
+class FakeBackendError(Exception):
+    """Raised by a fake backend to simulate a failed API call"""
+
+
+class SimulatedLatency:
+    """Sleeps for a jittered delay and fails a fraction of calls, drawing from a seeded RNG"""
+    
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+    
+    def __call__(self, operation):
+        with self.lock:
+            delay = self.latency * (1 + self.rng.uniform(-self.jitter, self.jitter))
+            failed = self.rng.random() < self.failure_rate
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            raise FakeBackendError(f"simulated {operation} failure")
+
+
+def synthetic_text(key, max_chars):
+    """Deterministic cricket-flavoured prose of about max_chars characters for a key"""
+    rng = random.Random(key)
+    sentences = []
+    length = 0
+    while length < max_chars:
+        words = [rng.choice(PLAYERS), rng.choice(WORDS)]
+        words += [rng.choice(WORDS) for _ in range(rng.randint(4, 12))]
+        words.insert(rng.randint(1, len(words)), f"against {rng.choice(TEAMS)}")
+        sentence = " ".join(words) + f" with {rng.randint(0, 120)} {rng.choice(['runs', 'balls', 'points'])}."
+        if rng.random() < 0.2:
+            sentence += "\n\n"
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)[:max_chars]
+
+
+def synthetic_embedding(text, dimension):
+    """Deterministic unit vector for a text"""
+    seed = int(hashlib.md5(text.encode()).hexdigest()[:16], 16)
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeExaClient:
+    """Stands in for exa_py.Exa's search_and_contents, search and get_contents
+    
+    Results depend on the query, the result number and ``epoch``; bump the epoch
+    to simulate new articles being published. By default every epoch brings a
+    whole new set of results; with ``new_per_epoch`` the results are a window
+    that slides by that many new articles per epoch, as a refresh a few hours
+    after the last one would see. Requests with livecrawl="always" also wait
+    ``crawl_latency``, and a ``slow_crawl_rate`` fraction of them
+    ``slow_crawl_latency`` instead, to give live crawls a long tail.
+    """
+    
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, seed=0, crawl_latency=0.0, slow_crawl_rate=0.0,
+                 slow_crawl_latency=0.0, new_per_epoch=None):
+        self.simulate = SimulatedLatency(latency, jitter, failure_rate, seed)
+        self.simulate_crawl = SimulatedLatency(crawl_latency, jitter, 0.0, seed + 1)
+        self.simulate_slow_crawl = SimulatedLatency(slow_crawl_latency, jitter, 0.0, seed + 2)
+        self.slow_crawl_rate = slow_crawl_rate
+        self.crawl_rng = random.Random(seed + 3)
+        self.crawl_lock = threading.Lock()
+        self.new_per_epoch = new_per_epoch
+        self.seed = seed
+        self.epoch = 0
+        self.calls = 0
+        # Result key of every URL handed out, so get_contents returns the same page
+        self.pages = {}
+    
+    def _simulate_request(self, livecrawl):
+        self.simulate("exa search")
+        if livecrawl == "always":
+            with self.crawl_lock:
+                slow = self.crawl_rng.random() < self.slow_crawl_rate
+            (self.simulate_slow_crawl if slow else self.simulate_crawl)("exa livecrawl")
+        self.calls += 1
+    
+    def _page(self, key, max_chars=None):
+        rng = random.Random(key)
+        # Relative to midnight so repeated calls on a day return identical documents
+        published = datetime.combine(date.today(), datetime.min.time()) - timedelta(minutes=rng.randint(0, 72 * 60))
+        url = f"https://example.com/{hashlib.md5(key.encode()).hexdigest()[:12]}"
+        self.pages[url] = key
+        page = types.SimpleNamespace(
+            title=f"{rng.choice(PLAYERS)} and {rng.choice(TEAMS)}: {rng.choice(WORDS)} {rng.choice(WORDS)}",
+            url=url,
+            published_date=published.strftime("%Y-%m-%dT%H:%M:%S")
+        )
+        if max_chars is not None:
+            page.text = synthetic_text(key, rng.randint(max_chars // 2, max_chars))
+        return page
+    
+    def _keys(self, query, num_results):
+        if self.new_per_epoch is None:
+            return [f"{self.seed}:{self.epoch}:{query}:{i}" for i in range(num_results)]
+        first = self.epoch * self.new_per_epoch
+        return [f"{self.seed}:{query}:{i}" for i in range(first, first + num_results)]
+    
+    def search_and_contents(self, query, text=None, num_results=10, **kwargs):
+        self._simulate_request(kwargs.get("livecrawl"))
+        max_chars = (text or {}).get("maxCharacters", 5000)
+        return types.SimpleNamespace(results=[self._page(key, max_chars) for key in self._keys(query, num_results)])
+    
+    def search(self, query, contents=None, num_results=10, **kwargs):
+        self._simulate_request(None)
+        max_chars = None if contents is False else 10000
+        return types.SimpleNamespace(results=[self._page(key, max_chars) for key in self._keys(query, num_results)])
+    
+    def get_contents(self, urls, text=None, **kwargs):
+        self._simulate_request(kwargs.get("livecrawl"))
+        max_chars = (text or {}).get("maxCharacters", 10000)
+        return types.SimpleNamespace(results=[self._page(self.pages[url], max_chars) for url in urls
+                                              if url in self.pages])
+
+
+class _FakeEmbeddings:
+    def __init__(self, owner):
+        self.owner = owner
+    
+    def create(self, input, model):
+        texts = [input] if isinstance(input, str) else list(input)
+        self.owner.simulate_embedding("embedding")
+        self.owner.embedding_calls += 1
+        return types.SimpleNamespace(data=[
+            types.SimpleNamespace(index=i, embedding=synthetic_embedding(text, self.owner.dimension))
+            for i, text in enumerate(texts)
+        ])
+
+
+class _FakeCompletions:
+    def __init__(self, owner):
+        self.owner = owner
+    
+    def create(self, model, messages, temperature=None, max_tokens=800, stream=False, stream_options=None):
+        owner = self.owner
+        prompt = " ".join(message["content"] for message in messages)
+        words = synthetic_text(prompt, owner.response_chars).split(" ")
+        usage = types.SimpleNamespace(
+            prompt_tokens=len(prompt) // 4,
+            completion_tokens=len(words),
+            total_tokens=len(prompt) // 4 + len(words)
+        )
+        owner.completion_calls += 1
+        
+        if not stream:
+            owner.simulate_completion("completion")
+            time.sleep(len(words) / owner.tokens_per_second)
+            return types.SimpleNamespace(
+                choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=" ".join(words)))],
+                usage=usage
+            )
+        
+        def chunks():
+            owner.simulate_completion("completion")
+            for i, word in enumerate(words):
+                yield types.SimpleNamespace(
+                    choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=word if i == 0 else " " + word))],
+                    usage=None
+                )
+                time.sleep(1 / owner.tokens_per_second)
+            yield types.SimpleNamespace(choices=[], usage=usage)
+        
+        return chunks()
+
+
+class FakeOpenAIClient:
+    """Stands in for openai.OpenAI's embeddings and chat completions
+    
+    Embeddings are deterministic unit vectors per text. Completions wait
+    ``completion_latency`` (time to first token) and then produce
+    ``tokens_per_second`` words of synthetic text.
+    """
+    
+    def __init__(self, dimension=1536, embedding_latency=0.0, completion_latency=0.0, tokens_per_second=200,
+                 response_chars=600, jitter=0.0, failure_rate=0.0, seed=0):
+        self.dimension = dimension
+        self.tokens_per_second = tokens_per_second
+        self.response_chars = response_chars
+        self.simulate_embedding = SimulatedLatency(embedding_latency, jitter, failure_rate, seed)
+        self.simulate_completion = SimulatedLatency(completion_latency, jitter, failure_rate, seed + 1)
+        self.embedding_calls = 0
+        self.completion_calls = 0
+        self.embeddings = _FakeEmbeddings(self)
+        self.chat = types.SimpleNamespace(completions=_FakeCompletions(self))
+
+
+def fake_data_fetcher(latency=0.0, jitter=0.0, failure_rate=0.0, seed=0, **options):
+    """ExaDataFetcher backed by a FakeExaClient; options are its other keyword arguments"""
+    return ExaDataFetcher(api_key=None, client=FakeExaClient(latency, jitter, failure_rate, seed, **options))
+
+
+def fake_llm(client):
+    """OpenAIInterface backed by a FakeOpenAIClient"""
+    return OpenAIInterface(api_key=None, client=client)
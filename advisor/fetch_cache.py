@@ -0,0 +1,136 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Seconds a fetch result is served as fresh, per ExaDataFetcher method
+DEFAULT_TTLS = {
+    "fetch_latest_news": 30 * 60,
+    "fetch_injury_reports": 15 * 60,
+    "fetch_player_stats": 5 * 60,
+    "fetch_matchup_analysis": 10 * 60
+}
+
+
+class CachedDataFetcher:
+    """TTL cache with stale-while-revalidate and single-flight in front of ExaDataFetcher
+    
+    A result younger than its method's TTL is served from memory. For a further
+    ``stale_ttl`` seconds the stale result is still served while one background
+    fetch refreshes it. Concurrent calls with the same arguments share a single
+    in-flight fetch. Results are shared between callers and must not be mutated.
+    Results flagged degraded (see DeadlineDataFetcher) go to the waiting callers
+    but are not cached.
+    """
+    
+    def __init__(self, fetcher, ttls=None, stale_ttls=None, max_entries=1024, revalidate_workers=2):
+        self.fetcher = fetcher
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.stale_ttls = {**self.ttls, **(stale_ttls or {})}
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.revalidator = ThreadPoolExecutor(max_workers=revalidate_workers)
+        self.metrics = {
+            method: {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+            for method in self.ttls
+        }
+    
+    def __getattr__(self, name):
+        return getattr(self.fetcher, name)
+    
+    def fetch_latest_news(self, days_back=3):
+        """Fetch latest IPL news, cached"""
+        return self._cached("fetch_latest_news", days_back)
+    
+    def fetch_player_stats(self, player_name=None):
+        """Fetch player statistics, cached"""
+        return self._cached("fetch_player_stats", player_name)
+    
+    def fetch_injury_reports(self):
+        """Fetch injury reports, cached"""
+        return self._cached("fetch_injury_reports")
+    
+    def fetch_matchup_analysis(self, team1=None, team2=None):
+        """Fetch matchup analysis, cached"""
+        return self._cached("fetch_matchup_analysis", team1, team2)
+    
+    def _cached(self, method, *args):
+        key = (method, args)
+        metrics = self.metrics[method]
+        
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, fetched_at = entry
+                age = time.monotonic() - fetched_at
+                if age <= self.ttls[method]:
+                    self.entries.move_to_end(key)
+                    metrics["hits"] += 1
+                    return value
+                if age <= self.ttls[method] + self.stale_ttls[method]:
+                    self.entries.move_to_end(key)
+                    metrics["stale_hits"] += 1
+                    if key not in self.inflight:
+                        future = self.inflight[key] = Future()
+                        self.revalidator.submit(self._fetch, key, future)
+                    return value
+            
+            future = self.inflight.get(key)
+            if future is not None:
+                metrics["coalesced"] += 1
+                owner = False
+            else:
+                metrics["misses"] += 1
+                future = self.inflight[key] = Future()
+                owner = True
+        
+        if owner:
+            self._fetch(key, future)
+        return future.result()
+    
+    def _fetch(self, key, future):
+        """Run the underlying fetch for key and publish the result to waiters"""
+        method, args = key
+        try:
+            value = getattr(self.fetcher, method)(*args)
+        except Exception as e:
+            with self.lock:
+                self.metrics[method]["errors"] += 1
+                self.inflight.pop(key, None)
+            future.set_exception(e)
+            return
+        
+        with self.lock:
+            if not getattr(value, "degraded", False):
+                self.entries[key] = (value, time.monotonic())
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            self.inflight.pop(key, None)
+        future.set_result(value)
+    
+    def invalidate(self, method=None):
+        """Drop cached results, for one method or all of them"""
+        with self.lock:
+            for key in [key for key in self.entries if method is None or key[0] == method]:
+                del self.entries[key]
+    
+    def get_stats(self):
+        """Get cache hit/miss metrics per method and overall"""
+        with self.lock:
+            totals = {name: sum(metrics[name] for metrics in self.metrics.values())
+                      for name in ("hits", "stale_hits", "misses", "coalesced", "errors")}
+            lookups = totals["hits"] + totals["stale_hits"] + totals["misses"] + totals["coalesced"]
+            served = totals["hits"] + totals["stale_hits"] + totals["coalesced"]
+            stats = {
+                **totals,
+                "hit_rate": served / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "in_flight": len(self.inflight),
+                "by_method": {method: dict(metrics) for method, metrics in self.metrics.items()}
+            }
+        if hasattr(self.fetcher, 'get_stats'):
+            stats["upstream"] = self.fetcher.get_stats()
+        return stats
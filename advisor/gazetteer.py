@@ -0,0 +1,96 @@
+import json
+import os
+from functools import lru_cache
+from advisor.context_assembler import WORD_PATTERN
+
+# Players, teams and their aliases, plus the intent, confidence and domain phrases queries and responses are scanned for
+DEFAULT_GAZETTEER_FILE = os.path.join(os.path.dirname(__file__), "gazetteer.json")
+
+
+def phrase_tokens(text):
+    """Lowercased words of a text, as phrases are matched: whole words, ignoring case and punctuation"""
+    return WORD_PATTERN.findall(text.lower())
+
+
+class GazetteerMatcher:
+    """Aho-Corasick automaton over the words of every gazetteer phrase
+
+    A gazetteer maps category -> value -> phrases, e.g. "team" -> "Mumbai Indians"
+    -> ["Mumbai Indians", "MI", "Mumbai"]. match() reads a text's words once,
+    following failure links instead of rescanning, so its cost depends on the
+    length of the text and the number of matches, not on the number of phrases.
+    Phrases match whole words only, so "MI" does not match inside "might".
+    """
+
+    def __init__(self, gazetteer):
+        # Per state: next state by word, failure state, and (category, value, phrase) matches ending there
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [()]
+        self.phrase_count = 0
+        self.categories = {category: len(values) for category, values in gazetteer.items()}
+        for category, values in gazetteer.items():
+            for value, phrases in values.items():
+                for phrase in phrases:
+                    words = phrase_tokens(phrase)
+                    self._add(words, (category, value, " ".join(words)))
+        self._link()
+
+    @classmethod
+    def load(cls, path=DEFAULT_GAZETTEER_FILE):
+        """Build a matcher from a gazetteer JSON file"""
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def _add(self, words, output):
+        if not words:
+            return
+        state = 0
+        for word in words:
+            following = self.goto[state].get(word)
+            if following is None:
+                following = self.goto[state][word] = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append(())
+            state = following
+        if output not in self.outputs[state]:
+            self.outputs[state] += (output,)
+            self.phrase_count += 1
+
+    def _link(self):
+        """Set failure links breadth first, merging each state's outputs with those of its failure state"""
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for word, following in self.goto[state].items():
+                queue.append(following)
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[following] = self.goto[fallback].get(word, 0)
+                self.outputs[following] += tuple(output for output in self.outputs[self.fail[following]]
+                                                 if output not in self.outputs[following])
+
+    def match(self, text):
+        """Every phrase in a text, as {category: {value: [phrases matched]}} in order of first occurrence"""
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        found = {}
+        state = 0
+        for word in phrase_tokens(text):
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            for category, value, phrase in outputs[state]:
+                phrases = found.setdefault(category, {}).setdefault(value, [])
+                if phrase not in phrases:
+                    phrases.append(phrase)
+        return found
+
+    def get_stats(self):
+        return {"phrases": self.phrase_count, "states": len(self.goto), "values": dict(self.categories)}
+
+
+@lru_cache(maxsize=None)
+def default_matcher():
+    """Matcher over the bundled gazetteer, built once and shared"""
+    return GazetteerMatcher.load()
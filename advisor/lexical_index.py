@@ -0,0 +1,222 @@
+import json
+import math
+import numpy as np
+from array import array
+from collections import Counter
+from advisor.context_assembler import STOPWORDS, WORD_PATTERN
+
+# BM25 term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Stored in place of a document length for deleted documents
+DELETED = -1
+
+
+def tokenize(text):
+    """Lowercased words of a text, without stopwords, as indexed and queried"""
+    return [word for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+
+
+def term_counts(text):
+    """Term frequencies of a text, ready for LexicalIndex.add"""
+    return Counter(tokenize(text))
+
+
+class LexicalIndex:
+    """BM25 inverted index over the documents of a VectorStore, indexed by position
+
+    Postings loaded from a snapshot are held as one array per field with per-term
+    offsets; documents added since are appended to per-term tails. Deleted
+    documents keep their postings, marked by a negative length, until the index
+    is compacted alongside the store.
+    """
+
+    def __init__(self):
+        self.terms = []
+        self.term_ids = {}
+        self.base_offsets = np.zeros(1, dtype=np.int64)
+        self.base_positions = np.zeros(0, dtype=np.int32)
+        self.base_freqs = np.zeros(0, dtype=np.int32)
+        self.tail_positions = {}
+        self.tail_freqs = {}
+        self.doc_lengths = array('i')
+        self.live_count = 0
+        self.total_length = 0
+        # numpy copy of doc_lengths, dropped whenever a document is added or deleted
+        self._lengths = None
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def _term_id(self, term):
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = self.term_ids[term] = len(self.terms)
+            self.terms.append(term)
+        return term_id
+
+    def add(self, position, counts):
+        """Index term counts (from term_counts) as the document at position, the next one"""
+        for term, count in counts.items():
+            term_id = self._term_id(term)
+            if term_id not in self.tail_positions:
+                self.tail_positions[term_id] = array('i')
+                self.tail_freqs[term_id] = array('i')
+            self.tail_positions[term_id].append(position)
+            self.tail_freqs[term_id].append(count)
+        length = sum(counts.values())
+        self.doc_lengths.append(length)
+        self.live_count += 1
+        self.total_length += length
+        self._lengths = None
+
+    def add_deleted(self):
+        """Reserve the next position for a document that is already deleted"""
+        self.doc_lengths.append(DELETED)
+        self._lengths = None
+
+    def delete(self, position):
+        length = self.doc_lengths[position]
+        if length == DELETED:
+            return
+        self.doc_lengths[position] = DELETED
+        self.live_count -= 1
+        self.total_length -= length
+        self._lengths = None
+
+    def lengths(self):
+        if self._lengths is None:
+            self._lengths = np.array(self.doc_lengths, dtype=np.int32)
+        return self._lengths
+
+    def postings(self, term_id):
+        """Positions and term frequencies of a term, base postings first"""
+        if term_id + 1 < len(self.base_offsets):
+            start, end = self.base_offsets[term_id], self.base_offsets[term_id + 1]
+            positions, freqs = self.base_positions[start:end], self.base_freqs[start:end]
+        else:
+            positions, freqs = self.base_positions[:0], self.base_freqs[:0]
+        if term_id in self.tail_positions:
+            positions = np.concatenate([positions, np.array(self.tail_positions[term_id], dtype=np.int32)])
+            freqs = np.concatenate([freqs, np.array(self.tail_freqs[term_id], dtype=np.int32)])
+        return positions, freqs
+
+    def search(self, terms, k, positions=None):
+        """Top k (position, BM25 score) pairs for query terms, best first
+
+        positions, a sorted array, restricts the documents scored; document
+        frequencies are still counted over the whole index.
+        """
+        if not self.live_count or k <= 0:
+            return []
+        lengths = self.lengths()
+        average_length = max(self.total_length / self.live_count, 1.0)
+
+        matched = []
+        contributions = []
+        for term in set(terms):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            term_positions, freqs = self.postings(term_id)
+            document_lengths = lengths[term_positions]
+            live = document_lengths != DELETED
+            term_positions, freqs, document_lengths = term_positions[live], freqs[live], document_lengths[live]
+            if not len(term_positions):
+                continue
+            idf = math.log(1 + (self.live_count - len(term_positions) + 0.5) / (len(term_positions) + 0.5))
+            if positions is not None:
+                allowed = np.isin(term_positions, positions, assume_unique=True)
+                term_positions, freqs, document_lengths = (term_positions[allowed], freqs[allowed],
+                                                           document_lengths[allowed])
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * document_lengths / average_length)
+            matched.append(term_positions)
+            contributions.append(idf * freqs * (BM25_K1 + 1) / (freqs + norm))
+
+        if not matched:
+            return []
+        candidates, inverse = np.unique(np.concatenate(matched), return_inverse=True)
+        if not len(candidates):
+            return []
+        scores = np.bincount(inverse, weights=np.concatenate(contributions))
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return list(zip(candidates[top].tolist(), scores[top].tolist()))
+
+    def _all_postings(self):
+        """Term ids, positions and frequencies of every posting, grouped by term"""
+        term_ids = [np.repeat(np.arange(len(self.base_offsets) - 1, dtype=np.int64), np.diff(self.base_offsets))]
+        positions = [self.base_positions]
+        freqs = [self.base_freqs]
+        for term_id in self.tail_positions:
+            term_ids.append(np.full(len(self.tail_positions[term_id]), term_id, dtype=np.int64))
+            positions.append(np.array(self.tail_positions[term_id], dtype=np.int32))
+            freqs.append(np.array(self.tail_freqs[term_id], dtype=np.int32))
+        term_ids, positions, freqs = np.concatenate(term_ids), np.concatenate(positions), np.concatenate(freqs)
+        # Tails follow the base postings and hold later positions, so a stable sort keeps each term in position order
+        order = np.argsort(term_ids, kind='stable')
+        return term_ids[order], positions[order], freqs[order]
+
+    def compacted(self, positions):
+        """A new index holding the documents at positions, renumbered densely, with unused terms dropped"""
+        positions = np.asarray(positions, dtype=np.int64)
+        remap = np.full(len(self), DELETED, dtype=np.int64)
+        remap[positions] = np.arange(len(positions))
+        term_ids, old_positions, freqs = self._all_postings()
+        keep = remap[old_positions] != DELETED
+        term_ids, new_positions, freqs = term_ids[keep], remap[old_positions[keep]], freqs[keep]
+
+        used, term_ids = np.unique(term_ids, return_inverse=True)
+        offsets = np.zeros(len(used) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(used)), out=offsets[1:])
+        return self._from_arrays(
+            [self.terms[term_id] for term_id in used.tolist()],
+            offsets,
+            new_positions.astype(np.int32),
+            freqs,
+            self.lengths()[positions]
+        )
+
+    @classmethod
+    def _from_arrays(cls, terms, offsets, positions, freqs, lengths):
+        index = cls()
+        index.terms = list(terms)
+        index.term_ids = {term: term_id for term_id, term in enumerate(index.terms)}
+        index.base_offsets = np.asarray(offsets, dtype=np.int64)
+        index.base_positions = np.asarray(positions, dtype=np.int32)
+        index.base_freqs = np.asarray(freqs, dtype=np.int32)
+        index.doc_lengths = array('i', np.ascontiguousarray(lengths, dtype=np.int32).tobytes())
+        live = index.lengths()[index.lengths() != DELETED]
+        index.live_count = len(live)
+        index.total_length = int(live.sum())
+        return index
+
+    def save(self, f, **meta):
+        """Write the index, with its postings merged into one array per field, and meta to a file object as an .npz"""
+        term_ids, positions, freqs = self._all_postings()
+        offsets = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(self.terms)), out=offsets[1:])
+        np.savez(
+            f,
+            meta=np.array(json.dumps(meta)),
+            terms=np.frombuffer("\n".join(self.terms).encode(), dtype=np.uint8),
+            offsets=offsets,
+            positions=positions,
+            freqs=freqs,
+            lengths=self.lengths()
+        )
+
+    @classmethod
+    def load(cls, f):
+        """Read an index saved by save(); returns the index and its meta"""
+        with np.load(f, allow_pickle=False) as snapshot:
+            terms = snapshot["terms"].tobytes().decode()
+            index = cls._from_arrays(
+                terms.split("\n") if terms else [],
+                snapshot["offsets"],
+                snapshot["positions"],
+                snapshot["freqs"],
+                snapshot["lengths"]
+            )
+            meta = json.loads(snapshot["meta"].item())
+        return index, meta
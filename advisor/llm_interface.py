@@ -1,14 +1,61 @@
-import openai
-from langsmith import traceable
+from advisor.metrics import traced, METRICS, TOKEN_BUCKETS
+from advisor.gazetteer import default_matcher
 import re
+import time
+from collections import deque
+
+# Number of recent responses kept for latency statistics
+LATENCY_WINDOW = 1000
+
+
+class ResponseStream:
+    """Iterates over response text as it arrives; `result` is set once the stream is exhausted"""
+    
+    def __init__(self, deltas, on_complete):
+        self.deltas = deltas
+        self.on_complete = on_complete
+        self.result = None
+        self.consumed = False
+    
+    def __iter__(self):
+        if self.consumed:
+            return
+        self.consumed = True
+        parts = []
+        for delta in self.deltas:
+            parts.append(delta)
+            yield delta
+        self.result = self.on_complete("".join(parts))
+    
+    def collect(self):
+        """Consume the rest of the stream and return the final result"""
+        for _ in self:
+            pass
+        return self.result
+
 
 class OpenAIInterface:
-    def __init__(self, api_key):
-        self.client = openai.OpenAI(api_key=api_key)
+    def __init__(self, api_key, client=None, matcher=None):
+        self.api_key = api_key
+        self._client = client
+        self.matcher = matcher or default_matcher()
+        self.time_to_first_token = deque(maxlen=LATENCY_WINDOW)
+    
+    @property
+    def client(self):
+        """OpenAI client, created on first use so startup does not wait for openai to import"""
+        if self._client is None:
+            import openai
+            self._client = openai.OpenAI(api_key=self.api_key)
+        return self._client
     
-    @traceable(name="generate_response", run_type="llm")
-    def generate_response(self, query, context):
-        """Generate response using OpenAI GPT-3.5 Turbo"""
+    @traced(name="generate_response", run_type="llm")
+    def generate_response(self, query, context, stream=False):
+        """Generate response using OpenAI GPT-3.5 Turbo
+        
+        With stream=True a ResponseStream of text deltas is returned; its result holds
+        the usual response dict once the completion has finished.
+        """
         system_prompt = """
         You are a Fantasy IPL Cricket advisor. You provide data-driven insights for fantasy cricket players.
         Your advice should be specific, actionable, and based on the latest information provided in the context.
@@ -27,6 +74,25 @@ class OpenAIInterface:
             {"role": "user", "content": f"Based on the following information, please answer this question about Fantasy IPL Cricket: {query}\n\nContext:\n{context}"}
         ]
         
+        start = time.perf_counter()
+        
+        if stream:
+            chunks = self.client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages,
+                temperature=0.3,
+                max_tokens=800,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            state = {"time_to_first_token": None, "usage": None}
+            return ResponseStream(
+                self._stream_deltas(chunks, start, state),
+                lambda response_text: self._build_response(
+                    response_text, state["usage"], state["time_to_first_token"], time.perf_counter() - start
+                )
+            )
+        
         response = self.client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=messages,
@@ -34,36 +100,72 @@ class OpenAIInterface:
             max_tokens=800
         )
         
-        response_text = response.choices[0].message.content
+        # Without streaming nothing is shown until the whole completion has arrived
+        latency = time.perf_counter() - start
+        self.time_to_first_token.append(latency)
         
+        return self._build_response(response.choices[0].message.content, response.usage, latency, latency)
+    
+    def _stream_deltas(self, chunks, start, state):
+        """Yield content deltas from streamed chunks, recording time to first token and usage"""
+        for chunk in chunks:
+            if chunk.usage is not None:
+                state["usage"] = chunk.usage
+            for choice in chunk.choices:
+                delta = choice.delta.content
+                if delta:
+                    if state["time_to_first_token"] is None:
+                        state["time_to_first_token"] = time.perf_counter() - start
+                        self.time_to_first_token.append(state["time_to_first_token"])
+                    yield delta
+    
+    def _build_response(self, response_text, usage, time_to_first_token, latency):
+        """Assemble the response dict once the full text is available"""
         confidence_indicators = self._extract_confidence_indicators(response_text)
         
         token_usage = {
-            "prompt_tokens": response.usage.prompt_tokens,
-            "completion_tokens": response.usage.completion_tokens,
-            "total_tokens": response.usage.total_tokens
+            "prompt_tokens": usage.prompt_tokens if usage else None,
+            "completion_tokens": usage.completion_tokens if usage else None,
+            "total_tokens": usage.total_tokens if usage else None
         }
         
+        if time_to_first_token is not None:
+            METRICS.observe("llm_time_to_first_token_seconds", time_to_first_token)
+        METRICS.observe("llm_response_seconds", latency)
+        if usage:
+            METRICS.observe("llm_prompt_tokens", usage.prompt_tokens, buckets=TOKEN_BUCKETS)
+            METRICS.observe("llm_completion_tokens", usage.completion_tokens, buckets=TOKEN_BUCKETS)
+            METRICS.increment("llm_tokens_total", usage.prompt_tokens, kind="prompt")
+            METRICS.increment("llm_tokens_total", usage.completion_tokens, kind="completion")
+        
         return {
             "response": response_text,
             "confidence_indicators": confidence_indicators,
             "token_usage": token_usage,
-            "model": "gpt-3.5-turbo"
+            "model": "gpt-3.5-turbo",
+            "time_to_first_token": time_to_first_token,
+            "latency": latency
         }
     
-    def _extract_confidence_indicators(self, response_text):
-        """Extract confidence indicators from the response text"""
-        confidence_phrases = {
-            "high": ["highly recommend", "strongly suggest", "definitely", "certainly", "confident"],
-            "medium": ["likely", "probably", "good option", "should consider", "recommended"],
-            "low": ["might", "could", "uncertain", "limited data", "not sure", "maybe"]
+    def get_stats(self):
+        """Get time-to-first-token statistics over recent responses"""
+        samples = sorted(self.time_to_first_token)
+        if not samples:
+            return {"responses": 0}
+        return {
+            "responses": len(samples),
+            "time_to_first_token_mean": sum(samples) / len(samples),
+            "time_to_first_token_p50": samples[len(samples) // 2],
+            "time_to_first_token_p95": samples[min(int(len(samples) * 0.95), len(samples) - 1)]
         }
+    
+    def _extract_confidence_indicators(self, response_text):
+        """Extract confidence indicators from the response text
         
-        response_lower = response_text.lower()
-        confidence_scores = {"high": 0, "medium": 0, "low": 0}
-        
-        for level, phrases in confidence_phrases.items():
-            confidence_scores[level] = sum(1 for phrase in phrases if phrase in response_lower)
+        Counts the gazetteer's confidence phrases of each level that the response uses.
+        """
+        matched = self.matcher.match(response_text).get("confidence", {})
+        confidence_scores = {level: len(matched.get(level, ())) for level in ("high", "medium", "low")}
         
         if confidence_scores["high"] > confidence_scores["medium"] and confidence_scores["high"] > confidence_scores["low"]:
             overall_confidence = "high"
@@ -76,5 +178,5 @@ class OpenAIInterface:
             "phrase_counts": confidence_scores,
             "overall_confidence": overall_confidence,
             "response_length": len(response_text),
-            "contains_statistics": bool(re.search(r'\d+\.?\d*\s*(%|runs|wickets|average|strike rate)', response_lower))
+            "contains_statistics": bool(re.search(r'\d+\.?\d*\s*(%|runs|wickets|average|strike rate)', response_text.lower()))
         }
\ No newline at end of file
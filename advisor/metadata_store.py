@@ -0,0 +1,319 @@
+import json
+import math
+import numpy as np
+from array import array
+from datetime import datetime, timezone
+
+# Stored in place of a string id for documents without a key or parent, and of a chunk number for whole documents
+NO_STRING = -1
+NO_CHUNK = -1
+
+# Per-document columns and their array typecodes; string_ends is per interned string
+COLUMNS = {
+    "source_codes": "B",
+    "timestamps": "d",
+    "keys": "i",
+    "parents": "i",
+    "chunks": "i",
+    "span_starts": "q",
+    "span_ends": "q",
+    "text_offsets": "q",
+    "text_lengths": "q",
+    "live": "b",
+    "string_ends": "q"
+}
+
+
+def parse_timestamp(value):
+    """Convert a datetime or ISO 8601 string to epoch seconds, or NaN if it can't be parsed"""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return float('nan')
+
+
+class DocumentRecord:
+    """Metadata of one stored document, read from a MetadataStore's columns"""
+
+    __slots__ = ("index", "hash", "source_type", "timestamp", "key", "parent", "chunk", "span",
+                 "text_offset", "text_length", "deleted")
+
+    def __init__(self, index, hash, source_type, timestamp, key, parent, chunk, span, text_offset, text_length,
+                 deleted):
+        self.index = index
+        self.hash = hash
+        self.source_type = source_type
+        self.timestamp = timestamp
+        self.key = key
+        self.parent = parent
+        self.chunk = chunk
+        self.span = span
+        self.text_offset = text_offset
+        self.text_length = text_length
+        self.deleted = deleted
+
+
+class MetadataStore:
+    """Columnar metadata of the documents in a VectorStore, indexed by position
+
+    Every field is a typed array with one entry per document. Hashes are packed
+    16-byte md5 digests, keys and parents are ids into a table of interned
+    strings, and timestamps are epoch seconds. Texts are not held here; each
+    document only records where its text sits in the text archive.
+
+    Documents are looked up by hash, by (source_type, key) and by chunk through
+    dicts built on first use, by source_type through per-type position arrays,
+    and by timestamp range through a sorted index rebuilt after changes.
+    Snapshots are saved as an uncompressed .npz of the columns.
+    """
+
+    def __init__(self):
+        self.hashes = bytearray()
+        self.string_data = bytearray()
+        for name, typecode in COLUMNS.items():
+            setattr(self, name, array(typecode))
+        self.source_types = []
+        self.source_ids = {}
+        self.source_positions = {}
+        self.deleted_count = 0
+        self._string_ids = None
+        self._hash_index = None
+        self._key_index = None
+        self._chunk_index = None
+        self._time_index = None
+        # numpy copies of columns, dropped whenever a document is added or deleted
+        self._arrays = {}
+
+    def __len__(self):
+        return len(self.live)
+
+    def __getitem__(self, position):
+        chunk = self.chunks[position]
+        timestamp = self.timestamps[position]
+        return DocumentRecord(
+            index=position,
+            hash=self.digest(position).hex(),
+            source_type=self.source_types[self.source_codes[position]],
+            timestamp=None if math.isnan(timestamp) else datetime.fromtimestamp(timestamp, timezone.utc).isoformat(),
+            key=self.string(self.keys[position]),
+            parent=self.string(self.parents[position]),
+            chunk=None if chunk == NO_CHUNK else chunk,
+            span=None if chunk == NO_CHUNK else (self.span_starts[position], self.span_ends[position]),
+            text_offset=self.text_offsets[position],
+            text_length=self.text_lengths[position],
+            deleted=not self.live[position]
+        )
+
+    def digest(self, position):
+        return bytes(self.hashes[16 * position:16 * position + 16])
+
+    def string(self, string_id):
+        if string_id == NO_STRING:
+            return None
+        start = self.string_ends[string_id - 1] if string_id else 0
+        return self.string_data[start:self.string_ends[string_id]].decode()
+
+    def _string_id(self, value):
+        """Id of an interned string, or None if no document uses it"""
+        if self._string_ids is None:
+            self._string_ids = {self.string(string_id): string_id for string_id in range(len(self.string_ends))}
+        return self._string_ids.get(value)
+
+    def _intern(self, value):
+        if value is None:
+            return NO_STRING
+        string_id = self._string_id(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self.string_ends)
+            self.string_data += value.encode()
+            self.string_ends.append(len(self.string_data))
+        return string_id
+
+    def _source_code(self, source_type):
+        code = self.source_ids.get(source_type)
+        if code is None:
+            code = self.source_ids[source_type] = len(self.source_types)
+            self.source_types.append(source_type)
+            self.source_positions[source_type] = array('q')
+        return code
+
+    def append(self, record):
+        """Add a record dict, as written to the journal, at the next position"""
+        position = len(self)
+        digest = bytes.fromhex(record['hash'])
+        code = self._source_code(record['source_type'])
+        chunk = record.get('chunk')
+        key = self._intern(record.get('key'))
+        parent = self._intern(record.get('parent'))
+        live = not record.get('deleted')
+
+        self.hashes += digest
+        self.source_codes.append(code)
+        self.timestamps.append(parse_timestamp(record['timestamp']))
+        self.keys.append(key)
+        self.parents.append(parent)
+        self.chunks.append(NO_CHUNK if chunk is None else chunk)
+        start, end = record['span'] if chunk is not None else (0, 0)
+        self.span_starts.append(start)
+        self.span_ends.append(end)
+        self.text_offsets.append(record['text_offset'])
+        self.text_lengths.append(record['text_length'])
+        self.live.append(1 if live else 0)
+        self.source_positions[record['source_type']].append(position)
+
+        if not live:
+            self.deleted_count += 1
+        else:
+            if self._hash_index is not None:
+                self._hash_index[digest] = position
+            if self._key_index is not None and key != NO_STRING:
+                self._key_index.setdefault((code, key), set()).add(position)
+            if self._chunk_index is not None and chunk is not None:
+                self._chunk_index[(code, parent, chunk)] = position
+        self._time_index = None
+        self._arrays = {}
+        return position
+
+    def delete(self, position):
+        """Mark a live document as deleted and drop it from the lookups"""
+        self.live[position] = 0
+        self.deleted_count += 1
+        digest = self.digest(position)
+        if self._hash_index is not None and self._hash_index.get(digest) == position:
+            del self._hash_index[digest]
+        code, key, parent, chunk = (self.source_codes[position], self.keys[position], self.parents[position],
+                                    self.chunks[position])
+        if self._key_index is not None and position in self._key_index.get((code, key), ()):
+            self._key_index[(code, key)].discard(position)
+            if not self._key_index[(code, key)]:
+                del self._key_index[(code, key)]
+        if self._chunk_index is not None and self._chunk_index.get((code, parent, chunk)) == position:
+            del self._chunk_index[(code, parent, chunk)]
+        self._time_index = None
+        self._arrays = {}
+
+    def column(self, name):
+        """A numpy copy of a column, shared until the store next changes"""
+        values = self._arrays.get(name)
+        if values is None:
+            values = self._arrays[name] = np.array(getattr(self, name))
+        return values
+
+    def find_hash(self, digest):
+        """Position of the live document with this md5 digest, or None"""
+        if self._hash_index is None:
+            hashes = bytes(self.hashes)
+            self._hash_index = {hashes[16 * position:16 * position + 16]: position
+                                for position in np.flatnonzero(self.column("live")).tolist()}
+        return self._hash_index.get(digest)
+
+    def key_positions(self, source_type, key):
+        """Positions of the live documents with this source_type and key"""
+        if self._key_index is None:
+            self._key_index = {}
+            for position in np.flatnonzero(self.column("live") & (self.column("keys") != NO_STRING)).tolist():
+                self._key_index.setdefault((self.source_codes[position], self.keys[position]), set()).add(position)
+        # A lookup never interns the key, so unknown keys do not grow the string table
+        key_id = self._string_id(key) if key is not None else None
+        if source_type not in self.source_ids or key_id is None:
+            return set()
+        return self._key_index.get((self.source_ids[source_type], key_id), set())
+
+    def chunk_position(self, position, chunk):
+        """Position of the live chunk number chunk of the same parent document as position, or None"""
+        if self._chunk_index is None:
+            live = np.flatnonzero(self.column("live") & (self.column("chunks") != NO_CHUNK))
+            self._chunk_index = dict(zip(
+                zip(self.column("source_codes")[live].tolist(), self.column("parents")[live].tolist(),
+                    self.column("chunks")[live].tolist()),
+                live.tolist()
+            ))
+        return self._chunk_index.get((self.source_codes[position], self.parents[position], chunk))
+
+    def positions_since(self, since):
+        """Positions timestamped at or after since (epoch seconds), from the sorted timestamp index
+
+        Documents without a parseable timestamp are never included.
+        """
+        if self._time_index is None:
+            timestamps = self.column("timestamps")
+            order = np.argsort(timestamps, kind='stable')
+            # NaN timestamps sort last and are left out
+            end = len(order) - int(np.isnan(timestamps).sum())
+            self._time_index = (timestamps[order[:end]], order[:end])
+        sorted_timestamps, order = self._time_index
+        return order[np.searchsorted(sorted_timestamps, since, 'left'):]
+
+    def source_counts(self):
+        """Number of live documents per source_type"""
+        counts = np.bincount(self.column("source_codes")[self.column("live").astype(bool)],
+                             minlength=len(self.source_types))
+        return {source_type: int(counts[code]) for code, source_type in enumerate(self.source_types) if counts[code]}
+
+    def text_end(self):
+        """Offset just past the last text any document refers to"""
+        if not len(self):
+            return 0
+        return int((self.column("text_offsets") + self.column("text_lengths")).max())
+
+    def compacted(self, positions, text_offsets):
+        """A new store holding the documents at positions, renumbered densely, with their texts moved to text_offsets"""
+        positions = np.asarray(positions, dtype=np.int64)
+        columns = {name: self.column(name)[positions] for name in COLUMNS if name != "string_ends"}
+        columns["text_offsets"] = np.asarray(text_offsets, dtype=np.int64)
+
+        # Keep only the strings the remaining documents refer to
+        used = np.unique(np.concatenate([columns["keys"], columns["parents"]]))
+        used = used[used != NO_STRING]
+        # One spare entry so NO_STRING (-1) maps to itself
+        remap = np.full(len(self.string_ends) + 1, NO_STRING, dtype=np.int32)
+        remap[used] = np.arange(len(used), dtype=np.int32)
+        for name in ("keys", "parents"):
+            columns[name] = remap[columns[name]]
+        strings = [self.string(string_id).encode() for string_id in used.tolist()]
+        columns["string_ends"] = np.cumsum([len(value) for value in strings], dtype=np.int64)
+
+        hashes = np.frombuffer(bytes(self.hashes), dtype=np.uint8).reshape(-1, 16)[positions]
+        return self._from_columns(columns, hashes.tobytes(), b"".join(strings), self.source_types)
+
+    @classmethod
+    def _from_columns(cls, columns, hashes, string_data, source_types):
+        store = cls()
+        for name, typecode in COLUMNS.items():
+            setattr(store, name, array(typecode, np.ascontiguousarray(columns[name], dtype=typecode).tobytes()))
+        store.hashes = bytearray(hashes)
+        store.string_data = bytearray(string_data)
+        store.source_types = list(source_types)
+        store.source_ids = {source_type: code for code, source_type in enumerate(store.source_types)}
+        codes = store.column("source_codes")
+        store.source_positions = {
+            source_type: array('q', np.flatnonzero(codes == code).astype(np.int64).tobytes())
+            for code, source_type in enumerate(store.source_types)
+        }
+        store.deleted_count = len(store) - int(store.column("live").astype(bool).sum())
+        return store
+
+    def save(self, f, **meta):
+        """Write the columns and meta (JSON-serializable values) to a file object as an .npz"""
+        np.savez(
+            f,
+            meta=np.array(json.dumps({**meta, "source_types": self.source_types})),
+            hashes=np.frombuffer(bytes(self.hashes), dtype=np.uint8),
+            string_data=np.frombuffer(bytes(self.string_data), dtype=np.uint8),
+            **{name: self.column(name) for name in COLUMNS}
+        )
+
+    @classmethod
+    def load(cls, f):
+        """Read a store saved by save(); returns the store and its meta"""
+        with np.load(f, allow_pickle=False) as snapshot:
+            meta = json.loads(snapshot["meta"].item())
+            store = cls._from_columns(
+                {name: snapshot[name] for name in COLUMNS},
+                snapshot["hashes"].tobytes(),
+                snapshot["string_data"].tobytes(),
+                meta.pop("source_types")
+            )
+        return store, meta
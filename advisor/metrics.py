@@ -0,0 +1,199 @@
+import os
+import time
+import random
+import bisect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Histogram upper bounds for durations (seconds) and prompt/context sizes (tokens)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+METRIC_PREFIX = "advisor_"
+
+# Fraction of top-level calls sent to LangSmith; calls inside a sampled trace are always traced
+DEFAULT_TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values"""
+    
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def quantile(self, q):
+        """Estimate a quantile by interpolating within its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms keyed by name and labels"""
+    
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+    
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+    
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of a block in seconds, whether or not it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+    
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+    
+    def to_json(self):
+        """Counters and histogram summaries (count, sum, mean, p50/p95/p99) as plain dicts"""
+        with self.lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "mean": histogram.sum / histogram.count if histogram.count else None,
+                    "p50": histogram.quantile(0.50),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99)
+                }
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+    
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        def render_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+        
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = METRIC_PREFIX + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{render_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = METRIC_PREFIX + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{render_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{metric}_bucket{render_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{metric}_sum{render_labels(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{render_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+_trace_sample_rate = DEFAULT_TRACE_SAMPLE_RATE
+# Sampling decision of the current trace: None outside any traced call, then True or False
+_sampled = contextvars.ContextVar("sampled", default=None)
+
+
+def set_trace_sample_rate(rate):
+    """Set the fraction (0 to 1) of top-level calls traced to LangSmith"""
+    global _trace_sample_rate
+    _trace_sample_rate = min(max(rate, 0.0), 1.0)
+
+
+def get_trace_sample_rate():
+    return _trace_sample_rate
+
+
+def traced(name, run_type="chain"):
+    """Time a function into the stage_seconds histogram and trace a sample of its calls to LangSmith
+    
+    Sampling is decided once per trace: calls made inside a traced call are
+    traced, and calls inside an unsampled one are not. At a rate of 0 no call
+    goes through LangSmith at all, and langsmith is only imported once a call
+    is sampled.
+    """
+    def decorator(function):
+        traced_function = None
+        
+        def call_traced(*args, **kwargs):
+            nonlocal traced_function
+            if traced_function is None:
+                from langsmith import traceable
+                traced_function = traceable(name=name, run_type=run_type)(function)
+            return traced_function(*args, **kwargs)
+        
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with METRICS.timer("stage_seconds", stage=name):
+                sampled = _sampled.get()
+                if sampled is not None:
+                    return call_traced(*args, **kwargs) if sampled else function(*args, **kwargs)
+                
+                rate = _trace_sample_rate
+                sampled = rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+                token = _sampled.set(sampled)
+                try:
+                    return call_traced(*args, **kwargs) if sampled else function(*args, **kwargs)
+                finally:
+                    _sampled.reset(token)
+        
+        return wrapper
+    return decorator
+
+
+def submit_in_context(executor, function, *args, **kwargs):
+    """Submit function to an executor in a copy of the caller's context
+    
+    Traces and the sampling decision of calls made on the worker thread then
+    nest under the caller's run.
+    """
+    return executor.submit(contextvars.copy_context().run, function, *args, **kwargs)
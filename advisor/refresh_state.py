@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from advisor.metadata_store import parse_timestamp
+
+# Days re-listed before a source's watermark, for pages Exa indexes after newer ones
+WATERMARK_OVERLAP_DAYS = 1
+# Seconds after which a seen URL's contents are fetched again, per source; pages updated
+# in place (stats) are refetched, while articles (None) are fetched once
+DEFAULT_REFETCH_AFTER = {"news": None, "injury": None, "stats": 24 * 3600}
+# Seen URLs that no listing has returned for this many days are forgotten
+SEEN_URL_MAX_AGE_DAYS = 14
+
+
+class RefreshState:
+    """Watermarks and seen URLs of incremental refreshes, persisted as JSON
+
+    For each source the watermark is the latest published date ingested, and
+    each seen URL keeps when it was fetched and listed, its text size and its
+    chunk count, so a refresh can skip it and report what skipping saved.
+    """
+
+    def __init__(self, path="data/refresh_state.json", refetch_after=None):
+        self.path = path
+        self.refetch_after = {**DEFAULT_REFETCH_AFTER, **(refetch_after or {})}
+        self.lock = threading.Lock()
+        self.sources = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.sources = json.load(f).get("sources", {})
+
+    def _source(self, source):
+        return self.sources.setdefault(source, {"watermark": None, "urls": {}})
+
+    def since(self, source):
+        """Date (YYYY-MM-DD) to list a source from, or None before its first incremental refresh"""
+        with self.lock:
+            watermark = self._source(source)["watermark"]
+        if watermark is None:
+            return None
+        start = datetime.fromtimestamp(parse_timestamp(watermark), timezone.utc)
+        return (start - timedelta(days=WATERMARK_OVERLAP_DAYS)).strftime("%Y-%m-%d")
+
+    def partition(self, source, listed, now=None):
+        """Split listed results into those to fetch and the seen URLs entries of those to skip"""
+        now = time.time() if now is None else now
+        refetch_after = self.refetch_after.get(source)
+        unseen = []
+        skipped = []
+        with self.lock:
+            urls = self._source(source)["urls"]
+            for item in listed:
+                entry = urls.get(item["url"])
+                if entry is None or (refetch_after is not None and now - entry["fetched_at"] >= refetch_after):
+                    unseen.append(item)
+                else:
+                    entry["listed_at"] = now
+                    skipped.append(entry)
+        return unseen, skipped
+
+    def record(self, source, items, chunk_counts, now=None):
+        """Mark fetched items as seen and move the watermark to the latest published date among them
+
+        Items that produced no chunks (empty or missing text) are left unseen, so
+        the next refresh fetches them again.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            state = self._source(source)
+            for item in items:
+                chunks = chunk_counts.get(item["url"], 0)
+                if not chunks:
+                    continue
+                state["urls"][item["url"]] = {
+                    "fetched_at": now,
+                    "listed_at": now,
+                    "bytes": len((item.get("text") or "").encode()),
+                    "chunks": chunks
+                }
+                published = parse_timestamp(item.get("published_date"))
+                if published == published and (state["watermark"] is None or
+                                                published > parse_timestamp(state["watermark"])):
+                    state["watermark"] = item["published_date"]
+
+    def save(self, now=None):
+        """Forget long unlisted URLs and write the state atomically"""
+        cutoff = (time.time() if now is None else now) - SEEN_URL_MAX_AGE_DAYS * 86400
+        with self.lock:
+            for state in self.sources.values():
+                state["urls"] = {url: entry for url, entry in state["urls"].items() if entry["listed_at"] >= cutoff}
+            with open(self.path + ".tmp", 'w') as f:
+                json.dump({"sources": self.sources}, f)
+            os.replace(self.path + ".tmp", self.path)
+
+    def clear(self):
+        """Forget every watermark and seen URL, as when the store they describe was emptied"""
+        with self.lock:
+            self.sources = {}
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                source: {"watermark": state["watermark"], "seen_urls": len(state["urls"])}
+                for source, state in self.sources.items()
+            }
@@ -0,0 +1,55 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """Lock held by any number of readers at once or by a single writer
+
+    New readers wait while a writer is waiting, so a steady stream of readers
+    cannot starve writers. The thread holding the write lock may take it again,
+    for reading or writing; readers must not take it twice.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = None
+        self.writes = 0
+        self.waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        if self.writer == threading.get_ident():
+            yield
+            return
+        with self.condition:
+            while self.writer is not None or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        thread = threading.get_ident()
+        with self.condition:
+            if self.writer != thread:
+                self.waiting_writers += 1
+                while self.writer is not None or self.readers:
+                    self.condition.wait()
+                self.waiting_writers -= 1
+                self.writer = thread
+            self.writes += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writes -= 1
+                if not self.writes:
+                    self.writer = None
+                    self.condition.notify_all()
@@ -0,0 +1,114 @@
+import random
+import threading
+import time
+from datetime import datetime
+
+# Refresh every 12 hours by default, spread by +/-10% so processes do not sync up
+DEFAULT_REFRESH_INTERVAL = 12 * 60 * 60
+DEFAULT_REFRESH_JITTER = 0.1
+# Minimum gap between on-demand refreshes, so a failing refresh is not retried per request
+MIN_TRIGGER_INTERVAL = 60
+
+
+class RefreshScheduler:
+    """Runs FantasyIPLAdvisor.refresh_static_data on a background thread
+    
+    Refreshes happen every ``interval`` seconds (with jitter) and whenever
+    ``trigger()`` is called. The vector store publishes each refresh batch in
+    one step, so searches running meanwhile see either the old or new data.
+    """
+    
+    def __init__(self, advisor, interval=DEFAULT_REFRESH_INTERVAL, jitter=DEFAULT_REFRESH_JITTER):
+        self.advisor = advisor
+        self.interval = interval
+        self.jitter = jitter
+        self.thread = None
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.refresh_lock = threading.Lock()
+        self.refreshing = False
+        self.next_refresh = None
+        self.last_attempt = None
+        self.last_duration = None
+        self.last_result = None
+        self.last_error = None
+        self.runs = 0
+        self.failures = 0
+    
+    def start(self, run_immediately=False):
+        """Start the background thread"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        if run_immediately:
+            self.wake.set()
+        self.thread = threading.Thread(target=self._run, name="refresh-scheduler", daemon=True)
+        self.thread.start()
+    
+    def stop(self, timeout=None):
+        """Stop the background thread after any refresh in progress"""
+        self.stopped.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+    
+    def trigger(self):
+        """Request a refresh now without waiting for it"""
+        if self.refreshing:
+            return False
+        if self.last_attempt is not None and time.monotonic() - self.last_attempt < MIN_TRIGGER_INTERVAL:
+            return False
+        self.wake.set()
+        return True
+    
+    def _next_delay(self):
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+    
+    def _run(self):
+        while not self.stopped.is_set():
+            delay = self._next_delay()
+            self.next_refresh = datetime.now().timestamp() + delay
+            self.wake.wait(delay)
+            self.wake.clear()
+            if self.stopped.is_set():
+                break
+            self.run_once()
+    
+    def run_once(self):
+        """Run one refresh on the calling thread and record its outcome
+        
+        Returns None without refreshing if another refresh is already running.
+        """
+        if not self.refresh_lock.acquire(blocking=False):
+            return None
+        self.refreshing = True
+        self.last_attempt = time.monotonic()
+        start = time.perf_counter()
+        try:
+            self.last_result = self.advisor.refresh_static_data()
+            self.last_error = None
+        except Exception as e:
+            print(f"Warning: background refresh failed: {e}")
+            self.last_error = str(e)
+            self.failures += 1
+        finally:
+            self.last_duration = time.perf_counter() - start
+            self.runs += 1
+            self.refreshing = False
+            self.refresh_lock.release()
+        return self.last_result
+    
+    def get_stats(self):
+        """Get refresh duration, staleness and schedule"""
+        last_refresh = self.advisor.last_refresh
+        return {
+            "running": self.thread is not None and self.thread.is_alive(),
+            "refreshing": self.refreshing,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_refresh": last_refresh.isoformat() if last_refresh else None,
+            "last_duration_seconds": self.last_duration,
+            "staleness_seconds": (datetime.now() - last_refresh).total_seconds() if last_refresh else None,
+            "next_refresh_in_seconds": max(self.next_refresh - datetime.now().timestamp(), 0) if self.next_refresh else None
+        }
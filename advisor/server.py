@@ -0,0 +1,265 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from advisor.metrics import METRICS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+# get_advice pipelines run at once; further requests queue for a worker
+DEFAULT_MAX_CONCURRENCY = 8
+# Distinct queries admitted (running or queued) before new ones are turned away with 503
+DEFAULT_MAX_PENDING = 64
+# Seconds a request waits for its answer before a 504; clients may ask for less
+DEFAULT_DEADLINE = 30.0
+MAX_BODY_BYTES = 64 * 1024
+MAX_HEADER_LINES = 100
+LATENCY_WINDOW = 1000
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout"
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AdviceServer:
+    """Minimal asyncio HTTP server sharing one FantasyIPLAdvisor across requests
+    
+    Endpoints:
+        POST /advice  {"query": "...", "timeout": seconds}  (or GET /advice?query=...)
+        GET  /stats
+        GET  /metrics  (Prometheus text, or ?format=json)
+        GET  /health
+    
+    get_advice runs on a pool of ``max_concurrency`` threads. Identical queries
+    in flight at the same time share one pipeline run. Once ``max_pending``
+    distinct queries are admitted new ones get 503 with Retry-After, and a
+    request whose deadline passes gets 504; a queued run is cancelled when every
+    request waiting on it has given up.
+    """
+    
+    def __init__(self, advisor, host=DEFAULT_HOST, port=DEFAULT_PORT, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 max_pending=DEFAULT_MAX_PENDING, deadline=DEFAULT_DEADLINE):
+        self.advisor = advisor
+        self.host = host
+        self.port = port
+        self.max_pending = max_pending
+        self.deadline = deadline
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="advice")
+        self.max_concurrency = max_concurrency
+        self.server = None
+        # query -> [executor future, asyncio future, number of waiting requests]
+        self.inflight = {}
+        self.running = 0
+        self.running_lock = threading.Lock()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {
+            "requests": 0, "completed": 0, "coalesced": 0, "rejected": 0, "timeouts": 0, "cancelled": 0, "errors": 0
+        }
+    
+    async def start(self):
+        """Start listening; returns once the socket is bound"""
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+    
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+    
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        # Drop runs that have not started (shutdown's cancel_futures needs Python 3.9)
+        for run, _, _ in list(self.inflight.values()):
+            run.cancel()
+        self.executor.shutdown(wait=False)
+    
+    async def _handle(self, reader, writer):
+        start = time.perf_counter()
+        try:
+            method, target, headers, body = await self._read_request(reader)
+            status, payload = await self._route(method, target, headers, body)
+        except HTTPError as e:
+            status, payload = e.status, {"error": str(e)}
+        except Exception as e:
+            self.counters["errors"] += 1
+            status, payload = 500, {"error": str(e)}
+        
+        extra_headers = {"Retry-After": "1"} if status == 503 else {}
+        try:
+            self._write_response(writer, status, payload, extra_headers)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+        self.latencies.append(time.perf_counter() - start)
+    
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise HTTPError(400, "malformed request line")
+        method, target, _ = parts
+        
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HTTPError(400, "too many headers")
+        
+        try:
+            length = int(headers.get("content-length", "0") or 0)
+        except ValueError:
+            raise HTTPError(400, "invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+    
+    def _write_response(self, writer, status, payload, extra_headers):
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload, default=str).encode(), "application/json"
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}",
+                "Connection: close"]
+        head.extend(f"{name}: {value}" for name, value in extra_headers.items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    
+    async def _route(self, method, target, headers, body):
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"status": "ok"}
+        if url.path == "/metrics":
+            if parse_qs(url.query).get("format") == ["json"]:
+                return 200, METRICS.to_json()
+            return 200, METRICS.to_prometheus()
+        if url.path == "/stats":
+            if method != "GET":
+                raise HTTPError(405, "use GET")
+            loop = asyncio.get_running_loop()
+            return 200, {"server": self.get_stats(), **await loop.run_in_executor(None, self.advisor.get_stats)}
+        if url.path == "/advice":
+            if method == "GET":
+                params = {name: values[0] for name, values in parse_qs(url.query).items()}
+            elif method == "POST":
+                try:
+                    params = json.loads(body or b"{}")
+                except ValueError:
+                    raise HTTPError(400, "body must be JSON")
+                if not isinstance(params, dict):
+                    raise HTTPError(400, "body must be a JSON object")
+            else:
+                raise HTTPError(405, "use GET or POST")
+            
+            query = " ".join(str(params.get("query") or "").split())
+            if not query:
+                raise HTTPError(400, "missing query")
+            try:
+                timeout = params.get("timeout")
+                timeout = self.deadline if timeout is None else min(float(timeout), self.deadline)
+            except (TypeError, ValueError):
+                raise HTTPError(400, "timeout must be a number of seconds")
+            if not timeout >= 0:
+                raise HTTPError(400, "timeout must not be negative")
+            return 200, await self.advice(query, timeout)
+        raise HTTPError(404, f"no route for {url.path}")
+    
+    async def advice(self, query, timeout=None):
+        """Answer a query, joining an identical one already in flight"""
+        self.counters["requests"] += 1
+        timeout = self.deadline if timeout is None else timeout
+        
+        entry = self.inflight.get(query)
+        if entry is not None:
+            self.counters["coalesced"] += 1
+            coalesced = True
+        else:
+            if len(self.inflight) >= self.max_pending:
+                self.counters["rejected"] += 1
+                raise HTTPError(503, "server busy, retry later")
+            run = self.executor.submit(self._run_pipeline, query)
+            entry = self.inflight[query] = [run, asyncio.wrap_future(run), 0]
+            entry[1].add_done_callback(lambda _: self.inflight.pop(query, None) if self.inflight.get(query) is entry else None)
+            coalesced = False
+        
+        run, future, _ = entry
+        entry[2] += 1
+        try:
+            advice = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise HTTPError(504, f"no answer within {timeout:g}s")
+        finally:
+            entry[2] -= 1
+            # Nobody is waiting any more: drop a run that has not started yet. The entry goes
+            # now rather than in the done callback, so the next request starts a fresh run
+            if entry[2] == 0 and run.cancel():
+                self.counters["cancelled"] += 1
+                if self.inflight.get(query) is entry:
+                    del self.inflight[query]
+        
+        self.counters["completed"] += 1
+        if coalesced:
+            return {**advice, "session_id": str(uuid.uuid4()), "coalesced": True}
+        return advice
+    
+    def _run_pipeline(self, query):
+        with self.running_lock:
+            self.running += 1
+        try:
+            return self.advisor.get_advice(query)
+        finally:
+            with self.running_lock:
+                self.running -= 1
+    
+    def get_stats(self):
+        """Get request counts, load and end-to-end latency"""
+        samples = sorted(self.latencies)
+        return {
+            **self.counters,
+            "running": self.running,
+            "pending": len(self.inflight),
+            "max_concurrency": self.max_concurrency,
+            "max_pending": self.max_pending,
+            "latency_p50": samples[len(samples) // 2] if samples else None,
+            "latency_p95": samples[min(int(len(samples) * 0.95), len(samples) - 1)] if samples else None
+        }
+
+
+def run_server(advisor, host=DEFAULT_HOST, port=DEFAULT_PORT, **kwargs):
+    """Serve the advisor over HTTP until interrupted"""
+    async def serve():
+        server = AdviceServer(advisor, host, port, **kwargs)
+        await server.start()
+        print(f"Fantasy IPL Advisor listening on http://{server.host}:{server.port}")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+    
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
@@ -1,123 +1,1257 @@
 import numpy as np
 import faiss
-import openai
 import os
+import glob
 import pickle
 import hashlib
-from datetime import datetime
-from langsmith import traceable
+import math
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+from advisor.metrics import traced, submit_in_context, METRICS
+from advisor.metadata_store import MetadataStore, parse_timestamp
+from advisor.rwlock import ReadWriteLock
+from advisor.lexical_index import LexicalIndex, DELETED, tokenize, term_counts
+from advisor.embedding_cache import EmbeddingCache
+from advisor.chunker import merge_chunks
+from advisor.ann_index import (
+    build_index, training_size, index_kind, is_id_mapped, supports_removal, search_parameter,
+    search_params, reconstruct, DEFAULT_ANN_THRESHOLD, DEFAULT_NPROBE, DEFAULT_EF_SEARCH
+)
+
+# OpenAI's embeddings endpoint accepts up to 2048 inputs and ~300k tokens per
+# request; the token budget is kept below that since it is only estimated.
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_MAX_BATCH_SIZE = 2048
+EMBEDDING_MAX_BATCH_TOKENS = 250000
+
+# Journal records are folded into the snapshot once this many have accumulated
+DEFAULT_COMPACT_EVERY = 1000
+# Compaction rebuilds a dense index once this fraction of documents are tombstoned
+REBUILD_TOMBSTONE_RATIO = 0.25
+
+# Per source_type retention: documents older than max_age_days expire, and with
+# supersede a newer document with the same key replaces the older one
+DEFAULT_RETENTION = {
+    "news": {"max_age_days": 7},
+    "injury": {"max_age_days": 14},
+    "stats": {"supersede": True}
+}
+
+# Settings swept by recall_report for each kind of ANN index
+NPROBE_SWEEP = (1, 2, 4, 8, 16, 32, 64, 128)
+EF_SEARCH_SWEEP = (16, 32, 64, 128, 256, 512)
+# Vectors read from the archive per chunk when (re)building an index
+BUILD_CHUNK_SIZE = 65536
+# Filters matching at most this many documents are scored exactly from the archive
+# instead of searching the index, so selective filters cost O(matches)
+BRUTE_FORCE_LIMIT = 4096
+# With a recency blend, this many times k candidates are re-scored
+RECENCY_CANDIDATE_FACTOR = 4
+DEFAULT_RECENCY_HALF_LIFE_HOURS = 72
+
+# dense ranks by embedding distance, lexical by BM25 over the inverted index, and
+# hybrid fuses both rankings by reciprocal rank
+SEARCH_MODES = ("dense", "lexical", "hybrid")
+DEFAULT_SEARCH_MODE = "hybrid"
+# Reciprocal rank fusion constant; larger values flatten the advantage of the top ranks
+RRF_K = 60
+# In hybrid mode each ranking contributes this many times k candidates to the fusion
+HYBRID_CANDIDATE_FACTOR = 4
+# Seconds a search waits for an uncached query embedding before answering from the lexical index alone
+DEFAULT_EMBEDDING_TIMEOUT = 2.0
+# Threads embedding queries under a deadline; a request that misses it keeps running to warm the cache
+EMBEDDING_WORKERS = 2
+
+
+class StagedWrites:
+    """Documents added and deleted in a VectorStore transaction, not yet visible to searches"""
+    
+    def __init__(self, start):
+        # Position of the first document added; the others follow it in order
+        self.start = start
+        self.records = []
+        self.counts = []
+        # Positions of the documents added, by md5 digest and by (source_type, key)
+        self.hashes = {}
+        self.keys = {}
+        self.deleted = set()
+        self.expired = False
+    
+    @property
+    def end(self):
+        return self.start + len(self.records)
+
 
 class VectorStore:
-    def __init__(self, dimension=1536, index_file="data/vector_index.faiss", data_file="data/vector_data.pkl"):
+    def __init__(self, dimension=1536, index_file="data/vector_index.faiss", data_file="data/vector_data.pkl",
+                 journal_file="data/vector_journal.log", compact_every=DEFAULT_COMPACT_EVERY,
+                 embedding_cache=None, vectors_file="data/vector_vectors.f32", index_type="ivf",
+                 ann_threshold=DEFAULT_ANN_THRESHOLD, nprobe=DEFAULT_NPROBE, ef_search=DEFAULT_EF_SEARCH,
+                 retention=None, client=None, texts_file="data/vector_texts.txt", mmap_index=True,
+                 metadata_file="data/vector_metadata.npz", lexical_file="data/vector_lexical.npz",
+                 search_mode=DEFAULT_SEARCH_MODE, embedding_timeout=DEFAULT_EMBEDDING_TIMEOUT):
         self.dimension = dimension
         self.index_file = index_file
+        # Pickled record lists written by older versions; migrated to metadata_file on load
         self.data_file = data_file
+        self.metadata_file = metadata_file
+        self.lexical_file = lexical_file
+        self.journal_file = journal_file
+        self.vectors_file = vectors_file
+        self.archive_file = vectors_file
+        self.texts_file = texts_file
+        self.text_archive_file = texts_file
+        self.mmap_index = mmap_index
+        self.compact_every = compact_every
+        self.index_type = index_type
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"search_mode must be one of {', '.join(SEARCH_MODES)}")
+        self.search_mode = search_mode
+        # None waits for every query embedding; otherwise slower searches fall back to lexical
+        self.embedding_timeout = embedding_timeout
         self.index = None
-        self.data = []
+        # Whether the index is a read-only memory map of the snapshot, copied into memory before the first write
+        self.index_mapped = False
+        self.metadata = MetadataStore()
+        self.lexical = LexicalIndex()
+        self.generation = 0
+        # Deleted positions still present in an index that cannot remove vectors (HNSW), and
+        # the selectors excluding them from searches, built on first use after they change
+        self.index_tombstones = set()
+        self.tombstone_selectors = None
+        self.journal_records = 0
+        # End of the text archive; record texts live there and are read back on demand
+        self.text_bytes = 0
+        self.text_reader = None
+        # Shared by searches; writers only take it exclusively to publish index, metadata
+        # and lexical changes, so a transaction's writes become visible in one step
+        self.lock = ReadWriteLock()
+        # Serializes writers, who stage, archive and journal their writes holding only this;
+        # a compaction holds it while building the next snapshot
+        self.write_lock = threading.RLock()
+        # Writes of the open transaction (see transaction), owned by the thread holding write_lock
+        self.staged = None
+        # Guards what searches update while sharing the lock: the text reader and search counters
+        self.reader_lock = threading.Lock()
+        # Held by the thread switching to the ANN index (see _maybe_upgrade_index)
+        self.upgrade_lock = threading.Lock()
+        self.upgrade_thread = None
+        # OpenAI client for embeddings, created on first use unless one is given
+        self.client = client
+        self.embedding_requests = 0
+        self.embedding_executor = None
+        # Query embeddings in flight, shared by searches for the same query; reentrant since a
+        # done callback runs at once on the registering thread if the request already finished
+        self.pending_embeddings = {}
+        self.embedding_lock = threading.RLock()
+        self.search_counts = {mode: 0 for mode in SEARCH_MODES}
+        self.lexical_fallbacks = 0
         
-        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        for path in (index_file, metadata_file, lexical_file, journal_file, vectors_file, texts_file):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        
+        self.embedding_cache = embedding_cache or EmbeddingCache(
+            EMBEDDING_MODEL,
+            dimension,
+            cache_dir=os.path.join(os.path.dirname(index_file), "embedding_cache")
+        )
         
         self._initialize_index()
     
     def _initialize_index(self):
-        """Initialize FAISS index or load existing one"""
-        if os.path.exists(self.index_file) and os.path.exists(self.data_file):
-            self.index = faiss.read_index(self.index_file)
-            with open(self.data_file, 'rb') as f:
-                self.data = pickle.load(f)
+        """Initialize FAISS index or load the existing snapshot and replay the journal
+        
+        A snapshot index is memory-mapped read-only (see _unmap_index) unless the
+        journal adds to it, and record texts stay in the text archive until read.
+        """
+        index = None
+        mapped = False
+        expected_ntotal = 0
+        legacy = False
+        if os.path.exists(self.index_file) and os.path.exists(self.metadata_file):
+            mapped = self.mmap_index
+            index = faiss.read_index(self.index_file, faiss.IO_FLAG_MMAP if mapped else 0)
+            with open(self.metadata_file, 'rb') as f:
+                self.metadata, snapshot = MetadataStore.load(f)
+            self.generation = snapshot['generation']
+            expected_ntotal = snapshot['index_ntotal']
+            self.archive_file = os.path.join(os.path.dirname(self.vectors_file), snapshot['archive_file'])
+            self.text_archive_file = os.path.join(os.path.dirname(self.texts_file), snapshot['texts_file'])
+            self.text_bytes = self.metadata.text_end()
+            if os.path.exists(self.lexical_file):
+                with open(self.lexical_file, 'rb') as f:
+                    lexical, lexical_snapshot = LexicalIndex.load(f)
+                # A lexical snapshot from another generation is rebuilt from the texts below
+                if lexical_snapshot['generation'] == self.generation:
+                    self.lexical = lexical
+        elif os.path.exists(self.index_file) and os.path.exists(self.data_file):
+            mapped = self.mmap_index
+            index = faiss.read_index(self.index_file, faiss.IO_FLAG_MMAP if mapped else 0)
+            expected_ntotal = self._load_legacy_snapshot()
+            legacy = True
+        self._remove_stale_archives()
+        if mapped and not is_id_mapped(index):
+            # A positional index may have its vectors read back into the archive below
+            index = faiss.read_index(self.index_file)
+            mapped = False
+        self._reconcile_archive(index)
+        replayed = self._replay_journal()
+        
+        if index is None:
+            self._install_index(self._build_index("flat", len(self.metadata)))
+        elif not is_id_mapped(index) or index.ntotal != expected_ntotal:
+            # A positional index from an older store, or snapshot files left out of
+            # step by a crash between their writes: rebuild from the archive
+            self._install_index(self._build_index(index_kind(index), len(self.metadata)))
+        else:
+            if replayed < len(self.metadata):
+                if mapped:
+                    index = faiss.read_index(self.index_file)
+                    mapped = False
+                index.add_with_ids(self._read_archive(replayed, len(self.metadata)),
+                                   np.arange(replayed, len(self.metadata), dtype=np.int64))
+            self._install_index(index, mapped=mapped)
+        self._sync_lexical()
+        
+        if legacy:
+            # Write the columnar snapshot now so the pickle is only read once
+            self.compact()
+            os.remove(self.data_file)
+    
+    def _load_legacy_snapshot(self):
+        """Load a pickled record list written by an older version; returns the index size it expects"""
+        with open(self.data_file, 'rb') as f:
+            snapshot = pickle.load(f)
+        if isinstance(snapshot, dict):
+            records = snapshot['records']
+            self.generation = snapshot['generation']
+            expected_ntotal = snapshot['index_ntotal']
+            self.archive_file = os.path.join(os.path.dirname(self.vectors_file), snapshot['archive_file'])
+            if 'texts_file' in snapshot:
+                self.text_archive_file = os.path.join(os.path.dirname(self.texts_file), snapshot['texts_file'])
         else:
-            self.index = faiss.IndexFlatL2(self.dimension)
-            self.data = []
+            # Stores written before snapshots carried metadata hold a plain record list
+            records = snapshot
+            expected_ntotal = len(records)
+        
+        # Stores written before the text archive keep each text in its record
+        legacy_texts = [record for record in records if 'text' in record]
+        if legacy_texts:
+            self._store_texts(legacy_texts)
+        for record in records:
+            self._index_record(record)
+        return expected_ntotal
+    
+    def _index_record(self, record):
+        """Add a stored record to the metadata columns and their lookups"""
+        self.metadata.append(record)
+        self.text_bytes = max(self.text_bytes, record['text_offset'] + record['text_length'])
+    
+    def _sync_lexical(self):
+        """Index documents the lexical snapshot lacks, from their stored texts, and drop deleted ones"""
+        if len(self.lexical) > len(self.metadata):
+            self.lexical = LexicalIndex()
+        live = self.metadata.column("live")
+        for position in range(len(self.lexical), len(self.metadata)):
+            if live[position]:
+                self.lexical.add(position, term_counts(self._text(position)))
+            else:
+                self.lexical.add_deleted()
+        for position in np.flatnonzero((live == 0) & (self.lexical.lengths() != DELETED)).tolist():
+            self.lexical.delete(position)
+    
+    def _deleted_positions(self):
+        return np.flatnonzero(self.metadata.column("live") == 0).astype(np.int64)
+    
+    def _install_index(self, index, mapped=False):
+        """Drop deleted documents from an index and make it the current one
+        
+        A memory-mapped index is read-only, so its deleted documents are excluded at search time.
+        """
+        deleted = self._deleted_positions()
+        self.index_tombstones = set()
+        self.tombstone_selectors = None
+        if len(deleted):
+            if supports_removal(index) and not mapped:
+                index.remove_ids(faiss.IDSelectorBatch(deleted))
+            else:
+                self.index_tombstones = set(deleted.tolist())
+        self.index = index
+        self.index_mapped = mapped
+    
+    def _unmap_index(self):
+        """Replace a memory-mapped snapshot index with an in-memory copy before it is written to
+        
+        The copy is read outside the lock, so searches keep using the mapped index meanwhile.
+        The snapshot file always matches the mapped index since it is never modified.
+        """
+        with self.lock.read():
+            if not self.index_mapped:
+                return
+            mapped = self.index
+        index = faiss.read_index(self.index_file)
+        with self.lock.write():
+            if self.index is mapped:
+                self._install_index(index)
+    
+    def _archive_rows(self, path=None):
+        path = path or self.archive_file
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // (self.dimension * 4)
+    
+    def _archive(self, path=None):
+        """Memory-map a vector archive, the current one by default, read-only"""
+        path = path or self.archive_file
+        return np.memmap(path, dtype=np.float32, mode='r', shape=(self._archive_rows(path), self.dimension))
+    
+    def _read_archive(self, start, end):
+        """Read exact vectors [start, end) from the vector archive"""
+        if end <= start:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.array(self._archive()[start:end])
+    
+    def _write_archive(self, embeddings, row):
+        """Write vectors from the given row on, over any archived by a batch that was never journaled"""
+        with open(self.archive_file, 'r+b' if os.path.exists(self.archive_file) else 'wb') as f:
+            f.truncate(row * self.dimension * 4)
+            f.seek(row * self.dimension * 4)
+            f.write(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+    
+    def _remove_stale_archives(self):
+        """Delete archives from other generations left behind by an interrupted compaction"""
+        for base, current in ((self.vectors_file, self.archive_file), (self.texts_file, self.text_archive_file)):
+            for path in glob.glob(glob.escape(base) + "*"):
+                if path != current and not path.endswith(".tmp"):
+                    os.remove(path)
+    
+    def _store_texts(self, records):
+        """Move records' texts to the end of the text archive, keeping their offset and length instead"""
+        offset = self.text_bytes
+        encoded = []
+        for record in records:
+            text = record.pop('text').encode()
+            record['text_offset'] = offset
+            record['text_length'] = len(text)
+            offset += len(text)
+            encoded.append(text)
+        # Written at the end of the indexed records, over any texts of a batch that was never journaled
+        with open(self.text_archive_file, 'r+b' if os.path.exists(self.text_archive_file) else 'wb') as f:
+            f.seek(self.text_bytes)
+            f.write(b"".join(encoded))
+    
+    def _text_reader(self):
+        with self.reader_lock:
+            if self.text_reader is None:
+                self.text_reader = os.open(self.text_archive_file, os.O_RDONLY)
+            return self.text_reader
     
-    @traceable(name="get_embedding", run_type="embedding")
+    def _text(self, position):
+        """Read a document's text from the text archive"""
+        return os.pread(self._text_reader(), self.metadata.text_lengths[position],
+                        self.metadata.text_offsets[position]).decode()
+    
+    def _close_text_reader(self):
+        if self.text_reader is not None:
+            os.close(self.text_reader)
+            self.text_reader = None
+    
+    def _reconcile_archive(self, index):
+        """Keep exactly one archived vector per snapshot record"""
+        rows = self._archive_rows()
+        if rows > len(self.metadata):
+            # Vectors archived for journal records; the journal replay keeps the ones it applies
+            return
+        if rows < len(self.metadata) and index is not None and not is_id_mapped(index):
+            # Stores written before the archive existed; recover the vectors from the index
+            self._write_archive(reconstruct(index, rows, min(len(self.metadata), index.ntotal) - rows), rows)
+    
+    def _truncate_archive(self, rows):
+        if self._archive_rows() > rows:
+            with open(self.archive_file, 'r+b') as f:
+                f.truncate(rows * self.dimension * 4)
+    
+    def _truncate_texts(self):
+        if os.path.exists(self.text_archive_file) and os.path.getsize(self.text_archive_file) > self.text_bytes:
+            with open(self.text_archive_file, 'r+b') as f:
+                f.truncate(self.text_bytes)
+    
+    def _build_index(self, index_type, count, archive_file=None):
+        """Build and train an index of the given type over archived vectors [0, count)"""
+        if count == 0:
+            return build_index("flat", self.dimension, count)
+        index = build_index(index_type, self.dimension, count)
+        archive = self._archive(archive_file)
+        
+        sample_size = min(training_size(index), count)
+        if sample_size:
+            positions = np.sort(np.random.default_rng(0).choice(count, sample_size, replace=False))
+            index.train(np.array(archive[positions]))
+        
+        for start in range(0, count, BUILD_CHUNK_SIZE):
+            end = min(start + BUILD_CHUNK_SIZE, count)
+            index.add_with_ids(np.array(archive[start:end]), np.arange(start, end, dtype=np.int64))
+        
+        return index
+    
+    def _maybe_upgrade_index(self):
+        """Start replacing the flat index with the configured ANN index once the store is large enough
+        
+        The index is trained and filled on a background thread, so the writer that
+        crossed ann_threshold does not wait for it.
+        """
+        if (self.index_type == "flat" or index_kind(self.index) != "flat" or
+                len(self.metadata) - self.metadata.deleted_count < self.ann_threshold):
+            return
+        if not self.upgrade_lock.acquire(blocking=False):
+            return
+        self.upgrade_thread = threading.Thread(target=self._upgrade_index, name="index-upgrade", daemon=True)
+        self.upgrade_thread.start()
+    
+    def _upgrade_index(self):
+        """Train and fill the ANN index without holding the locks, then catch up and swap it in"""
+        try:
+            with self.lock.read():
+                count = len(self.metadata)
+                archive_file = self.archive_file
+            index = self._build_index(self.index_type, count)
+            with self.write_lock:
+                if self.archive_file != archive_file:
+                    # A dense compaction renumbered the documents meanwhile; retry on a later insert
+                    return
+                index.add_with_ids(self._read_archive(count, len(self.metadata)),
+                                   np.arange(count, len(self.metadata), dtype=np.int64))
+                with self.lock.write():
+                    self._install_index(index)
+                self.compact()
+            print(f"Vector store switched to a {self.index_type} index at {count} documents.")
+        except Exception as e:
+            print(f"Warning: switching to a {self.index_type} index failed: {e}")
+        finally:
+            self.upgrade_lock.release()
+    
+    def wait_for_index_upgrade(self, timeout=None):
+        """Wait for a background switch to the ANN index, if one was started"""
+        thread = self.upgrade_thread
+        if thread is not None:
+            thread.join(timeout)
+    
+    def _replay_journal(self):
+        """Apply journal records written since the last snapshot
+        
+        Returns the position of the first record added by the journal. A journal
+        from another snapshot generation has already been folded in and is reset.
+        """
+        first_replayed = len(self.metadata)
+        if not os.path.exists(self.journal_file):
+            self._truncate_archive(len(self.metadata))
+            self._truncate_texts()
+            self._reset_journal()
+            return first_replayed
+        
+        valid_bytes = 0
+        stale = False
+        with open(self.journal_file, 'rb') as f:
+            while True:
+                try:
+                    record, vector = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError, ValueError, TypeError):
+                    # A torn final record from an interrupted append is dropped
+                    break
+                if 'generation' in record:
+                    if record['generation'] != self.generation:
+                        stale = True
+                        break
+                    valid_bytes = f.tell()
+                    continue
+                if 'deleted' in record:
+                    for position in record['deleted']:
+                        if position < len(self.metadata) and self.metadata.live[position]:
+                            self.metadata.delete(position)
+                elif record['index'] == len(self.metadata):
+                    if 'text' in record:
+                        self._store_texts([record])
+                    self._index_record(record)
+                elif record['index'] > len(self.metadata):
+                    break
+                valid_bytes = f.tell()
+                self.journal_records += 1
+        
+        # Vectors and texts archived by a batch whose journal write never completed are dropped
+        self._truncate_archive(len(self.metadata))
+        self._truncate_texts()
+        
+        if stale:
+            self.journal_records = 0
+            self._reset_journal()
+        elif valid_bytes < os.path.getsize(self.journal_file):
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(valid_bytes)
+        
+        return first_replayed
+    
+    @traced(name="get_embedding", run_type="embedding")
     def _get_embedding(self, text):
         """Get embedding for text using OpenAI's embedding model"""
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        response = client.embeddings.create(
-            input=text,
-            model="text-embedding-ada-002"
-        )
-        embedding = np.array([response.data[0].embedding], dtype=np.float32)
+        return self._get_embeddings([text])
+    
+    def embed_query(self, query, timeout=None):
+        """Embed a query as search does, sharing its embedding cache
+        
+        With a timeout, returns None if the embedding is not ready in time or the
+        request fails. A late request carries on in the background and caches its
+        result, and concurrent callers embedding the same query share it.
+        """
+        if timeout is None:
+            return self._get_embedding(query)[0]
         
-        return embedding
+        cached = self.embedding_cache.get_many([query])[0]
+        if cached is not None:
+            return cached
+        with self.embedding_lock:
+            future = self.pending_embeddings.get(query)
+            if future is None:
+                if self.embedding_executor is None:
+                    self.embedding_executor = ThreadPoolExecutor(max_workers=EMBEDDING_WORKERS,
+                                                                 thread_name_prefix="query-embedding")
+                future = submit_in_context(self.embedding_executor, self._get_embedding, query)
+                self.pending_embeddings[query] = future
+                future.add_done_callback(lambda _: self._forget_embedding(query, future))
+        try:
+            return future.result(timeout)[0]
+        except FutureTimeoutError:
+            METRICS.increment("embedding_timeouts_total")
+        except Exception as e:
+            print(f"Warning: query embedding failed: {e}")
+            METRICS.increment("embedding_errors_total")
+        return None
     
-    @traceable(name="add_document", run_type="tool")
-    def add_document(self, document, source_type, timestamp=None):
-        """Add document to vector store"""
-        if not timestamp:
-            timestamp = datetime.now().isoformat()
+    def _forget_embedding(self, query, future):
+        with self.embedding_lock:
+            if self.pending_embeddings.get(query) is future:
+                del self.pending_embeddings[query]
+    
+    def embed_queries(self, queries):
+        """Embed many queries in as few requests as possible, warming the cache for later searches"""
+        return self._get_embeddings(list(queries))
+    
+    @traced(name="get_embeddings", run_type="embedding")
+    def _get_embeddings(self, texts):
+        """Embed texts, serving cached vectors and batching the misses into few requests"""
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        
+        missing = {}
+        for i, vector in enumerate(self.embedding_cache.get_many(texts)):
+            if vector is None:
+                missing.setdefault(texts[i], []).append(i)
+            else:
+                embeddings[i] = vector
         
-        doc_hash = hashlib.md5(document.encode()).hexdigest()
+        if not missing:
+            return embeddings
         
-        for item in self.data:
-            if item.get('hash') == doc_hash:
-                return {"status": "skipped", "reason": "duplicate", "hash": doc_hash}
+        if self.client is None:
+            # Imported on first use: the openai package takes most of a second to import
+            import openai
+            self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         
-        embedding = self._get_embedding(document)
-        self.index.add(embedding)
+        missing_texts = list(missing)
+        for start, end in self._embedding_batches(missing_texts):
+            response = self.client.embeddings.create(
+                input=missing_texts[start:end],
+                model=EMBEDDING_MODEL
+            )
+            self.embedding_requests += 1
+            METRICS.increment("embedding_requests_total")
+            METRICS.increment("embedding_inputs_total", end - start)
+            batch_texts = missing_texts[start:end]
+            batch_vectors = np.zeros((end - start, self.dimension), dtype=np.float32)
+            for item in response.data:
+                batch_vectors[item.index] = item.embedding
+            self.embedding_cache.put_many(batch_texts, batch_vectors)
+            for text, vector in zip(batch_texts, batch_vectors):
+                embeddings[missing[text]] = vector
         
-        self.data.append({
-            'text': document,
+        self.embedding_cache.flush()
+        
+        return embeddings
+    
+    def _embedding_batches(self, texts):
+        """Split texts into (start, end) ranges that fit a single embedding request"""
+        batches = []
+        start = 0
+        batch_tokens = 0
+        for i, text in enumerate(texts):
+            # Rough estimate of ~4 characters per token
+            tokens = len(text) // 4 + 1
+            if i > start and (i - start >= EMBEDDING_MAX_BATCH_SIZE or
+                              batch_tokens + tokens > EMBEDDING_MAX_BATCH_TOKENS):
+                batches.append((start, i))
+                start = i
+                batch_tokens = 0
+            batch_tokens += tokens
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+    
+    @traced(name="add_document", run_type="tool")
+    def add_document(self, document, source_type, timestamp=None, key=None):
+        """Add document to vector store"""
+        result = self.add_documents([{
+            'document': document,
             'source_type': source_type,
             'timestamp': timestamp,
-            'hash': doc_hash,
-            'index': len(self.data)
-        })
+            'key': key
+        }])
+        return result["results"][0]
+    
+    @traced(name="add_documents", run_type="tool")
+    def add_documents(self, batch):
+        """Add a batch of documents with batched embeddings and a single save
         
-        self._save()
+        Each item is a dict with 'document', 'source_type' and optional 'timestamp'
+        and 'key', plus 'parent', 'chunk' and 'span' for chunks from chunk_documents.
+        Under a supersede retention policy a new document replaces the live documents
+        with the same source_type and key; all chunks of a document must therefore
+        be added in the same batch. Chunks unchanged from the old version are kept.
+        Searches see the batch once it is stored, or with the rest of an enclosing
+        transaction.
+        """
+        batch_hashes = set()
+        all_hashes = set()
+        results = []
+        pending = []
+        
+        with self.lock.read():
+            for item in batch:
+                digest = hashlib.md5(item['document'].encode()).digest()
+                all_hashes.add(digest)
+                if digest in batch_hashes or self.metadata.find_hash(digest) is not None:
+                    results.append({"status": "skipped", "reason": "duplicate", "hash": digest.hex()})
+                    continue
+                batch_hashes.add(digest)
+                pending.append((item, digest, len(results)))
+                results.append(None)
+        
+        # Embed and tokenize outside the locks so neither searches nor other writers wait on the API
+        embeddings = self._get_embeddings([item['document'] for item, _, _ in pending]) if pending else None
+        counts = [term_counts(item['document']) for item, _, _ in pending]
+        superseded = []
+        superseding = set()
+        
+        with self.transaction():
+            staged = self.staged
+            # Another writer, or this transaction, may have added some of these while they were being embedded
+            fresh = [j for j, (_, digest, _) in enumerate(pending) if self._find_hash(digest) is None]
+            for j in set(range(len(pending))) - set(fresh):
+                results[pending[j][2]] = {"status": "skipped", "reason": "duplicate", "hash": pending[j][1].hex()}
+            pending = [pending[j] for j in fresh]
+            
+            if pending:
+                embeddings = embeddings[fresh]
+                counts = [counts[j] for j in fresh]
+                
+                records = []
+                for item, digest, position in pending:
+                    record = {
+                        'text': item['document'],
+                        'source_type': item['source_type'],
+                        'timestamp': item.get('timestamp') or datetime.now().isoformat(),
+                        'hash': digest.hex(),
+                        'key': item.get('key'),
+                        'index': staged.end + len(records)
+                    }
+                    if item.get('chunk') is not None:
+                        record['parent'] = item['parent']
+                        record['chunk'] = item['chunk']
+                        record['span'] = tuple(item['span'])
+                    
+                    # Collect the old version's positions before any of this batch is staged
+                    key = (record['source_type'], record['key'])
+                    if (record['key'] is not None and key not in superseding and
+                            self.retention.get(record['source_type'], {}).get('supersede')):
+                        superseding.add(key)
+                        superseded.extend(position for position in self._key_positions(*key)
+                                          if self._digest(position) not in all_hashes)
+                    
+                    records.append(record)
+                    results[position] = {
+                        "status": "added",
+                        "hash": record['hash'],
+                        "index": record['index'],
+                        "document_length": len(item['document'])
+                    }
+                
+                # Texts and vectors go past the end of the published documents, where searches never read
+                self._store_texts(records)
+                self._write_archive(embeddings, staged.end)
+                self._append_journal(records, embeddings)
+                # Only journaled texts count; a failed batch's are written over by the next one
+                self.text_bytes = records[-1]['text_offset'] + records[-1]['text_length']
+                for record in records:
+                    staged.hashes[bytes.fromhex(record['hash'])] = record['index']
+                    if record['key'] is not None:
+                        staged.keys.setdefault((record['source_type'], record['key']), []).append(record['index'])
+                staged.records.extend(records)
+                staged.counts.extend(counts)
+                
+                if superseded:
+                    self._delete(superseded)
         
         return {
-            "status": "added",
-            "hash": doc_hash,
-            "index": len(self.data) - 1,
-            "document_length": len(document)
+            "added": len(pending),
+            "skipped": len(results) - len(pending),
+            "superseded": len(superseded),
+            "results": results
         }
     
-    @traceable(name="vector_search", run_type="retriever")
-    def search(self, query, k=5):
-        """Search for similar documents"""
-        if len(self.data) == 0:
+    @contextmanager
+    def transaction(self):
+        """Publish the writes made inside the block to searches together when it ends
+        
+        Writes are stored and journaled as they are made, but searches keep seeing
+        the store as it was until the block ends and then see all of its additions
+        and deletions at once. Other writers wait for the block; transactions nest.
+        """
+        with self.write_lock:
+            if self.staged is not None:
+                yield
+                return
+            staged = self.staged = StagedWrites(len(self.metadata))
+            try:
+                yield
+            finally:
+                # Staged writes are already journaled, so they are published even if the block fails
+                self.staged = None
+                self._publish(staged)
+            if self.journal_records >= self.compact_every or (staged.expired and self._needs_rebuild()):
+                self.compact()
+        
+        self._maybe_upgrade_index()
+    
+    def _publish(self, staged):
+        """Apply a transaction's writes to the index, metadata and lexical index in one step"""
+        if not staged.records and not staged.deleted:
+            return
+        if staged.records:
+            self._unmap_index()
+            embeddings = self._read_archive(staged.start, staged.end)
+        deleted = sorted(staged.deleted)
+        
+        with self.lock.write():
+            for record, record_counts in zip(staged.records, staged.counts):
+                self._index_record(record)
+                self.lexical.add(record['index'], record_counts)
+            if staged.records:
+                self.index.add_with_ids(embeddings, np.arange(staged.start, staged.end, dtype=np.int64))
+            
+            for position in deleted:
+                self.metadata.delete(position)
+                self.lexical.delete(position)
+            if deleted:
+                if supports_removal(self.index) and not self.index_mapped:
+                    self.index.remove_ids(faiss.IDSelectorBatch(np.array(deleted, dtype=np.int64)))
+                else:
+                    self.index_tombstones.update(deleted)
+                    self.tombstone_selectors = None
+    
+    def _is_live(self, position):
+        """Whether a position holds a live document, counting the open transaction's writes"""
+        staged = self.staged
+        if not 0 <= position < staged.end or position in staged.deleted:
+            return False
+        return position >= staged.start or bool(self.metadata.live[position])
+    
+    def _find_hash(self, digest):
+        """Position of the live document with this md5 digest in the open transaction, or None"""
+        position = self.staged.hashes.get(digest)
+        if position is None:
+            position = self.metadata.find_hash(digest)
+        return position if position is not None and self._is_live(position) else None
+    
+    def _key_positions(self, source_type, key):
+        """Positions of the live documents with this source_type and key in the open transaction"""
+        positions = set(self.metadata.key_positions(source_type, key))
+        positions.update(self.staged.keys.get((source_type, key), ()))
+        return {position for position in positions if self._is_live(position)}
+    
+    def _digest(self, position):
+        staged = self.staged
+        if position >= staged.start:
+            return bytes.fromhex(staged.records[position - staged.start]['hash'])
+        return self.metadata.digest(position)
+    
+    def delete(self, hashes):
+        """Delete documents by the md5 hashes add_documents reported for them
+        
+        Positions are not accepted since dense compaction renumbers them. Deleted
+        documents are tombstoned and removed from the FAISS index where it supports
+        removal; HNSW and memory-mapped indexes exclude them at search time instead.
+        """
+        with self.transaction():
+            deleted = self._delete(hashes=hashes)
+        
+        return {"deleted": deleted}
+    
+    def _delete(self, positions=None, hashes=None):
+        """Stage and journal deletions in the open transaction; returns how many documents they delete"""
+        targets = {position for position in positions or [] if self._is_live(position)}
+        targets.update(self._find_hash(bytes.fromhex(doc_hash)) for doc_hash in hashes or [])
+        targets.discard(None)
+        targets = sorted(targets)
+        if not targets:
+            return 0
+        
+        self.staged.deleted.update(targets)
+        self._append_journal([{'deleted': targets}], [None])
+        return len(targets)
+    
+    def expire(self, now=None):
+        """Delete documents older than their source_type's max_age_days"""
+        now = parse_timestamp(now) if now is not None else time.time()
+        expired = {}
+        
+        with self.transaction():
+            staged = self.staged
+            timestamps = self.metadata.column("timestamps")
+            live = self.metadata.column("live").astype(bool)
+            targets = []
+            for source_type, policy in self.retention.items():
+                if not policy.get('max_age_days'):
+                    continue
+                positions = np.array(self.metadata.source_positions.get(source_type, ()), dtype=np.int64)
+                cutoff = now - timedelta(days=policy['max_age_days']).total_seconds()
+                # Documents without a parseable timestamp never expire
+                positions = positions[live[positions] & (timestamps[positions] < cutoff)].tolist()
+                positions.extend(record['index'] for record in staged.records
+                                 if record['source_type'] == source_type and
+                                 parse_timestamp(record['timestamp']) < cutoff)
+                positions = [position for position in positions if position not in staged.deleted]
+                if positions:
+                    expired[source_type] = len(positions)
+                    targets.extend(positions)
+            
+            self._delete(targets)
+            staged.expired = True
+        
+        return {"expired": sum(expired.values()), "by_source_type": expired}
+    
+    @traced(name="vector_search", run_type="retriever")
+    def search(self, query, k=5, source_types=None, since=None, recency_weight=0.0,
+               recency_half_life_hours=DEFAULT_RECENCY_HALF_LIFE_HOURS, merge_neighbors=0, mode=None):
+        """Search for similar documents
+        
+        mode is one of SEARCH_MODES (the store's search_mode by default). When the
+        query embedding is not ready within embedding_timeout, dense and hybrid
+        searches are answered from the lexical index alone.
+        
+        source_types and since (a datetime or ISO string) restrict the search inside
+        the index. A recency_weight in (0, 1] blends an exponential age decay into
+        the score used for ranking. With merge_neighbors, each of the top k chunk hits
+        is widened by that many neighbouring chunks on each side, and hits from the
+        same parent document that touch are merged into one result.
+        """
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+        if len(self.metadata) == self.metadata.deleted_count:
             return []
         
-        query_embedding = self._get_embedding(query)
-        distances, indices = self.index.search(query_embedding, min(k, len(self.data)))
+        start = time.perf_counter()
+        query_embedding = None
+        if mode != "lexical":
+            query_vector = self.embed_query(query, timeout=self.embedding_timeout)
+            if query_vector is None:
+                mode = "lexical"
+                with self.reader_lock:
+                    self.lexical_fallbacks += 1
+                METRICS.increment("search_lexical_fallbacks_total")
+            else:
+                query_embedding = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+        fetch_k = k * RECENCY_CANDIDATE_FACTOR if recency_weight > 0 else k
+        if mode == "hybrid":
+            fetch_k *= HYBRID_CANDIDATE_FACTOR
         
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.data):  
+        # Search and resolve sharing the lock so a concurrent batch or transaction is seen in full or not at all
+        with self.lock.read():
+            positions = self._filter_positions(source_types, since)
+            if positions is not None and len(positions) == 0:
+                return []
+            
+            # Position -> [relevance in [0, 1], distance, similarity, BM25 score]
+            candidates = {}
+            if mode != "lexical":
+                for rank, (position, distance) in enumerate(self._dense_hits(query_embedding, positions, fetch_k)):
+                    similarity = 1.0 / (1.0 + distance)
+                    relevance = similarity if mode == "dense" else 1.0 / (RRF_K + rank + 1)
+                    candidates[position] = [relevance, distance, similarity, None]
+            if mode != "dense":
+                lexical_hits = self.lexical.search(tokenize(query), fetch_k, positions)
+                for rank, (position, bm25) in enumerate(lexical_hits):
+                    candidate = candidates.setdefault(position, [0.0, None, None, None])
+                    candidate[3] = bm25
+                    # Lexical scores are relative to the best match; fused ranks to a first place in both
+                    candidate[0] += bm25 / lexical_hits[0][1] if mode == "lexical" else 1.0 / (RRF_K + rank + 1)
+            if mode == "hybrid":
+                for candidate in candidates.values():
+                    candidate[0] /= 2.0 / (RRF_K + 1)
+            
+            now = time.time()
+            hits = []
+            for position, (relevance, distance, similarity, bm25) in candidates.items():
+                score = relevance
+                if recency_weight > 0:
+                    timestamp = self.metadata.timestamps[position]
+                    if math.isnan(timestamp):
+                        recency = 0.0
+                    else:
+                        age_hours = max(now - timestamp, 0) / 3600
+                        recency = 0.5 ** (age_hours / recency_half_life_hours)
+                    score = (1 - recency_weight) * relevance + recency_weight * recency
+                hits.append((score, position, distance, similarity, bm25))
+            
+            hits.sort(key=lambda hit: hit[0], reverse=True)
+            # Metadata and texts are only read for the results returned
+            results = []
+            for score, position, distance, similarity, bm25 in hits[:k]:
+                record = self.metadata[position]
                 result = {
-                    'text': self.data[idx]['text'],
-                    'source_type': self.data[idx]['source_type'],
-                    'timestamp': self.data[idx]['timestamp'],
-                    'distance': float(distances[0][i]),
-                    'similarity_score': 1.0 / (1.0 + float(distances[0][i]))  
+                    'position': position,
+                    'source_type': record.source_type,
+                    'timestamp': record.timestamp,
+                    'distance': distance,
+                    'similarity_score': similarity,
+                    'lexical_score': bm25,
+                    'score': score
                 }
+                if record.chunk is not None:
+                    result['parent'] = record.parent
+                    result['chunks'] = [record.chunk] * 2
                 results.append(result)
+            
+            if merge_neighbors:
+                results = self._merge_neighbors(results, merge_neighbors)
+            for result in results:
+                position = result.pop('position')
+                if 'text' not in result:
+                    result['text'] = self._text(position)
+            with self.reader_lock:
+                self.search_counts[mode] += 1
         
-        results.sort(key=lambda x: x['similarity_score'], reverse=True)
-        
+        METRICS.observe("search_seconds", time.perf_counter() - start, mode=mode)
         return results
     
+    def _dense_hits(self, query_embedding, positions, fetch_k):
+        """Up to fetch_k live (position, distance) pairs nearest the query, nearest first"""
+        if positions is None:
+            distances, indices = self.index.search(
+                query_embedding,
+                min(fetch_k, len(self.metadata) - self.metadata.deleted_count),
+                params=search_params(self.index, self.nprobe, self.ef_search, selector=self._tombstone_selector())
+            )
+            distances, indices = distances[0], indices[0]
+        elif len(positions) <= BRUTE_FORCE_LIMIT:
+            distances, indices = self._exact_search(query_embedding[0], positions, fetch_k)
+        else:
+            selector = faiss.IDSelectorBatch(positions)
+            distances, indices = self.index.search(
+                query_embedding,
+                min(fetch_k, len(positions)),
+                params=search_params(self.index, self.nprobe, self.ef_search, selector=selector)
+            )
+            distances, indices = distances[0], indices[0]
+        
+        return [(int(idx), float(distance)) for distance, idx in zip(distances, indices)
+                if 0 <= idx < len(self.metadata) and self.metadata.live[idx]]
+    
+    def _tombstone_selector(self):
+        """Selector excluding index_tombstones from a search, or None without any
+        
+        The selectors are kept until the tombstones change, which also keeps the
+        batch selector referenced while FAISS uses the one negating it.
+        """
+        if not self.index_tombstones:
+            return None
+        if self.tombstone_selectors is None:
+            excluded = faiss.IDSelectorBatch(np.array(sorted(self.index_tombstones), dtype=np.int64))
+            self.tombstone_selectors = (excluded, faiss.IDSelectorNot(excluded))
+        return self.tombstone_selectors[1]
+    
+    def _merge_neighbors(self, results, window):
+        """Widen chunk hits by their neighbours and merge touching hits from the same parent
+        
+        Results keep the rank of their best hit; merged results take its score.
+        """
+        merged = []
+        groups = {}
+        for result in results:
+            if 'parent' not in result:
+                merged.append(result)
+                continue
+            chunk = first = last = result['chunks'][0]
+            key = (result['source_type'], result['parent'])
+            position = result['position']
+            while (first > 0 and first - 1 >= chunk - window and
+                   self.metadata.chunk_position(position, first - 1) is not None):
+                first -= 1
+            while last + 1 <= chunk + window and self.metadata.chunk_position(position, last + 1) is not None:
+                last += 1
+            
+            group = next((group for group in groups.get(key, [])
+                          if first <= group['chunks'][1] + 1 and last >= group['chunks'][0] - 1), None)
+            if group is None:
+                group = {**result, 'chunks': [first, last]}
+                groups.setdefault(key, []).append(group)
+                merged.append(group)
+            else:
+                group['chunks'] = [min(first, group['chunks'][0]), max(last, group['chunks'][1])]
+        
+        for group in merged:
+            if 'parent' not in group:
+                continue
+            positions = [self.metadata.chunk_position(group['position'], chunk)
+                         for chunk in range(group['chunks'][0], group['chunks'][1] + 1)]
+            group['text'] = merge_chunks([
+                {'text': self._text(position),
+                 'span': (self.metadata.span_starts[position], self.metadata.span_ends[position])}
+                for position in positions if position is not None
+            ])
+        return merged
+    
+    def _filter_positions(self, source_types=None, since=None):
+        """Live positions matching the filters, or None when unfiltered"""
+        if source_types is None and since is None:
+            return None
+        
+        if source_types is not None:
+            if isinstance(source_types, str):
+                source_types = [source_types]
+            positions = np.concatenate([
+                np.array(self.metadata.source_positions.get(source_type, ()), dtype=np.int64)
+                for source_type in source_types
+            ] or [np.zeros(0, dtype=np.int64)])
+            if since is not None:
+                positions = positions[self.metadata.column("timestamps")[positions] >= parse_timestamp(since)]
+        else:
+            positions = self.metadata.positions_since(parse_timestamp(since))
+        
+        positions = positions[self.metadata.column("live")[positions].astype(bool)]
+        return np.sort(positions)
+    
+    def _exact_search(self, query_vector, positions, k):
+        """Exact L2 search restricted to the given positions, read from the archive"""
+        distances = ((np.asarray(self._archive()[positions]) - query_vector) ** 2).sum(axis=1)
+        k = min(k, len(positions))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return distances[top], positions[top]
+    
+    def _append_journal(self, records, embeddings):
+        """Append new records (or a deletion) to the journal
+        
+        A write that fails is cut off again, so replay does not stop at its torn
+        record and miss the records appended after it.
+        """
+        with open(self.journal_file, 'ab') as f:
+            end = f.tell()
+            try:
+                for record, embedding in zip(records, embeddings):
+                    pickle.dump((record, None if embedding is None else embedding.tobytes()), f)
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                f.truncate(end)
+                raise
+        
+        self.journal_records += len(records)
+    
+    def _reset_journal(self):
+        """Start an empty journal for the current snapshot generation"""
+        with open(self.journal_file, 'wb') as f:
+            pickle.dump(({'generation': self.generation}, None), f)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def _needs_rebuild(self):
+        deleted = self.metadata.deleted_count
+        return deleted > 0 and deleted >= REBUILD_TOMBSTONE_RATIO * len(self.metadata)
+    
+    def compact(self, rebuild=None):
+        """Fold the journal into a fresh snapshot and truncate it
+        
+        With rebuild (by default, once REBUILD_TOMBSTONE_RATIO of documents are
+        tombstoned) deleted documents are dropped and the index is rebuilt densely.
+        Other writers wait for the compaction, searches only for the swap. It
+        cannot run inside a transaction, whose writes the snapshot would leave out.
+        """
+        with self.write_lock:
+            if self.staged is not None:
+                raise RuntimeError("compact() cannot be called inside a transaction")
+            if rebuild is None:
+                rebuild = self._needs_rebuild()
+            old_archive = self.archive_file
+            old_texts = self.text_archive_file
+            if rebuild and self.metadata.deleted_count:
+                self._rebuild_dense()
+            self._save()
+            self._reset_journal()
+            self.journal_records = 0
+            if self.archive_file != old_archive:
+                os.remove(old_archive)
+            if self.text_archive_file != old_texts:
+                os.remove(old_texts)
+    
+    def _rebuild_dense(self):
+        """Renumber live documents densely into a new archive and index
+        
+        Called holding write_lock, so nothing changes while the new archives, metadata
+        and index are built; searches keep using the current ones until the swap.
+        """
+        live_positions = np.flatnonzero(self.metadata.column("live")).astype(np.int64)
+        
+        # The new archive gets its own name so the current snapshot stays valid until
+        # the new one referencing it has been written
+        new_archive = f"{self.vectors_file}.{self.generation + 1}"
+        archive = self._archive()
+        with open(new_archive + ".tmp", 'wb') as f:
+            for start in range(0, len(live_positions), BUILD_CHUNK_SIZE):
+                f.write(np.ascontiguousarray(archive[live_positions[start:start + BUILD_CHUNK_SIZE]]).tobytes())
+        os.replace(new_archive + ".tmp", new_archive)
+        del archive
+        
+        new_texts = f"{self.texts_file}.{self.generation + 1}"
+        offsets = []
+        with open(new_texts + ".tmp", 'wb') as f:
+            for position in live_positions.tolist():
+                offsets.append(f.tell())
+                f.write(os.pread(self._text_reader(), self.metadata.text_lengths[position],
+                                 self.metadata.text_offsets[position]))
+            text_bytes = f.tell()
+        os.replace(new_texts + ".tmp", new_texts)
+        
+        metadata = self.metadata.compacted(live_positions, offsets)
+        lexical = self.lexical.compacted(live_positions)
+        index_type = index_kind(self.index) if len(metadata) >= self.ann_threshold else "flat"
+        index = self._build_index(index_type, len(metadata), new_archive)
+        
+        with self.lock.write():
+            self.metadata = metadata
+            self.lexical = lexical
+            self.archive_file = new_archive
+            self._close_text_reader()
+            self.text_archive_file = new_texts
+            self.text_bytes = text_bytes
+            self._install_index(index)
+    
     def _save(self):
-        """Save index and data to disk"""
-        faiss.write_index(self.index, self.index_file)
-        with open(self.data_file, 'wb') as f:
-            pickle.dump(self.data, f)
+        """Atomically save index and metadata snapshot to disk as a new generation"""
+        self.generation += 1
+        faiss.write_index(self.index, self.index_file + ".tmp")
+        with open(self.metadata_file + ".tmp", 'wb') as f:
+            self.metadata.save(
+                f,
+                generation=self.generation,
+                index_ntotal=int(self.index.ntotal),
+                archive_file=os.path.basename(self.archive_file),
+                texts_file=os.path.basename(self.text_archive_file)
+            )
+        with open(self.lexical_file + ".tmp", 'wb') as f:
+            self.lexical.save(f, generation=self.generation)
+        os.replace(self.index_file + ".tmp", self.index_file)
+        os.replace(self.metadata_file + ".tmp", self.metadata_file)
+        os.replace(self.lexical_file + ".tmp", self.lexical_file)
     
-    @traceable(name="get_vector_store_stats", run_type="tool")
-    def get_stats(self):
-        """Get statistics about the vector store"""
-        stats = {
-            "total_documents": len(self.data),
-            "index_size": self.index.ntotal if self.index else 0,
-            "dimension": self.dimension
+    def recall_report(self, num_queries=100, k=10, values=None):
+        """Measure recall@k and latency of the current index against an exact flat search
+        
+        Stored vectors are sampled as queries. For ANN indexes every nprobe or efSearch
+        value in ``values`` (a default sweep if omitted) is reported.
+        """
+        with self.lock.read():
+            live_positions = np.flatnonzero(self.metadata.column("live")).astype(np.int64)
+            index = self.index
+            selector = self._tombstone_selector()
+        count = len(live_positions)
+        if count == 0:
+            return {"index_type": index_kind(index), "documents": 0, "settings": []}
+        
+        vectors = np.array(self._archive()[live_positions])
+        sample = np.random.default_rng(0).choice(count, min(num_queries, count), replace=False)
+        queries = vectors[sample]
+        k = min(k, count)
+        
+        exact = faiss.IndexFlatL2(self.dimension)
+        exact.add(vectors)
+        _, truth = exact.search(queries, k)
+        truth = live_positions[truth]
+        exact_latencies = self._time_queries(exact, queries, k, None)
+        
+        report = {
+            "index_type": index_kind(index),
+            "documents": count,
+            "k": k,
+            "queries": len(queries),
+            "exact": {"mean_latency_ms": float(np.mean(exact_latencies)),
+                      "p95_latency_ms": float(np.percentile(exact_latencies, 95))},
+            "settings": []
         }
         
-        source_counts = {}
-        for item in self.data:
-            source_type = item.get('source_type', 'unknown')
-            source_counts[source_type] = source_counts.get(source_type, 0) + 1
+        name = search_parameter(index)
+        if name is None:
+            return report
+        
+        for value in values or (NPROBE_SWEEP if name == "nprobe" else EF_SEARCH_SWEEP):
+            params = search_params(index, nprobe=value, ef_search=value, selector=selector)
+            with self.lock.read():
+                _, found = index.search(queries, k, params=params)
+            latencies = self._time_queries(index, queries, k, params)
+            recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(queries))])
+            report["settings"].append({
+                name: value,
+                "recall_at_k": float(recall),
+                "mean_latency_ms": float(np.mean(latencies)),
+                "p95_latency_ms": float(np.percentile(latencies, 95))
+            })
+        
+        return report
+    
+    def _time_queries(self, index, queries, k, params):
+        """Per-query search latencies in milliseconds"""
+        latencies = []
+        for i in range(len(queries)):
+            with self.lock.read():
+                start = time.perf_counter()
+                index.search(queries[i:i + 1], k, params=params)
+                latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
+    
+    @traced(name="get_vector_store_stats", run_type="tool")
+    def get_stats(self):
+        """Get statistics about the vector store"""
+        with self.lock.read():
+            stats = {
+                "total_documents": len(self.metadata) - self.metadata.deleted_count,
+                "tombstoned_documents": self.metadata.deleted_count,
+                "index_size": self.index.ntotal if self.index else 0,
+                "dimension": self.dimension,
+                "index_type": index_kind(self.index),
+                "index_memory_mapped": self.index_mapped,
+                "journal_records": self.journal_records,
+                "embedding_requests": self.embedding_requests,
+                "source_type_counts": self.metadata.source_counts(),
+                "search_mode": self.search_mode,
+                "searches_by_mode": dict(self.search_counts),
+                "lexical_fallbacks": self.lexical_fallbacks,
+                "lexical_terms": len(self.lexical.terms)
+            }
         
-        stats["source_type_counts"] = source_counts
+        stats["embedding_cache"] = self.embedding_cache.get_stats()
         
-        return stats
\ No newline at end of file
+        return stats
@@ -0,0 +1,356 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+import faiss
+from advisor.vector_store import VectorStore, DEFAULT_COMPACT_EVERY
+from advisor.advisor import FantasyIPLAdvisor
+from advisor.answer_cache import SemanticAnswerCache
+from advisor.fetch_cache import CachedDataFetcher
+from advisor.deadline_fetcher import DeadlineDataFetcher
+from advisor.refresh_state import RefreshState
+from advisor.gazetteer import GazetteerMatcher, DEFAULT_GAZETTEER_FILE
+from advisor.fakes import FakeOpenAIClient, fake_data_fetcher, fake_llm, synthetic_text, PLAYERS, TEAMS, WORDS
+
+# Documents per add_documents call while filling a store
+POPULATE_BATCH_SIZE = 2048
+SOURCE_TYPES = ("news", "injury", "stats")
+
+# Run in a fresh interpreter: imports the advisor, opens a persisted store and answers one search
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from advisor.advisor import FantasyIPLAdvisor
+from advisor.vector_store import VectorStore
+from advisor.fakes import FakeOpenAIClient
+from advisor.metrics import set_trace_sample_rate
+imported = time.perf_counter()
+# As main.py does without a LangSmith API key
+set_trace_sample_rate(0.0)
+config, query = json.loads(sys.argv[1]), sys.argv[2]
+store = VectorStore(client=FakeOpenAIClient(dimension=config["dimension"]), **config)
+loaded = time.perf_counter()
+store.search(query)
+searched = time.perf_counter()
+print(json.dumps({"import": imported - start, "load": loaded - imported, "first_search": searched - loaded,
+                  "index_memory_mapped": store.index_mapped}))
+"""
+
+
+def summarize(samples, errors=0):
+    """Count, mean and p50/p95/p99 of latency samples in seconds"""
+    samples = sorted(samples)
+    
+    def percentile(fraction):
+        return samples[min(int(len(samples) * fraction), len(samples) - 1)] if samples else None
+    
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "mean": sum(samples) / len(samples) if samples else None,
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "max": samples[-1] if samples else None
+    }
+
+
+def measure(operation, calls):
+    """Time each call of operation(i) for i in range(calls)"""
+    samples = []
+    errors = 0
+    for i in range(calls):
+        start = time.perf_counter()
+        try:
+            operation(i)
+        except Exception:
+            errors += 1
+            continue
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, errors)
+
+
+def sample_query(i):
+    return (f"Should I pick {PLAYERS[i % len(PLAYERS)]} for {WORDS[i % len(WORDS)]} "
+            f"against {TEAMS[i % len(TEAMS)]} match {i}")
+
+
+def measure_startup(store_config, runs):
+    """Time-to-first-query of a new process opening a persisted store, with its import/load/search split"""
+    samples = []
+    stages = {"import": [], "load": [], "first_search": []}
+    errors = 0
+    mapped = None
+    for run in range(runs):
+        start = time.perf_counter()
+        probe = subprocess.run(
+            [sys.executable, "-c", STARTUP_PROBE, json.dumps(store_config), sample_query(1000000 + run)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True
+        )
+        elapsed = time.perf_counter() - start
+        if probe.returncode != 0:
+            errors += 1
+            continue
+        timings = json.loads(probe.stdout.strip().splitlines()[-1])
+        mapped = timings.pop("index_memory_mapped")
+        samples.append(elapsed)
+        for stage, seconds in timings.items():
+            stages[stage].append(seconds)
+    return {
+        **summarize(samples, errors),
+        "index_memory_mapped": mapped,
+        "stages": {stage: sum(values) / len(values) if values else None for stage, values in stages.items()}
+    }
+
+
+def populate(store, size):
+    """Fill a store with size synthetic documents spread over the last three days"""
+    now = datetime.now()
+    for start in range(0, size, POPULATE_BATCH_SIZE):
+        store.add_documents([
+            {
+                'document': synthetic_text(f"doc:{i}", 400) + f" #{i}",
+                'source_type': SOURCE_TYPES[i % len(SOURCE_TYPES)],
+                'timestamp': (now - timedelta(minutes=i % (72 * 60))).isoformat()
+            }
+            for i in range(start, min(start + POPULATE_BATCH_SIZE, size))
+        ])
+    store.wait_for_index_upgrade()
+    store.compact()
+
+
+def bench_size(size, args):
+    """Benchmark every operation against a store of the given size"""
+    workdir = tempfile.mkdtemp(prefix=f"bench-{size}-", dir=args.workdir)
+    results = {}
+    try:
+        client = FakeOpenAIClient(
+            dimension=args.dimension,
+            completion_latency=args.llm_latency,
+            tokens_per_second=args.tokens_per_second,
+            jitter=args.jitter,
+            seed=args.seed
+        )
+        store_config = {
+            "dimension": args.dimension,
+            "index_file": os.path.join(workdir, "vector_index.faiss"),
+            "data_file": os.path.join(workdir, "vector_data.pkl"),
+            "metadata_file": os.path.join(workdir, "vector_metadata.npz"),
+            "lexical_file": os.path.join(workdir, "vector_lexical.npz"),
+            "journal_file": os.path.join(workdir, "vector_journal.log"),
+            "vectors_file": os.path.join(workdir, "vector_vectors.f32"),
+            "texts_file": os.path.join(workdir, "vector_texts.txt"),
+            "index_type": args.index_type,
+            "ann_threshold": args.ann_threshold
+        }
+        store = VectorStore(
+            # Fold the whole load into one snapshot instead of compacting every batch
+            compact_every=max(size, DEFAULT_COMPACT_EVERY),
+            client=client,
+            **store_config
+        )
+        
+        start = time.perf_counter()
+        populate(store, size)
+        results["populate_seconds"] = time.perf_counter() - start
+        store.compact_every = DEFAULT_COMPACT_EVERY
+        
+        if args.startup_runs:
+            results["startup"] = measure_startup({**store_config, "mmap_index": True}, args.startup_runs)
+            results["startup_no_mmap"] = measure_startup({**store_config, "mmap_index": False}, args.startup_runs)
+        
+        # Latency and failures only apply once the store is loaded
+        client.simulate_embedding.latency = args.embedding_latency
+        client.simulate_embedding.failure_rate = args.failure_rate
+        client.simulate_completion.failure_rate = args.failure_rate
+        
+        # The default (hybrid) mode, then each ranking alone; every query is new, so dense modes embed it
+        results["search"] = measure(lambda i: store.search(sample_query(i)), args.queries)
+        results["search_dense"] = measure(lambda i: store.search(sample_query(2000000 + i), mode="dense"),
+                                          args.queries)
+        results["search_lexical"] = measure(lambda i: store.search(sample_query(3000000 + i), mode="lexical"),
+                                            args.queries)
+        results["add_document"] = measure(
+            lambda i: store.add_document(synthetic_text(f"new:{i}", 400) + f" #{size}:{i}", "news"),
+            args.writes
+        )
+        
+        data_fetcher = fake_data_fetcher(
+            args.exa_latency, args.jitter, args.failure_rate, args.seed,
+            crawl_latency=args.crawl_latency,
+            slow_crawl_rate=args.slow_crawl_rate,
+            slow_crawl_latency=args.slow_crawl_latency,
+            new_per_epoch=args.new_results_per_refresh or None
+        )
+        exa_client = data_fetcher.client
+        fetcher = DeadlineDataFetcher(data_fetcher, deadline=args.exa_deadline) if args.exa_deadline else data_fetcher
+        advisor = FantasyIPLAdvisor(
+            CachedDataFetcher(fetcher) if args.fetch_cache else fetcher,
+            store,
+            fake_llm(client),
+            answer_cache=SemanticAnswerCache(args.dimension, ttl=0),
+            refresh_state=None if args.full_refresh else RefreshState(os.path.join(workdir, "refresh_state.json"))
+        )
+        refreshed = []
+        
+        def refresh(i):
+            # New articles every time, as a scheduled refresh would find
+            exa_client.epoch += 1
+            refreshed.append(advisor.refresh_static_data())
+        
+        results["refresh_static_data"] = measure(refresh, args.refreshes)
+        # Totals over the timed refreshes; the first one finds every page new
+        for name in ("urls_listed", "urls_skipped", "bytes_fetched", "bytes_avoided", "embeddings_avoided",
+                     "chunks_added"):
+            results["refresh_static_data"][name] = sum(result[name] for result in refreshed)
+        advisor.last_refresh = datetime.now()
+        results["get_advice"] = measure(lambda i: advisor.get_advice(sample_query(i)), args.advice_queries)
+        
+        stats = store.get_stats()
+        results["documents"] = stats["total_documents"]
+        results["index_type"] = stats["index_type"]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def substring_scan(gazetteer, text):
+    """Every gazetteer value with a phrase in text, one substring scan per phrase, for comparison with the matcher"""
+    text_lower = text.lower()
+    return {
+        category: [value for value, phrases in values.items() if any(phrase.lower() in text_lower for phrase in phrases)]
+        for category, values in gazetteer.items()
+    }
+
+
+def bench_matcher(args):
+    """Time gazetteer matching of queries and LLM-sized responses as the gazetteer grows by synthetic players"""
+    with open(DEFAULT_GAZETTEER_FILE) as f:
+        base = json.load(f)
+    responses = [synthetic_text(f"response:{i}", 2000) for i in range(100)]
+    results = {}
+    for extra in (int(extra) for extra in args.matcher_players.split(",")):
+        players = {f"Reserve{i} Player": [f"Reserve{i} Player", f"Reserve{i}"] for i in range(extra)}
+        gazetteer = {**base, "player": {**base["player"], **players}}
+        start = time.perf_counter()
+        matcher = GazetteerMatcher(gazetteer)
+        build_seconds = time.perf_counter() - start
+        results[str(matcher.phrase_count)] = {
+            "build_seconds": build_seconds,
+            "match_query": measure(lambda i: matcher.match(sample_query(i)), args.matcher_calls),
+            "match_response": measure(lambda i: matcher.match(responses[i % len(responses)]),
+                                      args.matcher_calls // 10),
+            "substring_query": measure(lambda i: substring_scan(gazetteer, sample_query(i)), args.matcher_calls)
+        }
+    return results
+
+
+def compare(previous, current):
+    """Print p50/p95 changes between two result files"""
+    for size, operations in current["results"].items():
+        before = previous.get("results", {}).get(size)
+        if before is None:
+            continue
+        for operation in ("startup", "search", "search_dense", "search_lexical", "add_document",
+                          "refresh_static_data", "get_advice"):
+            old, new = before.get(operation), operations.get(operation)
+            if not old or not new or not old.get("p50") or not new.get("p50"):
+                continue
+            changes = "  ".join(
+                f"{name} {old[name] * 1000:.2f} -> {new[name] * 1000:.2f} ms ({(new[name] / old[name] - 1) * 100:+.1f}%)"
+                for name in ("p50", "p95")
+            )
+            print(f"{size:>8} {operation:<20} {changes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the advisor against local Exa/OpenAI stand-ins")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma-separated store sizes (1000000 needs ~6 GB of RAM at 1536 dimensions)")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--index-type", default="ivf")
+    parser.add_argument("--ann-threshold", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200, help="searches timed per size")
+    parser.add_argument("--writes", type=int, default=50, help="single add_document calls timed per size")
+    parser.add_argument("--refreshes", type=int, default=3, help="refresh_static_data calls timed per size")
+    parser.add_argument("--advice-queries", type=int, default=30, help="get_advice calls timed per size")
+    parser.add_argument("--startup-runs", type=int, default=3,
+                        help="cold starts (new process to first search result) timed per size")
+    parser.add_argument("--exa-latency", type=float, default=0.3, help="seconds per Exa search")
+    parser.add_argument("--crawl-latency", type=float, default=0.0, help="extra seconds per Exa live crawl")
+    parser.add_argument("--slow-crawl-rate", type=float, default=0.0,
+                        help="fraction of live crawls taking --slow-crawl-latency instead")
+    parser.add_argument("--slow-crawl-latency", type=float, default=0.0)
+    parser.add_argument("--exa-deadline", type=float, default=5.0,
+                        help="seconds per Exa fetch before falling back (0 fetches without a deadline)")
+    parser.add_argument("--new-results-per-refresh", type=int, default=2,
+                        help="new Exa results per query between refreshes (0 makes every result new)")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="fetch every result's contents on each refresh instead of only unseen URLs")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="seconds per embeddings request")
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="seconds to the first completion token")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--jitter", type=float, default=0.2, help="+/- fraction applied to every latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of API calls that fail")
+    parser.add_argument("--fetch-cache", action="store_true", help="put CachedDataFetcher in front of the fake Exa")
+    parser.add_argument("--matcher-players", default="0,1000,10000",
+                        help="comma-separated synthetic players added to the gazetteer for the matcher microbenchmark")
+    parser.add_argument("--matcher-calls", type=int, default=2000,
+                        help="query matches timed per gazetteer size (a tenth as many responses; 0 skips it)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="directory for the temporary stores")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", metavar="PREVIOUS_JSON", help="print changes against an earlier run")
+    args = parser.parse_args()
+    
+    report = {
+        "started": datetime.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "faiss": faiss.__version__
+        },
+        "config": vars(args),
+        "results": {}
+    }
+    
+    for size in (int(size) for size in args.sizes.split(",") if size):
+        print(f"Benchmarking {size} documents...", file=sys.stderr)
+        # The advisor reports progress on stdout; keep it out of the benchmark output
+        with contextlib.redirect_stdout(io.StringIO()):
+            report["results"][str(size)] = bench_size(size, args)
+        for operation, result in report["results"][str(size)].items():
+            if isinstance(result, dict):
+                print(f"{size:>8} {operation:<20} p50 {result['p50'] * 1000 if result['p50'] else 0:9.2f} ms  "
+                      f"p95 {result['p95'] * 1000 if result['p95'] else 0:9.2f} ms  "
+                      f"p99 {result['p99'] * 1000 if result['p99'] else 0:9.2f} ms  errors {result['errors']}")
+    
+    if args.matcher_calls:
+        print("Benchmarking gazetteer matching...", file=sys.stderr)
+        report["matcher"] = bench_matcher(args)
+        for phrases, operations in report["matcher"].items():
+            for operation, result in operations.items():
+                if isinstance(result, dict):
+                    print(f"{phrases:>6} phrases {operation:<16} p50 {result['p50'] * 1e6:9.1f} us  "
+                          f"p95 {result['p95'] * 1e6:9.1f} us  p99 {result['p99'] * 1e6:9.1f} us")
+    
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+    
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,53 @@
 import os
+import time
+# Taken before the remaining imports so the reported startup time includes them
+STARTED = time.perf_counter()
+import argparse
+import json
 from dotenv import load_dotenv
 from advisor.data_fetcher import ExaDataFetcher
+from advisor.fetch_cache import CachedDataFetcher
+from advisor.deadline_fetcher import DeadlineDataFetcher
+from advisor.refresh_state import RefreshState
+from advisor.gazetteer import GazetteerMatcher, DEFAULT_GAZETTEER_FILE
 from advisor.vector_store import VectorStore
 from advisor.llm_interface import OpenAIInterface
 from advisor.advisor import FantasyIPLAdvisor
-from langsmith import Client, traceable
+from advisor.context_assembler import ContextAssembler
+from advisor.answer_cache import SemanticAnswerCache
+from advisor.server import run_server
+from advisor.batch import read_queries, run_batch
+from advisor.metrics import METRICS, traced, set_trace_sample_rate
 
 load_dotenv() 
 
 
 def setup_langsmith():
-    """Setup LangSmith configuration"""
-    os.environ["LANGCHAIN_TRACING_V2"] = "true"
-    os.environ["LANGCHAIN_ENDPOINT"] = "https://api.smith.langchain.com"
-
+    """Setup LangSmith configuration
+    
+    Tracing is only enabled when a LangSmith API key is set and TRACE_SAMPLE_RATE
+    is above 0; an explicit LANGCHAIN_TRACING_V2 setting is respected.
+    Returns None when tracing is off.
+    """
+    sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+    set_trace_sample_rate(sample_rate)
+    if sample_rate <= 0 or not (os.getenv("LANGCHAIN_API_KEY") or os.getenv("LANGSMITH_API_KEY")):
+        set_trace_sample_rate(0.0)
+        return None
     
+    os.environ.setdefault("LANGCHAIN_TRACING_V2", "true")
+    os.environ.setdefault("LANGCHAIN_ENDPOINT", "https://api.smith.langchain.com")
+
+    # langsmith is only imported when tracing is on; it takes most of a second
+    from langsmith import Client
     client = Client()
     return client
 
-@traceable(name="fantasy_ipl_session", run_type="chain")
+@traced(name="fantasy_ipl_session", run_type="chain")
 def run_interactive_session(advisor):
     """Run interactive session with the advisor"""
     print("Fantasy IPL Advisor - Ask me anything about IPL players, stats, or strategies!")
-    print("Type 'exit' to quit, 'stats' to see vector store statistics.")
+    print("Type 'exit' to quit, 'stats' to see vector store statistics, 'metrics' for stage latencies.")
     
     session_queries = []
     
@@ -33,15 +58,33 @@ def run_interactive_session(advisor):
         elif query.lower() == 'stats':
             stats = advisor.vector_store.get_stats()
             print(f"\nVector Store Statistics: {stats}")
+            if hasattr(advisor.data_fetcher, 'get_stats'):
+                print(f"Fetch Cache Statistics: {advisor.data_fetcher.get_stats()}")
+            print(f"Refresh Statistics: {advisor.get_refresh_stats()}")
+            print(f"LLM Statistics: {advisor.llm.get_stats()}")
+            print(f"Context Statistics: {advisor.context_assembler.get_stats()}")
+            print(f"Answer Cache Statistics: {advisor.answer_cache.get_stats()}")
+            continue
+        elif query.lower() == 'metrics':
+            print(METRICS.to_prometheus())
             continue
         
         try:
-            response_data = advisor.get_advice(query)
+            response_stream = advisor.get_advice(query, stream=True)
+            
+            print("\nAdvisor: ", end="", flush=True)
+            for delta in response_stream:
+                print(delta, end="", flush=True)
+            print()
+            response_data = response_stream.result
             
-            print(f"\nAdvisor: {response_data['response']}")
             print(f"Confidence Score: {response_data['confidence_score']:.2f}")
             print(f"Query Type: {response_data['query_type']}")
+            if response_data['cache_hit']:
+                print(f"Cached Answer (similarity {response_data['cache_similarity']:.3f})")
             print(f"Context Sources: {response_data['context_sources']}")
+            if response_data.get('degraded'):
+                print(f"Degraded Live Data: {response_data['degraded']}")
             
             session_queries.append({
                 "query": query,
@@ -66,21 +109,100 @@ def run_interactive_session(advisor):
         "query_types": [q['query_type'] for q in session_queries]
     }
 
+def build_advisor(refresh_first=False):
+    """Create the advisor and its shared components and start background refreshes
+    
+    Queries are answered from the persisted store while the first refresh runs in
+    the background; an empty store, or refresh_first, is refreshed before returning.
+    """
+    exa_fetcher = CachedDataFetcher(DeadlineDataFetcher(
+        ExaDataFetcher(api_key=os.getenv("EXA_API_KEY")),
+        deadline=float(os.getenv("EXA_DEADLINE_SECONDS", "5")),
+        hedge=os.getenv("EXA_HEDGE", "1") != "0"
+    ))
+    vector_store = VectorStore(
+        index_type=os.getenv("VECTOR_INDEX_TYPE", "ivf"),
+        ann_threshold=int(os.getenv("VECTOR_ANN_THRESHOLD", "50000")),
+        mmap_index=os.getenv("VECTOR_MMAP_INDEX", "1") != "0",
+        search_mode=os.getenv("VECTOR_SEARCH_MODE", "hybrid"),
+        # 0 waits for every query embedding instead of falling back to lexical search
+        embedding_timeout=float(os.getenv("VECTOR_EMBEDDING_TIMEOUT", "2")) or None
+    )
+    matcher = GazetteerMatcher.load(os.getenv("ADVISOR_GAZETTEER", DEFAULT_GAZETTEER_FILE))
+    llm = OpenAIInterface(api_key=os.getenv("OPENAI_API_KEY"), matcher=matcher)
+    stored = vector_store.get_stats()["total_documents"]
+    refresh_state = None
+    if os.getenv("ADVISOR_INCREMENTAL_REFRESH", "1") != "0":
+        refresh_state = RefreshState()
+        if not stored:
+            # Pages seen before the store was emptied have to be fetched again
+            refresh_state.clear()
+    
+    advisor = FantasyIPLAdvisor(
+        exa_fetcher,
+        vector_store,
+        llm,
+        max_concurrency=int(os.getenv("ADVISOR_MAX_CONCURRENCY", "4")),
+        context_assembler=ContextAssembler(max_tokens=int(os.getenv("ADVISOR_CONTEXT_TOKENS", "3000"))),
+        answer_cache=SemanticAnswerCache(
+            threshold=float(os.getenv("ADVISOR_ANSWER_CACHE_THRESHOLD", "0.95")),
+            ttl=float(os.getenv("ADVISOR_ANSWER_CACHE_TTL", "600"))
+        ),
+        refresh_state=refresh_state,
+        matcher=matcher
+    )
+    
+    interval = float(os.getenv("ADVISOR_REFRESH_HOURS", "12")) * 3600
+    if refresh_first or not stored:
+        print("Initializing advisor with latest data...")
+        refresh_result = advisor.refresh_static_data()
+        print(f"Data refresh complete: {refresh_result}")
+        advisor.start_refresh_scheduler(interval=interval)
+    else:
+        print(f"Serving from {stored} stored documents while the latest data loads in the background.")
+        advisor.start_refresh_scheduler(interval=interval, run_immediately=True)
+    return advisor
+
 def main():
     """Main function with LangSmith integration"""
+    parser = argparse.ArgumentParser(description="Fantasy IPL Advisor")
+    parser.add_argument("--serve", action="store_true", help="serve get_advice and get_stats over HTTP")
+    parser.add_argument("--host", default=os.getenv("ADVISOR_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("ADVISOR_PORT", "8000")))
+    parser.add_argument("--batch", metavar="QUERIES_JSONL", help="answer every query in a JSONL file")
+    parser.add_argument("--output", metavar="ADVICE_JSONL", help="where --batch writes one result per line")
+    parser.add_argument("--parallel", type=int, default=4, help="queries --batch answers at once")
+    parser.add_argument("--refresh-first", action="store_true",
+                        help="refresh data before answering instead of in the background")
+    args = parser.parse_args()
+    if args.batch and not args.output:
+        parser.error("--batch requires --output")
     
     langsmith_client = setup_langsmith()
-    print("LangSmith tracing initialized.")
+    if langsmith_client is not None:
+        print(f"LangSmith tracing initialized (sampling {float(os.getenv('TRACE_SAMPLE_RATE', '1.0')):.0%} of requests).")
     
-    exa_fetcher = ExaDataFetcher(api_key=os.getenv("EXA_API_KEY"))
-    vector_store = VectorStore()
-    llm = OpenAIInterface(api_key=os.getenv("OPENAI_API_KEY"))
+    advisor = build_advisor(refresh_first=args.refresh_first or bool(args.batch))
+    startup = time.perf_counter() - STARTED
+    METRICS.observe("startup_seconds", startup)
+    print(f"Ready in {startup:.2f}s.")
     
-    advisor = FantasyIPLAdvisor(exa_fetcher, vector_store, llm)
+    if args.serve:
+        run_server(
+            advisor,
+            host=args.host,
+            port=args.port,
+            max_concurrency=int(os.getenv("SERVER_MAX_CONCURRENCY", "8")),
+            max_pending=int(os.getenv("SERVER_MAX_PENDING", "64")),
+            deadline=float(os.getenv("SERVER_DEADLINE_SECONDS", "30"))
+        )
+        return
     
-    print("Initializing advisor with latest data...")
-    refresh_result = advisor.refresh_static_data()
-    print(f"Data refresh complete: {refresh_result}")
+    if args.batch:
+        with open(args.batch) as queries, open(args.output, 'w') as output:
+            report = run_batch(advisor, read_queries(queries), output, max_parallel=args.parallel)
+        print(f"Batch complete: {json.dumps(report, indent=2)}")
+        return
     
     session_summary = run_interactive_session(advisor)
     
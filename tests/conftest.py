@@ -0,0 +1,34 @@
+import pytest
+from advisor.fakes import FakeOpenAIClient
+from advisor.metrics import set_trace_sample_rate
+from advisor.vector_store import VectorStore
+
+# Small embeddings keep the stores in these tests cheap to build
+DIMENSION = 32
+
+# Nothing is traced to LangSmith from the tests
+set_trace_sample_rate(0)
+
+
+@pytest.fixture
+def dimension():
+    return DIMENSION
+
+
+@pytest.fixture
+def open_store(tmp_path):
+    """Open a VectorStore over files in a temporary directory; every call reopens the same files"""
+    def open_store(**options):
+        return VectorStore(
+            dimension=DIMENSION,
+            client=FakeOpenAIClient(dimension=DIMENSION),
+            index_file=str(tmp_path / "vector_index.faiss"),
+            data_file=str(tmp_path / "vector_data.pkl"),
+            metadata_file=str(tmp_path / "vector_metadata.npz"),
+            lexical_file=str(tmp_path / "vector_lexical.npz"),
+            journal_file=str(tmp_path / "vector_journal.log"),
+            vectors_file=str(tmp_path / "vector_vectors.f32"),
+            texts_file=str(tmp_path / "vector_texts.txt"),
+            **options
+        )
+    return open_store
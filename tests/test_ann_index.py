@@ -0,0 +1,27 @@
+import threading
+
+
+def test_index_upgrade_runs_in_the_background(open_store):
+    store = open_store(index_type="hnsw", ann_threshold=20)
+    build_index = store._build_index
+    release = threading.Event()
+
+    def slow_build_index(*args, **kwargs):
+        release.wait(10)
+        return build_index(*args, **kwargs)
+
+    store._build_index = slow_build_index
+    store.add_documents([{'document': f"first batch {i}", 'source_type': "news"} for i in range(20)])
+    # The writer that crossed the threshold returned while the index is still being built
+    assert store.get_stats()["index_type"] == "flat"
+    store.add_documents([{'document': f"added during the build {i}", 'source_type': "news"} for i in range(5)])
+
+    release.set()
+    store.wait_for_index_upgrade()
+    assert store.get_stats()["index_type"] == "hnsw"
+    assert store.get_stats()["index_size"] == 25
+    for text in ("first batch 3", "added during the build 2"):
+        assert [result['text'] for result in store.search(text, k=1, mode="dense")] == [text]
+
+    # The switch is snapshotted, so the store reopens with the ANN index
+    assert open_store(index_type="hnsw", ann_threshold=20).get_stats()["index_type"] == "hnsw"
@@ -0,0 +1,97 @@
+import pytest
+from advisor.chunker import batch_chunks, chunk_documents, merge_chunks, split_text
+from advisor.fakes import synthetic_text
+
+BODY = synthetic_text("chunker", 5000)
+
+
+def as_results(chunks):
+    """Chunks as search returns them: their text and the span of the body they cover"""
+    return [{'text': chunk['document'], 'span': chunk['span']} for chunk in chunks]
+
+
+def test_short_text_is_one_span():
+    assert split_text("Kohli scored 80.", chunk_size=100) == [(0, 16)]
+
+
+def test_spans_cover_text_with_bounded_overlap():
+    spans = split_text(BODY, chunk_size=500, overlap=100)
+
+    assert spans[0][0] == 0 and spans[-1][1] == len(BODY)
+    for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+        assert end - start <= 500
+        # Chunks end on a boundary in their second half and overlap the next one by at most the overlap
+        assert BODY[end - 1] in " \n"
+        assert end - start > 250
+        assert end - 100 <= next_start < end
+        # Overlaps begin on a word
+        assert BODY[next_start - 1] in " \n"
+
+
+def test_paragraph_breaks_are_preferred():
+    text = "a" * 300 + ". " + "b" * 300 + "\n\n" + "c " * 200
+
+    end = split_text(text, chunk_size=700, overlap=50)[0][1]
+
+    assert text[:end].endswith("\n\n")
+
+
+@pytest.mark.parametrize("body", ["", "   \n\t ", None])
+def test_documents_without_a_body_yield_no_chunks(body):
+    assert list(chunk_documents([{'document': body, 'source_type': 'news', 'key': "empty"}])) == []
+
+
+def test_chunks_repeat_the_header_and_share_a_parent():
+    chunks = list(chunk_documents([{'document': BODY, 'header': "NEWS: Auction", 'source_type': 'news', 'key': "a1"}],
+                                  chunk_size=500, overlap=100))
+
+    assert [chunk['chunk'] for chunk in chunks] == list(range(len(chunks)))
+    assert {chunk['parent'] for chunk in chunks} == {"a1"}
+    for chunk in chunks:
+        start, end = chunk['span']
+        assert chunk['document'] == "NEWS: Auction\n" + BODY[start:end]
+
+
+def test_batches_keep_documents_whole():
+    documents = [{'document': synthetic_text(f"doc{i}", 2000), 'source_type': 'news', 'key': f"doc{i}"}
+                 for i in range(5)]
+
+    batches = list(batch_chunks(chunk_documents(documents, chunk_size=500, overlap=100), batch_size=6))
+
+    assert len(batches) > 1
+    parents = [{chunk['parent'] for chunk in batch} for batch in batches]
+    assert sum(len(batch_parents) for batch_parents in parents) == len(documents)
+
+
+def test_merging_neighbouring_chunks_drops_the_overlap():
+    chunks = as_results(chunk_documents([{'document': BODY, 'header': "NEWS: Auction", 'source_type': 'news'}],
+                                        chunk_size=500, overlap=100))
+
+    assert merge_chunks(chunks) == "NEWS: Auction\n" + BODY
+    first, last = chunks[1]['span'][0], chunks[3]['span'][1]
+    assert merge_chunks(chunks[1:4]) == "NEWS: Auction\n" + BODY[first:last]
+
+
+def test_merging_marks_gaps_between_chunks():
+    chunks = as_results(chunk_documents([{'document': BODY, 'source_type': 'news'}], chunk_size=500, overlap=100))
+    first, third = chunks[0]['span'], chunks[2]['span']
+    assert third[0] > first[1]
+
+    assert merge_chunks([chunks[0], chunks[2]]) == BODY[slice(*first)] + " ... " + BODY[slice(*third)]
+
+
+def test_search_merges_neighbouring_chunks_of_a_parent(open_store):
+    store = open_store()
+    chunks = list(chunk_documents([
+        {'document': BODY, 'header': "NEWS: Auction", 'source_type': 'news', 'key': "a1"},
+        {'document': synthetic_text("other", 2000), 'source_type': 'news', 'key': "a2"}
+    ], chunk_size=500, overlap=100))
+    store.add_documents(chunks)
+    middle = chunks[4]
+
+    results = store.search(middle['document'], k=1, merge_neighbors=1, mode="dense")
+
+    start, end = chunks[3]['span'][0], chunks[5]['span'][1]
+    assert results[0]['parent'] == "a1"
+    assert results[0]['chunks'] == [3, 5]
+    assert results[0]['text'] == "NEWS: Auction\n" + BODY[start:end]
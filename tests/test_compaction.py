@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+
+def texts(results):
+    return [result['text'] for result in results]
+
+
+def test_compact_empty_store(open_store):
+    store = open_store()
+    store.compact()
+    store.compact(rebuild=True)
+
+    store = open_store()
+    assert store.get_stats()["total_documents"] == 0
+    assert store.search("anything", k=3) == []
+    store.add_document("first document", "news")
+    assert texts(store.search("first document", k=1)) == ["first document"]
+
+
+def test_compact_fully_expired_store(open_store, tmp_path):
+    store = open_store()
+    old = (datetime.now() - timedelta(days=30)).isoformat()
+    store.add_documents([{'document': f"old news {i}", 'source_type': "news", 'timestamp': old}
+                         for i in range(20)])
+
+    assert store.expire()["expired"] == 20
+    # Every document was tombstoned, so the store was rebuilt densely with nothing in it
+    stats = store.get_stats()
+    assert (stats["total_documents"], stats["tombstoned_documents"], stats["index_size"]) == (0, 0, 0)
+    assert store.search("old news 3", k=3) == []
+    assert len(list(tmp_path.glob("vector_vectors.f32*"))) == 1
+    assert len(list(tmp_path.glob("vector_texts.txt*"))) == 1
+
+    store = open_store()
+    assert store.get_stats()["total_documents"] == 0
+    assert store.search("old news 3", k=3) == []
+    store.add_document("fresh news", "news")
+    assert texts(store.search("fresh news", k=3)) == ["fresh news"]
+
+
+def test_delete_by_hash_after_compaction_renumbers(open_store):
+    store = open_store()
+    added = store.add_documents([{'document': f"stats page {i}", 'source_type': "stats"} for i in range(8)])
+    hashes = [result["hash"] for result in added["results"]]
+    store.delete(hashes[:4])
+    store.compact(rebuild=True)
+
+    # "stats page 6" now sits at the position "stats page 2" had before the compaction
+    assert store.delete([hashes[6]]) == {"deleted": 1}
+    assert store.delete([hashes[2]]) == {"deleted": 0}
+    remaining = {result['text'] for result in store.search("stats page", k=8, mode="lexical")}
+    assert remaining == {"stats page 4", "stats page 5", "stats page 7"}
@@ -0,0 +1,97 @@
+import time
+import pytest
+from advisor.deadline_fetcher import CircuitBreaker, DeadlineDataFetcher, FetchUnavailableError
+from advisor.fakes import FakeBackendError, fake_data_fetcher
+
+
+def test_hedge_is_sent_when_the_primary_is_slow():
+    # Every live crawl is slow; the hedge reads Exa's cached copy instead
+    fetcher = fake_data_fetcher(slow_crawl_rate=1.0, slow_crawl_latency=1.0)
+    deadline_fetcher = DeadlineDataFetcher(fetcher, deadline=0.6)
+
+    start = time.monotonic()
+    result = deadline_fetcher.fetch_player_stats("Virat Kohli")
+
+    assert time.monotonic() - start < 0.6
+    assert result and result.degraded and result.degraded_reason == "hedged"
+    metrics = deadline_fetcher.metrics["fetch_player_stats"]
+    assert metrics["hedged"] == 1 and metrics["hedge_wins"] == 1
+
+
+def test_hedge_is_sent_at_once_when_the_primary_fails():
+    fetcher = fake_data_fetcher()
+    fetcher.client.simulate_crawl.failure_rate = 1.0
+    deadline_fetcher = DeadlineDataFetcher(fetcher, deadline=5.0)
+
+    start = time.monotonic()
+    result = deadline_fetcher.fetch_player_stats("Virat Kohli")
+
+    # Without the failure the hedge would wait for half the deadline
+    assert time.monotonic() - start < 1.0
+    assert result and result.degraded_reason == "hedged"
+    assert deadline_fetcher.metrics["fetch_player_stats"]["hedged"] == 1
+
+
+def test_failed_fetch_falls_back_to_last_good_result():
+    fetcher = fake_data_fetcher()
+    deadline_fetcher = DeadlineDataFetcher(fetcher, deadline=1.0)
+    fresh = deadline_fetcher.fetch_player_stats("Virat Kohli")
+    assert not fresh.degraded
+
+    fetcher.client.simulate.failure_rate = 1.0
+    result = deadline_fetcher.fetch_player_stats("Virat Kohli")
+
+    assert result.degraded and result.degraded_reason == "error"
+    assert list(result) == list(fresh)
+    with pytest.raises(FakeBackendError):
+        deadline_fetcher.fetch_player_stats("Jasprit Bumrah")
+
+
+def test_late_fetch_without_earlier_result_is_unavailable():
+    fetcher = fake_data_fetcher(latency=0.5)
+    deadline_fetcher = DeadlineDataFetcher(fetcher, deadline=0.1)
+
+    with pytest.raises(FetchUnavailableError):
+        deadline_fetcher.fetch_injury_reports()
+    assert deadline_fetcher.metrics["fetch_injury_reports"]["deadline_exceeded"] == 1
+
+
+def test_circuit_opens_after_consecutive_failures_and_closes_after_a_good_trial():
+    fetcher = fake_data_fetcher()
+    deadline_fetcher = DeadlineDataFetcher(fetcher, deadline=1.0, failure_threshold=2, reset_timeout=0.2)
+    breaker = deadline_fetcher.breakers["fetch_matchup_analysis"]
+    deadline_fetcher.fetch_matchup_analysis("CSK", "MI")
+
+    fetcher.client.simulate.failure_rate = 1.0
+    for _ in range(2):
+        deadline_fetcher.fetch_matchup_analysis("CSK", "MI")
+    assert breaker.state == "open"
+
+    # An open circuit answers from the last good result without calling Exa
+    calls = fetcher.client.calls
+    result = deadline_fetcher.fetch_matchup_analysis("CSK", "MI")
+    assert result.degraded and result.degraded_reason == "circuit_open"
+    assert fetcher.client.calls == calls
+    assert deadline_fetcher.metrics["fetch_matchup_analysis"]["circuit_rejected"] == 1
+
+    fetcher.client.simulate.failure_rate = 0.0
+    time.sleep(0.25)
+    result = deadline_fetcher.fetch_matchup_analysis("CSK", "MI")
+    assert not result.degraded
+    assert breaker.state == "closed"
+
+
+def test_circuit_half_opens_for_a_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    breaker.record(False)
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.15)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+    # A failed trial reopens the circuit for another reset_timeout
+    breaker.record(False)
+    assert breaker.state == "open" and not breaker.allow()
+    assert breaker.times_opened == 2
@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from advisor.fakes import fake_data_fetcher
+from advisor.fetch_cache import CachedDataFetcher
+
+
+def test_result_is_fetched_again_after_its_ttl():
+    fetcher = fake_data_fetcher()
+    cache = CachedDataFetcher(fetcher, ttls={"fetch_player_stats": 0.1}, stale_ttls={"fetch_player_stats": 0})
+    first = cache.fetch_player_stats("Virat Kohli")
+    assert cache.fetch_player_stats("Virat Kohli") is first
+    assert fetcher.client.calls == 1
+
+    # New articles are published once the entry has expired
+    fetcher.client.epoch += 1
+    time.sleep(0.15)
+    refreshed = cache.fetch_player_stats("Virat Kohli")
+
+    assert fetcher.client.calls == 2
+    assert refreshed != first
+    assert cache.metrics["fetch_player_stats"]["hits"] == 1
+    assert cache.metrics["fetch_player_stats"]["misses"] == 2
+
+
+def test_stale_result_is_served_while_it_is_revalidated():
+    fetcher = fake_data_fetcher()
+    cache = CachedDataFetcher(fetcher, ttls={"fetch_injury_reports": 0.3}, stale_ttls={"fetch_injury_reports": 5})
+    first = cache.fetch_injury_reports()
+    fetcher.client.epoch += 1
+    fetcher.client.simulate.latency = 0.2
+    time.sleep(0.35)
+
+    start = time.monotonic()
+    stale = cache.fetch_injury_reports()
+    assert time.monotonic() - start < 0.1
+    assert stale is first
+    # The refresh is already running, so a second stale hit does not start another
+    assert cache.fetch_injury_reports() is first
+    assert cache.metrics["fetch_injury_reports"]["stale_hits"] == 2
+
+    time.sleep(0.3)
+    assert cache.fetch_injury_reports() != first
+    assert fetcher.client.calls == 2
+    assert cache.metrics["fetch_injury_reports"]["hits"] == 1
+
+
+def test_concurrent_identical_requests_share_one_fetch():
+    fetcher = fake_data_fetcher(latency=0.2)
+    cache = CachedDataFetcher(fetcher)
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(lambda _: cache.fetch_matchup_analysis("CSK", "MI"), range(5)))
+
+    assert fetcher.client.calls == 1
+    assert all(result is results[0] for result in results)
+    metrics = cache.metrics["fetch_matchup_analysis"]
+    assert metrics["misses"] == 1 and metrics["coalesced"] == 4
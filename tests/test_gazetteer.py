@@ -0,0 +1,34 @@
+from advisor.gazetteer import GazetteerMatcher, default_matcher
+
+
+def test_overlapping_aliases_all_match():
+    matches = default_matcher().match("Is Royal Challengers Bangalore stronger than Mumbai Indians?")
+
+    assert matches["team"] == {
+        "Royal Challengers Bangalore": ["royal challengers", "royal challengers bangalore", "bangalore"],
+        "Mumbai Indians": ["mumbai", "mumbai indians", "indians"]
+    }
+
+
+def test_phrases_sharing_words_across_values():
+    # "b c d" begins inside "a b c", so it is only found through a failure link
+    matcher = GazetteerMatcher({"team": {"X": ["a b c"], "Y": ["b c d"], "Z": ["c"]}})
+
+    assert matcher.match("a b c d") == {"team": {"X": ["a b c"], "Z": ["c"], "Y": ["b c d"]}}
+    assert matcher.match("a b d") == {}
+
+
+def test_aliases_match_whole_words_only():
+    matcher = default_matcher()
+
+    assert "team" not in matcher.match("He might score a century")
+    assert matcher.match("MI might not")["team"] == {"Mumbai Indians": ["mi"]}
+    assert "player" not in matcher.match("Gillespie bowled well")
+
+
+def test_matching_ignores_case_and_punctuation():
+    matches = default_matcher().match("VIRAT kohli's form vs rcb")
+
+    assert matches["player"] == {"Virat Kohli": ["virat", "virat kohli", "kohli"]}
+    assert matches["team"] == {"Royal Challengers Bangalore": ["rcb"]}
+    assert matches["intent"]["match_query"] == ["vs"]
@@ -0,0 +1,70 @@
+import pytest
+
+
+def texts(results):
+    return [result['text'] for result in results]
+
+
+def test_replay_drops_torn_journal_tail(open_store, tmp_path):
+    store = open_store()
+    documents = [f"journaled document {i} about Kohli" for i in range(5)]
+    for document in documents:
+        store.add_document(document, "news")
+    del store
+
+    # An append interrupted by a crash leaves the last record cut short
+    journal = tmp_path / "vector_journal.log"
+    with open(journal, 'r+b') as f:
+        f.truncate(journal.stat().st_size - 10)
+
+    store = open_store()
+    assert store.get_stats()["total_documents"] == 4
+    assert texts(store.search(documents[3], k=1, mode="dense")) == [documents[3]]
+    assert documents[4] not in texts(store.search(documents[4], k=5, mode="dense"))
+    # The torn record's vector and text are dropped along with it
+    assert store._archive_rows() == 4
+
+    store.add_document("written after the crash", "news")
+    del store
+    store = open_store()
+    assert store.get_stats()["total_documents"] == 5
+    assert texts(store.search("written after the crash", k=1, mode="dense")) == ["written after the crash"]
+    assert texts(store.search(documents[3], k=1, mode="dense")) == [documents[3]]
+
+
+def test_replay_ignores_garbage_after_last_record(open_store, tmp_path):
+    store = open_store()
+    store.add_documents([{'document': f"document {i}", 'source_type': "news"} for i in range(3)])
+    del store
+
+    journal = tmp_path / "vector_journal.log"
+    size = journal.stat().st_size
+    with open(journal, 'ab') as f:
+        f.write(b"\x80\x04not a record")
+
+    store = open_store()
+    assert store.get_stats()["total_documents"] == 3
+    assert journal.stat().st_size == size
+
+
+def test_batch_whose_journal_write_fails_leaves_no_trace(open_store, monkeypatch):
+    store = open_store()
+    store.add_document("stored before the failure", "news")
+
+    def failing_fsync(fd):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr("advisor.vector_store.os.fsync", failing_fsync)
+        with pytest.raises(OSError):
+            store.add_documents([{'document': f"lost document {i}", 'source_type': "news"} for i in range(3)])
+
+    # The next batch takes the failed one's rows in the archive and bytes in the text archive
+    documents = [f"stored after the failure {i}" for i in range(3)]
+    store.add_documents([{'document': document, 'source_type': "news"} for document in documents])
+    for store in (store, open_store()):
+        assert store.get_stats()["total_documents"] == 4
+        assert store._archive_rows() == 4
+        for document in documents:
+            assert texts(store.search(document, k=1, mode="dense")) == [document]
+        assert "lost document 0" not in texts(store.search("lost document 0", k=4, mode="dense"))
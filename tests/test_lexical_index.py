@@ -0,0 +1,61 @@
+import math
+import numpy as np
+import pytest
+from advisor.lexical_index import BM25_B, BM25_K1, LexicalIndex, term_counts, tokenize
+
+
+def build(texts):
+    index = LexicalIndex()
+    for position, text in enumerate(texts):
+        index.add(position, term_counts(text))
+    return index
+
+
+def test_tokenize_drops_stopwords_and_case():
+    assert tokenize("Kohli and the RCB top order") == ["kohli", "rcb", "top", "order"]
+
+
+def test_scores_follow_bm25():
+    texts = ["kohli kohli century", "kohli duck", "bumrah yorker wicket haul"]
+    index = build(texts)
+
+    average_length = (3 + 2 + 4) / 3
+    idf = math.log(1 + (3 - 2 + 0.5) / (2 + 0.5))
+
+    def expected(freq, length):
+        return idf * freq * (BM25_K1 + 1) / (freq + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+
+    hits = index.search(["kohli"], k=5)
+    assert [position for position, _ in hits] == [0, 1]
+    assert [score for _, score in hits] == pytest.approx([expected(2, 3), expected(1, 2)])
+
+
+def test_rare_terms_outscore_common_ones():
+    index = build(["kohli century", "kohli duck", "kohli fifty", "bumrah century"])
+
+    hits = dict(index.search(["kohli", "bumrah"], k=5))
+
+    assert hits[3] > hits[0]
+
+
+def test_deleted_documents_and_position_filter():
+    index = build(["kohli century", "kohli duck", "kohli fifty"])
+    index.delete(0)
+
+    assert [position for position, _ in index.search(["kohli"], k=5)] == [1, 2]
+    assert [position for position, _ in index.search(["kohli"], k=5, positions=np.array([2]))] == [2]
+    assert index.search(["century"], k=5) == []
+
+
+def test_compacted_index_renumbers_and_keeps_scores():
+    index = build(["kohli century", "kohli duck", "bumrah fifty"])
+    index.delete(1)
+
+    compacted = index.compacted([0, 2])
+
+    before = index.search(["kohli", "bumrah"], k=5)
+    after = compacted.search(["kohli", "bumrah"], k=5)
+    assert [position for position, _ in before] == [0, 2]
+    assert [position for position, _ in after] == [0, 1]
+    assert [score for _, score in after] == pytest.approx([score for _, score in before])
+    assert "duck" not in compacted.term_ids
@@ -0,0 +1,52 @@
+import hashlib
+import pickle
+from datetime import datetime
+
+import faiss
+import numpy as np
+
+from advisor.fakes import synthetic_embedding
+from advisor.metadata_store import MetadataStore
+
+
+def texts(results):
+    return [result['text'] for result in results]
+
+
+def digest(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def test_migrates_baseline_pickle(open_store, tmp_path, dimension):
+    # The first versions saved a positional flat index and a pickled list of records holding their texts
+    documents = [f"baseline document {i} on Bumrah" for i in range(6)]
+    index = faiss.IndexFlatL2(dimension)
+    index.add(np.array([synthetic_embedding(document, dimension) for document in documents], dtype=np.float32))
+    faiss.write_index(index, str(tmp_path / "vector_index.faiss"))
+    records = [{'text': document, 'source_type': "news", 'timestamp': datetime.now().isoformat(),
+                'hash': digest(document), 'index': i} for i, document in enumerate(documents)]
+    with open(tmp_path / "vector_data.pkl", 'wb') as f:
+        pickle.dump(records, f)
+
+    store = open_store()
+    assert not (tmp_path / "vector_data.pkl").exists()
+    assert (tmp_path / "vector_metadata.npz").exists()
+    assert store.add_document(documents[0], "news")["status"] == "skipped"
+
+    # Reopened from the columnar snapshot written by the migration
+    for store in (store, open_store()):
+        assert store.get_stats()["total_documents"] == 6
+        for document in documents:
+            assert texts(store.search(document, k=1, mode="dense")) == [document]
+
+
+def test_key_lookup_does_not_intern_unknown_keys():
+    store = MetadataStore()
+    store.append({'hash': digest("stats page"), 'source_type': "stats", 'timestamp': None, 'key': "kohli",
+                  'text_offset': 0, 'text_length': 10})
+    strings = len(store.string_ends)
+
+    assert store.key_positions("stats", "kohli") == {0}
+    assert store.key_positions("stats", "bumrah") == set()
+    assert store.key_positions("news", "kohli") == set()
+    assert len(store.string_ends) == strings
@@ -0,0 +1,18 @@
+from advisor.refresh_state import RefreshState
+
+
+def test_pages_without_chunks_are_fetched_again(tmp_path):
+    state = RefreshState(str(tmp_path / "refresh_state.json"))
+    listed = [
+        {"url": "https://example.com/full", "published_date": "2025-04-01T10:00:00", "text": "Kohli scored 80."},
+        {"url": "https://example.com/empty", "published_date": "2025-04-03T10:00:00", "text": "  "},
+        {"url": "https://example.com/missing", "published_date": "2025-04-04T10:00:00", "text": None}
+    ]
+
+    state.record("news", listed, {"https://example.com/full": 2})
+    unseen, skipped = state.partition("news", listed)
+
+    assert [item["url"] for item in unseen] == ["https://example.com/empty", "https://example.com/missing"]
+    assert [entry["chunks"] for entry in skipped] == [2]
+    # The watermark only covers pages that were stored, so later listings still include the others
+    assert state.since("news") == "2025-03-31"
@@ -0,0 +1,46 @@
+import hashlib
+
+import pytest
+
+from advisor.fakes import synthetic_text
+
+
+def texts(results):
+    return [result['text'] for result in results]
+
+
+def digest(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_delete_and_supersede_survive_reopen_with_mmap(open_store, index_type):
+    options = {"index_type": index_type, "ann_threshold": 50, "mmap_index": True}
+    store = open_store(**options)
+    news = [synthetic_text(f"news {i}", 300) for i in range(80)]
+    store.add_documents([{'document': text, 'source_type': "news"} for text in news])
+    store.add_document("Kohli stats, first version", "stats", key="kohli")
+    store.wait_for_index_upgrade()
+    store.compact()
+
+    store = open_store(**options)
+    assert store.index_mapped
+    store.delete([digest(news[7])])
+    # Deleting tombstones the document without reading the mapped index into memory
+    assert store.index_mapped
+    store.add_document("Kohli stats, second version", "stats", key="kohli")
+
+    def check(store):
+        assert news[7] not in texts(store.search(news[7], k=5, mode="dense"))
+        assert texts(store.search(news[8], k=1, mode="dense")) == [news[8]]
+        assert texts(store.search("Kohli stats", k=5, source_types="stats")) == ["Kohli stats, second version"]
+        assert store.get_stats()["source_type_counts"] == {"news": 79, "stats": 1}
+
+    check(store)
+    # Reopening replays the deletions and the new version over the mapped snapshot
+    store = open_store(**options)
+    check(store)
+    store.compact()
+    store = open_store(**options)
+    assert store.index_mapped
+    check(store)
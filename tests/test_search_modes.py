@@ -0,0 +1,59 @@
+import time
+import pytest
+from advisor.fakes import synthetic_text
+from advisor.vector_store import RRF_K
+
+# Appears in one document only, so only the lexical index can find it reliably
+RARE_TERM = "zaheerx77"
+
+
+@pytest.fixture
+def store(open_store):
+    store = open_store()
+    documents = [{'document': synthetic_text(f"doc{i}", 300), 'source_type': 'news', 'key': f"doc{i}"}
+                 for i in range(30)]
+    documents[17]['document'] += f" Scouts flagged {RARE_TERM} as the pick of the auction."
+    store.add_documents(documents)
+    return store
+
+
+@pytest.mark.parametrize("mode", ["lexical", "hybrid"])
+def test_exact_term_is_recalled(store, mode):
+    results = store.search(f"{RARE_TERM} auction pick", k=3, mode=mode)
+
+    assert RARE_TERM in results[0]['text']
+    assert results[0]['lexical_score'] > 0
+
+
+def test_hybrid_ranks_by_reciprocal_rank_fusion(store):
+    query = "Kohli century against Mumbai"
+    dense = [result['text'] for result in store.search(query, k=30, mode="dense")]
+    lexical = [result['text'] for result in store.search(query, k=30, mode="lexical")]
+
+    fused = {}
+    for ranking in (dense, lexical):
+        for rank, text in enumerate(ranking):
+            fused[text] = fused.get(text, 0.0) + 1.0 / (RRF_K + rank + 1)
+    results = store.search(query, k=10, mode="hybrid")
+
+    # Scores are scaled so that first place in both rankings scores 1
+    expected = sorted(fused.values(), reverse=True)[:10]
+    assert [result['score'] for result in results] == pytest.approx([score * (RRF_K + 1) / 2 for score in expected])
+    assert [result['score'] for result in results] == pytest.approx(
+        [fused[result['text']] * (RRF_K + 1) / 2 for result in results])
+
+
+def test_search_falls_back_to_lexical_when_the_embedding_is_late(open_store, store):
+    # The same documents, reopened with queries embedded too slowly for the deadline
+    late = open_store(embedding_timeout=0.05)
+    late.client.simulate_embedding.latency = 0.5
+
+    start = time.monotonic()
+    assert late.embed_query("Who took the most wickets?", timeout=late.embedding_timeout) is None
+    results = late.search(f"{RARE_TERM} auction pick", k=3, mode="hybrid")
+
+    assert time.monotonic() - start < 0.4
+    assert RARE_TERM in results[0]['text']
+    assert results[0]['similarity_score'] is None
+    assert late.lexical_fallbacks == 1
+    assert late.search_counts == {"dense": 0, "lexical": 1, "hybrid": 0}
@@ -0,0 +1,113 @@
+import asyncio
+import json
+from datetime import datetime
+import pytest
+from advisor.advisor import FantasyIPLAdvisor
+from advisor.answer_cache import SemanticAnswerCache
+from advisor.fakes import FakeOpenAIClient, fake_data_fetcher, fake_llm
+from advisor.server import AdviceServer, HTTPError
+
+
+@pytest.fixture
+def make_server(open_store, dimension):
+    """Build an AdviceServer over an advisor backed by the fakes; completions take completion_latency"""
+    def make_server(completion_latency=0.2, **options):
+        client = FakeOpenAIClient(dimension=dimension, completion_latency=completion_latency, tokens_per_second=100000)
+        advisor = FantasyIPLAdvisor(fake_data_fetcher(), open_store(), fake_llm(client),
+                                    answer_cache=SemanticAnswerCache(dimension, ttl=0))
+        # Data counts as fresh, so no background refresh runs alongside the requests
+        advisor.last_refresh = datetime.now()
+        return AdviceServer(advisor, port=0, **options), client
+    return make_server
+
+
+async def post(server, body):
+    """POST body to /advice; returns the status, headers and decoded JSON payload"""
+    reader, writer = await asyncio.open_connection(server.host, server.port)
+    data = json.dumps(body).encode()
+    writer.write(f"POST /advice HTTP/1.1\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in header_lines)
+    return int(status_line.split()[1]), headers, json.loads(payload)
+
+
+def serve(server, scenario):
+    async def run():
+        await server.start()
+        try:
+            return await scenario()
+        finally:
+            await server.close()
+    return asyncio.run(run())
+
+
+def test_identical_queries_share_one_run(make_server):
+    server, client = make_server()
+    query = {"query": "Who should I captain against CSK?"}
+
+    responses = serve(server, lambda: asyncio.gather(post(server, query), post(server, query)))
+
+    assert [status for status, _, _ in responses] == [200, 200]
+    assert sorted(bool(payload.get("coalesced")) for _, _, payload in responses) == [False, True]
+    assert client.completion_calls == 1
+    assert server.counters["coalesced"] == 1
+
+
+def test_busy_server_turns_new_queries_away(make_server):
+    server, _ = make_server(max_pending=1)
+
+    async def scenario():
+        first = asyncio.ensure_future(post(server, {"query": "Who should I captain?"}))
+        await asyncio.sleep(0.05)
+        rejected = await post(server, {"query": "Which bowlers are injured?"})
+        return rejected, await first
+
+    (status, headers, _), (first_status, _, _) = serve(server, scenario)
+
+    assert status == 503 and headers["Retry-After"] == "1"
+    assert first_status == 200
+    assert server.counters["rejected"] == 1
+
+
+def test_request_past_its_timeout_gets_504(make_server):
+    server, _ = make_server(completion_latency=0.5)
+
+    status, _, payload = serve(server, lambda: post(server, {"query": "Who should I captain?", "timeout": 0.05}))
+
+    assert status == 504 and "0.05" in payload["error"]
+    assert server.counters["timeouts"] == 1
+
+
+def test_query_asked_again_after_its_queued_run_was_cancelled(make_server):
+    server, _ = make_server(max_concurrency=1)
+    query = "Which bowlers are injured?"
+
+    async def scenario():
+        # The only worker is busy, so this query's run is still queued when its request gives up
+        busy = asyncio.ensure_future(server.advice("Who should I captain?"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPError) as timed_out:
+            await server.advice(query, timeout=0.01)
+        # Asked again straight away, before the cancelled run's callbacks have run
+        retried = await server.advice(query)
+        await busy
+        return timed_out.value.status, retried
+
+    status, retried = serve(server, scenario)
+
+    assert status == 504 and server.counters["cancelled"] == 1
+    assert retried["response"] and not retried.get("coalesced")
+
+
+@pytest.mark.parametrize("timeout", ["soon", -1, [1], {}])
+def test_bad_timeout_is_rejected(make_server, timeout):
+    server, client = make_server()
+
+    status, _, payload = serve(server, lambda: post(server, {"query": "Who should I captain?", "timeout": timeout}))
+
+    assert status == 400 and "timeout" in payload["error"]
+    assert client.completion_calls == 0